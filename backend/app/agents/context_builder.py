@@ -0,0 +1,122 @@
+"""
+Conversation Context Builder
+Ring-buffer chat history and token-budgeted prompt assembly for agent chats
+"""
+
+import os
+import re
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional
+
+CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", 20))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 1500))
+SUMMARY_POINTS = 6
+SUMMARY_POINT_CHARS = 120
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def _first_sentence(text: str) -> str:
+    sentence = _SENTENCE_END.split(text.strip(), 1)[0]
+    if len(sentence) > SUMMARY_POINT_CHARS:
+        sentence = sentence[:SUMMARY_POINT_CHARS].rstrip() + "..."
+    return sentence
+
+
+class ConversationBuffer:
+    """Fixed-size ring buffer of chat turns
+
+    Turns that fall off the end are folded into a short running summary, so
+    older context survives in a few lines instead of being dropped. The
+    summary text is built once and reused until another turn is evicted.
+    """
+
+    def __init__(self, turns: Iterable[Dict] = (), maxlen: int = CHAT_HISTORY_LIMIT):
+        self.turns: deque = deque(maxlen=maxlen)
+        self._points: deque = deque(maxlen=SUMMARY_POINTS)
+        self._summary: Optional[str] = None
+        for turn in turns:
+            self.append(turn)
+
+    def append(self, turn: Dict):
+        if len(self.turns) == self.turns.maxlen:
+            self._absorb(self.turns[0])
+        self.turns.append(turn)
+
+    def _absorb(self, turn: Dict):
+        # Only the user's side carries the topic; agent replies are long and derivative
+        if turn.get("role") == "user" and turn.get("content"):
+            self._points.append(_first_sentence(turn["content"]))
+            self._summary = None
+
+    @property
+    def summary(self) -> str:
+        if self._summary is None:
+            self._summary = "; ".join(self._points)
+        return self._summary
+
+    def clear(self):
+        self.turns.clear()
+        self._points.clear()
+        self._summary = None
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.turns)
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def __getitem__(self, index: int) -> Dict:
+        return self.turns[index]
+
+
+def build_chat_prompt(system_prompt: str, agent_name: str, message: str,
+                      history: Optional[Iterable[Dict]] = None,
+                      token_budget: int = CHAT_CONTEXT_TOKENS) -> str:
+    """Assemble the chat prompt, fitting as much recent history as the budget allows
+
+    Turns are taken newest first until the budget runs out. A quarter of the
+    budget is held back for a one-line summary of anything left out (turns
+    evicted from the ring buffer or skipped here); unused summary budget is
+    not reclaimed. The prompt is joined once at the end.
+    """
+    turns: List[Dict] = list(history or [])
+    # The current message is usually already the last history entry
+    if turns and turns[-1].get("role") == "user" and turns[-1].get("content") == message:
+        turns.pop()
+
+    current = [f"User: {message}", f"{agent_name}:"]
+    remaining = token_budget - estimate_tokens(system_prompt) - estimate_tokens(message) - 16
+    summary_budget = max(remaining // 4, 0)
+    remaining -= summary_budget
+
+    selected: List[str] = []
+    for turn in reversed(turns):
+        speaker = "User" if turn.get("role") == "user" else agent_name
+        line = f"{speaker}: {turn.get('content', '')}"
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        selected.append(line)
+        remaining -= cost
+
+    summary = getattr(history, "summary", "")
+    if len(selected) < len(turns):
+        skipped = turns[:len(turns) - len(selected)]
+        extra = "; ".join(_first_sentence(t["content"]) for t in skipped if t.get("role") == "user" and t.get("content"))
+        summary = "; ".join(part for part in (summary, extra) if part)
+
+    parts = [system_prompt, "", "Conversation History:"]
+    if summary and summary_budget > 8:
+        max_chars = (summary_budget - 8) * 4
+        if len(summary) > max_chars:
+            summary = summary[:max_chars].rstrip() + "..."
+        parts.append(f"(Earlier topics: {summary})")
+    parts.extend(reversed(selected))
+    parts.extend(current)
+    return "\n".join(parts)
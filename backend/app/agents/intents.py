@@ -0,0 +1,53 @@
+"""
+Intent Matcher
+Keyword-to-intent classification shared by agent fallbacks and team curation
+"""
+
+from typing import Dict, FrozenSet, Iterable, Mapping, Tuple
+
+# Intent -> trigger phrases (matched case-insensitively anywhere in the text)
+INTENT_KEYWORDS: Dict[str, tuple] = {
+    "credit": ("credit",),
+    "budget": ("budget",),
+    "debt": ("debt",),
+    "invest": ("invest", "portfolio"),
+    "retirement": ("retirement",),
+    "save": ("save", "emergency"),
+    "spend": ("spend", "impulse"),
+    "stress": ("stress", "anxiety"),
+    "habit": ("habit", "change"),
+}
+
+
+class IntentMatcher:
+    """Maps text to the set of intents whose phrases appear in it
+
+    The phrase table is flattened once at construction. Matching lowercases
+    the text a single time and then runs CPython's substring search for each
+    phrase. With a few dozen phrases this beats a compiled regex alternation,
+    which retries every alternative at every position (see
+    benchmarks/bench_intents.py).
+    """
+
+    def __init__(self, keywords: Mapping[str, Iterable[str]]):
+        self._phrases: Tuple[Tuple[str, str], ...] = tuple(
+            (phrase.lower(), intent)
+            for intent, phrases in keywords.items()
+            for phrase in phrases
+        )
+
+    def match(self, text: str) -> FrozenSet[str]:
+        """Return every intent mentioned in ``text``"""
+        if not text:
+            return frozenset()
+        lowered = text.lower()
+        return frozenset([intent for phrase, intent in self._phrases if phrase in lowered])
+
+
+# Built once at import time
+INTENTS = IntentMatcher(INTENT_KEYWORDS)
+
+
+def classify(text: str) -> FrozenSet[str]:
+    """Intents mentioned in a user message or agent reply"""
+    return INTENTS.match(text)
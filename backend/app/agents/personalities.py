@@ -5,11 +5,17 @@ Each agent has a distinct personality and focus area powered by Gemini
 
 import google.generativeai as genai
 import os
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional
 from datetime import datetime
 import json
 from dotenv import load_dotenv
 
+from app.agents.context_builder import build_chat_prompt
+from app.agents.intents import classify
+from app.services.llm_client import LLMClient
+from app.services.llm_gate import LLMUnavailableError, is_quota_error
+from app.services.llm_cache import inflight, response_cache
+
 # Load environment variables
 load_dotenv()
 
@@ -30,9 +36,28 @@ class AgentPersonality:
         self.role = role
         self.system_prompt = system_prompt
         self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.llm = LLMClient(self.model)
+        
+    async def analyze_for_insights(self, financial_data: Dict, signals: List[Dict] = None,
+                                   spending: List[str] = None, raise_errors: bool = False) -> Optional[Dict]:
+        """Analyze financial data for proactive insights
+
+        ``spending`` holds pre-aggregated spending lines; without them the
+        prompt falls back to the five most recent raw transactions. None
+        means the model found nothing worth saying, or (unless
+        ``raise_errors``) that the call failed.
+        """
+        signal_lines = ""
+        if signals:
+            signal_lines = "\n\nSignals flagged by automated checks:\n" + "\n".join(
+                f"- {signal['detail']}" for signal in signals
+            )
+        
+        if spending:
+            activity = "\n".join(f"- {line}" for line in spending)
+        else:
+            activity = f"- Recent Transactions: {json.dumps(financial_data.get('recent_transactions', [])[:5])}"
         
-    async def analyze_for_insights(self, financial_data: Dict) -> Optional[Dict]:
-        """Analyze financial data for proactive insights"""
         prompt = f"""{self.system_prompt}
 
 Current Date: {datetime.now().strftime("%Y-%m-%d")}
@@ -44,8 +69,8 @@ User's Financial Data:
 - Savings Rate: {financial_data.get('savings_rate', 0):.1f}%
 - Credit Score: {financial_data.get('credit_score', 0)}
 - Investment Portfolio: ${financial_data.get('investment_balance', 0):,.2f}
-- Recent Transactions: {json.dumps(financial_data.get('recent_transactions', [])[:5])}
-- Financial Goals: {json.dumps(financial_data.get('goals', []))}
+{activity}
+- Financial Goals: {json.dumps(financial_data.get('goals', []))}{signal_lines}
 
 Based on this data, provide ONE proactive insight or alert that would be valuable for the user.
 Format your response as JSON with these fields:
@@ -59,8 +84,8 @@ Only provide an insight if it's genuinely valuable. If nothing significant, retu
 Your response must be valid JSON or null."""
 
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
+            key = response_cache.make_key(self.agent_id, prompt)
+            result_text = await inflight.do(key, lambda: self.llm.generate(prompt))
             
             # Handle null response
             if result_text.lower() == "null" or not result_text:
@@ -76,65 +101,128 @@ Your response must be valid JSON or null."""
             
             return insight
             
+        except LLMUnavailableError:
+            if raise_errors:
+                raise
+            return None
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error generating insight for {self.name}: {e}")
             return None
     
-    async def chat(self, message: str, conversation_history: List[Dict] = None) -> str:
-        """Chat with the user based on agent personality"""
+    def _build_context(self, message: str, conversation_history: Iterable[Dict] = None) -> str:
+        """Build the prompt sent to the model for a chat turn"""
+        return build_chat_prompt(self.system_prompt, self.name, message, conversation_history)
+    
+    async def chat(self, message: str, conversation_history: Iterable[Dict] = None, coalesce: bool = True) -> str:
+        """Chat with the user based on agent personality
+
+        Identical prompts already in flight share one model call unless
+        ``coalesce`` is False (hedged requests need their own call).
+        """
         # Build conversation context
-        context = self.system_prompt + "\n\nConversation History:\n"
-        
-        if conversation_history:
-            for msg in conversation_history[-5:]:  # Last 5 messages for context
-                role = "User" if msg['role'] == 'user' else self.name
-                context += f"\nUser: {message}\n{self.name}:"
+        context = self._build_context(message, conversation_history)
         
-        context += f"\nUser: {message}\n{self.name}:"
+        # Stateless prompts (onboarding suggestions, team questions) are cacheable
+        cache_key = None
+        if not conversation_history:
+            cache_key = response_cache.make_key(self.agent_id, message)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
         try:
-            response = self.model.generate_content(context)
-            return response.text.strip()
+            if coalesce:
+                key = cache_key or response_cache.make_key(self.agent_id, context)
+                reply = await inflight.do(key, lambda: self.llm.generate(context))
+            else:
+                reply = await self.llm.generate(context)
+            if cache_key and reply:
+                response_cache.set(cache_key, reply)
+            return reply
+        except LLMUnavailableError:
+            # Gate is shedding load; answer instantly without touching the model
+            return self._get_fallback_response(message)
         except Exception as e:
             print(f"Error in chat for {self.name}: {e}")
             # Check if it's a quota error
-            if "429" in str(e) or "quota" in str(e).lower():
+            if is_quota_error(e):
                 return self._get_fallback_response(message)
             return f"I apologize, but I'm having trouble processing that request. Could you please try again?"
     
+    async def chat_stream(self, message: str, conversation_history: Iterable[Dict] = None) -> AsyncIterator[str]:
+        """Stream a chat reply chunk by chunk as the model generates it"""
+        context = self._build_context(message, conversation_history)
+        
+        cache_key = None
+        if not conversation_history:
+            cache_key = response_cache.make_key(self.agent_id, message)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts: List[str] = []
+        try:
+            async for chunk in self.llm.stream(context):
+                # Strip leading whitespace the same way chat() does
+                if not parts:
+                    chunk = chunk.lstrip()
+                    if not chunk:
+                        continue
+                parts.append(chunk)
+                yield chunk
+        except LLMUnavailableError:
+            if not parts:
+                yield self._get_fallback_response(message)
+            return
+        except Exception as e:
+            print(f"Error in chat stream for {self.name}: {e}")
+            if parts:
+                return
+            if is_quota_error(e):
+                yield self._get_fallback_response(message)
+            else:
+                yield "I apologize, but I'm having trouble processing that request. Could you please try again?"
+            return
+        
+        if cache_key and parts:
+            response_cache.set(cache_key, "".join(parts).strip())
+    
     def _get_fallback_response(self, message: str) -> str:
         """Provide an intelligent fallback response based on agent personality"""
-        message_lower = message.lower()
+        intents = classify(message)
         
         # Sofia's fallback responses
         if self.agent_id == "sofia":
-            if "credit" in message_lower:
+            if "credit" in intents:
                 return """Building credit with limited income requires consistent, strategic steps. Start with a secured credit card - deposit what you can afford (even $200 works). Use it for one small monthly purchase and pay it off immediately. Keep your utilization below 30%, ideally under 10%. Set up autopay to never miss payments. Consider becoming an authorized user on a trusted family member's card. Most importantly, be patient - good credit takes time but these habits will get you there."""
-            elif "budget" in message_lower:
+            elif "budget" in intents:
                 return """Budgeting on a tight income starts with the 50/30/20 rule adjusted to your reality - perhaps 70/20/10 if needed. Track every expense for one week to see where money goes. Use free apps like Mint or even a simple notebook. Pay yourself first - even $10 saved is progress. Look for small wins: cancel unused subscriptions, meal prep to reduce food costs, and use the envelope method for discretionary spending. Remember, a budget is a tool for freedom, not restriction."""
-            elif "debt" in message_lower:
+            elif "debt" in intents:
                 return """Tackling debt on limited income requires a strategic approach. List all debts from smallest to largest. Make minimum payments on everything, then attack the smallest debt first (snowball method) for psychological wins. If interest rates are crushing you, consider the avalanche method instead - pay minimums plus extra on highest rate debt. Look into hardship programs with your creditors - many offer reduced payments or interest rates. Consider a side gig for extra debt payments, even $50/month extra makes a difference."""
             else:
                 return """Financial stability starts with small, consistent steps. Focus on building an emergency fund (even $5/week helps), tracking your spending to find savings opportunities, and educating yourself with free resources. Set one achievable goal this month - whether it's saving $20, understanding your credit report, or creating a simple budget. Small wins build momentum toward bigger financial goals."""
         
         # Marcus's fallback responses
         elif self.agent_id == "marcus":
-            if "invest" in message_lower or "portfolio" in message_lower:
+            if "invest" in intents:
                 return """Starting to invest with limited funds is easier than ever. Begin with employer 401(k) matching - it's free money. No 401(k)? Open a Roth IRA and start with $25/month in a low-cost index fund (like VTSAX or VOO). Use apps like Fidelity or Vanguard that have no minimums. Consider fractional shares to own pieces of expensive stocks. Focus on time in market over timing the market. Even $10/week invested over 30 years can grow to significant wealth through compound interest."""
-            elif "retirement" in message_lower:
+            elif "retirement" in intents:
                 return """Retirement planning on a budget starts with understanding compound interest is your friend. If you're young, time is your biggest asset. Contribute to employer 401(k) up to the match first. Then open a Roth IRA - contributions grow tax-free. Can't afford much? Start with 1% of income and increase by 1% yearly. At age 25, $50/month can become $250,000 by retirement. Use target-date funds for simple, automatic diversification. Remember: starting small beats not starting at all."""
-            elif "save" in message_lower or "emergency" in message_lower:
+            elif "save" in intents:
                 return """Building savings requires automation and strategy. Start with a high-yield savings account (many offer 4-5% APY). Automate transfers - even $10/week adds up to $520/year. Use the 52-week challenge: save $1 week one, $2 week two, etc. Round-up apps can painlessly save spare change. Aim for $1,000 emergency fund first, then one month expenses, building to 3-6 months. Keep it separate from checking to reduce temptation. Tax refunds and windfalls go straight to savings."""
             else:
                 return """Building wealth starts with understanding money fundamentals. Focus on increasing income (skills, side hustles) while controlling expenses. Learn about compound interest - it's the eighth wonder of the world. Start investing early, even small amounts. Understand the difference between assets (put money in your pocket) and liabilities (take money out). Read one finance book monthly - start with 'The Richest Man in Babylon' or 'A Random Walk Down Wall Street'. Knowledge compounds faster than money."""
         
         # Luna's fallback responses
         elif self.agent_id == "luna":
-            if "spend" in message_lower or "impulse" in message_lower:
+            if "spend" in intents:
                 return """Impulse spending often stems from emotional triggers - stress, boredom, or seeking happiness. Try the 24-hour rule: wait a day before any non-essential purchase. Create friction: unlink credit cards from online accounts, use cash envelopes, or freeze credit cards (literally, in ice!). When tempted, ask 'Am I buying this thing or the feeling?' Find free dopamine hits: nature walks, library visits, or calling friends. Track your triggers in a journal - awareness is the first step to change."""
-            elif "stress" in message_lower or "anxiety" in message_lower:
+            elif "stress" in intents:
                 return """Financial anxiety is valid and common - you're not alone. Start with small, controllable actions: organize one financial document, save one dollar, or learn one new term. Practice the 5-4-3-2-1 grounding technique when money stress hits. Celebrate micro-wins - paying a bill on time deserves recognition! Reframe thoughts: instead of 'I'm bad with money,' try 'I'm learning about money.' Consider free financial counseling through non-profits. Remember: progress over perfection, always."""
-            elif "habit" in message_lower or "change" in message_lower:
+            elif "habit" in intents:
                 return """Changing financial habits is about small, sustainable shifts. Start with one keystone habit - like checking your bank balance daily. Stack new habits onto existing ones: review spending while having morning coffee. Use implementation intentions: 'When I get paid, I will immediately transfer 10% to savings.' Make good choices easier (automate savings) and bad choices harder (leave credit cards at home). Track streaks - even 3 days of bringing lunch deserves celebration. Be kind to yourself during setbacks - they're part of the journey."""
             else:
                 return """Your relationship with money reflects your values and experiences - there's no shame in struggling. Start by identifying one money story you tell yourself and gently question it. Practice gratitude for what you have while working toward goals. Use visualization: spend 2 minutes daily imagining your financially secure future self. Create positive money mantras: 'I make thoughtful financial choices' or 'Money flows to me easily.' Remember, emotional wealth (peace, security, confidence) is the real goal - money is just the tool."""
@@ -3,17 +3,58 @@ Chat API endpoints for agent conversations
 """
 
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import StreamingResponse
 from datetime import datetime
-from typing import List, Dict
+from typing import AsyncIterator, List, Dict, Optional, Set
+import json
 
 from app.models.schemas import ChatMessage, ChatResponse
-from app.agents.personalities import get_agent
+from app.agents.personalities import AGENTS, get_agent
+from app.agents.context_builder import CHAT_HISTORY_LIMIT, ConversationBuffer
 from app.services.financial_simulator import get_user_financial_data
+from app.services.financial_store import DEFAULT_USER_ID
+from app.services.llm_cache import inflight, response_cache
+from app.services.llm_gate import llm_gate
+from app.db.database import (
+    delete_conversation,
+    load_conversation,
+    pending_conversation_messages,
+    queue_conversation_message,
+)
 
 router = APIRouter()
 
-# Store conversation history (in production, use a database)
-conversation_history: Dict[str, List[Dict]] = {}
+# In-memory cache of conversation history, backed by the database
+conversation_history: Dict[str, ConversationBuffer] = {}
+# Cached histories another worker has changed since they were loaded
+_stale_histories: Set[str] = set()
+
+def invalidate_history(user_id: str, agent_id: Optional[str] = None):
+    """Mark a user's cached history with one agent (None: every agent) as changed elsewhere"""
+    agent_ids = [agent_id] if agent_id else list(AGENTS)
+    _stale_histories.update(
+        key for key in (f"{user_id}_{agent}" for agent in agent_ids) if key in conversation_history
+    )
+
+async def _get_history(agent_id: str, user_id: str = DEFAULT_USER_ID) -> ConversationBuffer:
+    """Cached history for a user/agent pair, loaded from the database on first use
+
+    A stale history is reloaded once this worker's own queued turns for the
+    pair are committed, so none of them go missing from the reload.
+    """
+    history_key = f"{user_id}_{agent_id}"
+    if history_key in _stale_histories and not pending_conversation_messages(user_id, agent_id):
+        _stale_histories.discard(history_key)
+        conversation_history.pop(history_key, None)
+    if history_key not in conversation_history:
+        turns = await load_conversation(user_id, agent_id, limit=CHAT_HISTORY_LIMIT)
+        conversation_history[history_key] = ConversationBuffer(turns)
+    return conversation_history[history_key]
+
+def _append_history(agent_id: str, entry: Dict, user_id: str = DEFAULT_USER_ID):
+    """Append a turn to the cached history and queue it for persistence"""
+    conversation_history[f"{user_id}_{agent_id}"].append(entry)
+    queue_conversation_message(user_id, agent_id, entry)
 
 @router.post("/", response_model=ChatResponse)
 async def chat_with_agent(message: ChatMessage):
@@ -24,12 +65,11 @@ async def chat_with_agent(message: ChatMessage):
         raise HTTPException(status_code=404, detail=f"Agent {message.agent_id} not found")
     
     # Get or create conversation history for this agent
-    history_key = f"demo_user_{message.agent_id}"
-    if history_key not in conversation_history:
-        conversation_history[history_key] = []
+    agent_id = agent.agent_id
+    history = await _get_history(agent_id)
     
     # Add user message to history
-    conversation_history[history_key].append({
+    _append_history(agent_id, {
         "role": "user",
         "content": message.message,
         "timestamp": datetime.now().isoformat()
@@ -37,21 +77,15 @@ async def chat_with_agent(message: ChatMessage):
     
     try:
         # Get response from agent
-        response_text = await agent.chat(
-            message.message,
-            conversation_history[history_key]
-        )
+        response_text = await agent.chat(message.message, history)
         
         # Add agent response to history
-        conversation_history[history_key].append({
+        _append_history(agent_id, {
             "role": "assistant",
             "content": response_text,
             "timestamp": datetime.now().isoformat()
         })
         
-        # Keep only last 20 messages
-        conversation_history[history_key] = conversation_history[history_key][-20:]
-        
         return ChatResponse(
             agent_id=agent.agent_id,
             agent_name=agent.name,
@@ -63,15 +97,63 @@ async def chat_with_agent(message: ChatMessage):
         print(f"Error in chat: {e}")
         raise HTTPException(status_code=500, detail="Failed to get response from agent")
 
+async def stream_chat_events(agent_id: str, text: str) -> AsyncIterator[Dict]:
+    """Stream a chat turn as events; the finished reply is added to history at the end"""
+    agent = get_agent(agent_id)
+    history = await _get_history(agent_id)
+    
+    _append_history(agent_id, {
+        "role": "user",
+        "content": text,
+        "timestamp": datetime.now().isoformat()
+    })
+    
+    parts: List[str] = []
+    async for chunk in agent.chat_stream(text, history):
+        parts.append(chunk)
+        yield {"type": "chat_chunk", "agent_id": agent_id, "text": chunk}
+    
+    response_text = "".join(parts).strip()
+    _append_history(agent_id, {
+        "role": "assistant",
+        "content": response_text,
+        "timestamp": datetime.now().isoformat()
+    })
+    
+    yield {
+        "type": "chat_done",
+        "agent_id": agent_id,
+        "agent_name": agent.name,
+        "response": response_text,
+        "timestamp": datetime.now().isoformat()
+    }
+
+@router.post("/stream")
+async def stream_chat_with_agent(message: ChatMessage):
+    """Chat with a specific agent, streaming the reply as Server-Sent Events"""
+    agent = get_agent(message.agent_id)
+    
+    if not agent:
+        raise HTTPException(status_code=404, detail=f"Agent {message.agent_id} not found")
+    
+    async def event_stream():
+        async for event in stream_chat_events(agent.agent_id, message.message):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/history/{agent_id}")
 async def get_chat_history(agent_id: str):
     """Get conversation history with a specific agent"""
-    history_key = f"demo_user_{agent_id}"
-    history = conversation_history.get(history_key, [])
+    history = await _get_history(agent_id)
     
     return {
         "agent_id": agent_id,
-        "history": history,
+        "history": list(history),
         "message_count": len(history)
     }
 
@@ -181,9 +263,11 @@ Keep it conversational, encouraging, and under 150 words."""
 @router.delete("/history/{agent_id}")
 async def clear_chat_history(agent_id: str):
     """Clear conversation history with a specific agent"""
-    history_key = f"demo_user_{agent_id}"
+    history_key = f"{DEFAULT_USER_ID}_{agent_id}"
     if history_key in conversation_history:
         del conversation_history[history_key]
+    _stale_histories.discard(history_key)
+    await delete_conversation(DEFAULT_USER_ID, agent_id)
     
     return {"status": "success", "message": f"Chat history cleared for {agent_id}"}
 
@@ -191,5 +275,16 @@ async def clear_chat_history(agent_id: str):
 async def clear_all_chat_history():
     """Clear all conversation history (useful when switching profiles)"""
     conversation_history.clear()
+    _stale_histories.clear()
+    await delete_conversation(DEFAULT_USER_ID)
     
     return {"status": "success", "message": "All chat history cleared"}
+
+@router.get("/llm-stats")
+async def get_llm_stats():
+    """LLM response cache, request coalescing and rate-limit gate statistics"""
+    return {
+        "cache": response_cache.stats(),
+        "singleflight": inflight.stats(),
+        "gate": llm_gate.stats(),
+    }
@@ -2,7 +2,10 @@
 Financial Data API endpoints
 """
 
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Query, Request, Response
+from fastapi.responses import JSONResponse
+import time
+from datetime import datetime
 from typing import Dict, Optional
 
 from app.models.schemas import FinancialData, DemoScenario
@@ -11,138 +14,129 @@ from app.services.financial_simulator import (
     update_user_goal_progress,
     simulate_transaction
 )
+from app.services.analytics import analytics_store, day_index
+from app.services.financial_metrics import etag_matches, make_etag, metrics_store
+from app.services.financial_store import DEFAULT_USER_ID
 
 router = APIRouter()
 
+TRANSACTION_PAGE_SIZE = 50
+TRANSACTION_PAGE_MAX = 500
+
+def _not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 response when the client's cached copy matches ``etag``"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    return None
+
+def _versioned(content, etag: str) -> JSONResponse:
+    return JSONResponse(content=content, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
 @router.get("/summary", response_model=FinancialData)
-async def get_financial_summary():
+async def get_financial_summary(request: Request, user_id: str = DEFAULT_USER_ID):
     """Get user's financial summary"""
-    data = await get_user_financial_data()
-    return FinancialData(**data)
+    data = await get_user_financial_data(user_id=user_id)
+    etag = make_etag("s", data.version)
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    return _versioned(FinancialData(**data).model_dump(), etag)
 
 @router.post("/summary")
-async def get_personalized_financial_summary(quiz_data: Dict = Body(...)):
+async def get_personalized_financial_summary(quiz_data: Dict = Body(...), user_id: str = DEFAULT_USER_ID):
     """Get user's financial summary personalized by quiz data"""
-    data = await get_user_financial_data(quiz_data)
+    data = await get_user_financial_data(quiz_data, user_id=user_id)
     return data
 
+def _metrics_response(request: Request, user_id: str, data) -> Response:
+    """Serve the user's precomputed metrics, or 304 if the client's copy is current"""
+    aggregate = metrics_store.get(user_id, data)
+    cached = _not_modified(request, aggregate.etag)
+    if cached:
+        return cached
+    headers = {"ETag": aggregate.etag, "Cache-Control": "no-cache"}
+    return Response(content=aggregate.body(), media_type="application/json", headers=headers)
+
 @router.get("/metrics")
-async def get_financial_metrics():
+async def get_financial_metrics(request: Request, user_id: str = DEFAULT_USER_ID):
     """Get financial metrics for dashboard"""
-    data = await get_user_financial_data()
-    
-    # Calculate additional metrics
-    savings_percentage = (data["savings_balance"] / data["total_balance"]) * 100 if data["total_balance"] > 0 else 0
-    debt_to_income = (data["credit_card_debt"] / data["monthly_income"]) * 100 if data["monthly_income"] > 0 else 0
-    
-    return {
-        "metrics": [
-            {
-                "title": "Total Balance",
-                "value": data["total_balance"],
-                "kind": "currency",
-                "currency": "USD",
-                "change": {"value": 12.5, "isPositive": True}
-            },
-            {
-                "title": "Credit Score",
-                "value": data["credit_score"],
-                "kind": "number",
-                "change": {"value": -8, "isPositive": False}
-            },
-            {
-                "title": "Savings Rate",
-                "value": data["savings_rate"] / 100,  # Convert to decimal for percent
-                "kind": "percent",
-                "change": {"value": 15, "isPositive": True}
-            },
-            {
-                "title": "Investment Portfolio",
-                "value": data["investment_balance"],
-                "kind": "currency",
-                "currency": "USD",
-                "change": {"value": 3.2, "isPositive": True}
-            }
-        ],
-        "summary": {
-            "checking": data["checking_balance"],
-            "savings": data["savings_balance"],
-            "investments": data["investment_balance"],
-            "debt": data["credit_card_debt"],
-            "net_worth": data["total_balance"] - data["credit_card_debt"]
-        }
-    }
+    data = await get_user_financial_data(user_id=user_id)
+    return _metrics_response(request, user_id, data)
 
 @router.post("/metrics")
-async def get_personalized_financial_metrics(quiz_data: Dict = Body(...)):
+async def get_personalized_financial_metrics(request: Request, quiz_data: Dict = Body(...), user_id: str = DEFAULT_USER_ID):
     """Get financial metrics for dashboard, personalized by quiz data"""
-    data = await get_user_financial_data(quiz_data)
-    
-    # Calculate additional metrics
-    savings_percentage = (data["savings_balance"] / data["total_balance"]) * 100 if data["total_balance"] > 0 else 0
-    debt_to_income = (data["credit_card_debt"] / data["monthly_income"]) * 100 if data["monthly_income"] > 0 else 0
-    
-    return {
-        "metrics": [
-            {
-                "title": "Total Balance",
-                "value": data["total_balance"],
-                "kind": "currency",
-                "currency": "USD",
-                "change": {"value": 12.5, "isPositive": True}
-            },
-            {
-                "title": "Credit Score",
-                "value": data["credit_score"],
-                "kind": "number",
-                "change": {"value": -8, "isPositive": False}
-            },
-            {
-                "title": "Savings Rate",
-                "value": data["savings_rate"] / 100,  # Convert to decimal for percent
-                "kind": "percent",
-                "change": {"value": 15, "isPositive": True}
-            },
-            {
-                "title": "Investment Portfolio",
-                "value": data["investment_balance"],
-                "kind": "currency",
-                "currency": "USD",
-                "change": {"value": 3.2, "isPositive": True}
-            }
-        ],
-        "summary": {
-            "checking": data["checking_balance"],
-            "savings": data["savings_balance"],
-            "investments": data["investment_balance"],
-            "debt": data["credit_card_debt"],
-            "net_worth": data["total_balance"] - data["credit_card_debt"]
-        }
-    }
+    data = await get_user_financial_data(quiz_data, user_id=user_id)
+    return _metrics_response(request, user_id, data)
 
 @router.get("/transactions")
-async def get_recent_transactions():
-    """Get recent transactions"""
-    data = await get_user_financial_data()
-    return {
-        "transactions": data["recent_transactions"],
-        "count": len(data["recent_transactions"])
-    }
+async def get_recent_transactions(
+    request: Request,
+    user_id: str = DEFAULT_USER_ID,
+    since: Optional[int] = None,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=TRANSACTION_PAGE_MAX),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Get recent transactions
+
+    ``since`` returns only transactions added after that version. ``cursor``,
+    ``limit``, ``start`` and ``end`` page newest first through the full
+    history; pass ``next_cursor`` back as ``cursor`` for the next page.
+    """
+    data = await get_user_financial_data(user_id=user_id)
+    etag = make_etag("t", data.transactions_version)
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+
+    log = data.transactions
+    if cursor is not None or limit is not None or start or end:
+        page = log.page(cursor=cursor, limit=limit or TRANSACTION_PAGE_SIZE, start=start, end=end)
+        page["count"] = len(page["transactions"])
+        page["version"] = data.transactions_version
+        return _versioned(page, etag)
+
+    transactions = log.since(since) if since is not None else data["recent_transactions"]
+    return _versioned({
+        "transactions": transactions,
+        "count": len(transactions),
+        "version": data.transactions_version
+    }, etag)
+
+@router.get("/analytics")
+async def get_spending_analytics(request: Request, user_id: str = DEFAULT_USER_ID):
+    """Rolling 7/30/90-day spend by category, month-to-date totals and trends"""
+    data = await get_user_financial_data(user_id=user_id)
+    # Windows slide daily even without new transactions
+    etag = make_etag("a", f"{data.transactions_version}.{day_index(time.time())}")
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    return _versioned(analytics_store.get(user_id, data.transactions).summary(), etag)
 
 @router.get("/goals")
-async def get_financial_goals():
+async def get_financial_goals(request: Request, user_id: str = DEFAULT_USER_ID):
     """Get financial goals and progress"""
-    data = await get_user_financial_data()
-    return {
+    data = await get_user_financial_data(user_id=user_id)
+    etag = make_etag("g", data.goals_version)
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+
+    aggregate = metrics_store.get(user_id, data)
+    return _versioned({
         "goals": data["goals"],
-        "total_progress": sum(g["current"] for g in data["goals"]),
-        "total_target": sum(g["target"] for g in data["goals"])
-    }
+        "total_progress": aggregate.goal_current,
+        "total_target": aggregate.goal_target,
+        "version": data.goals_version
+    }, etag)
 
 @router.post("/goals/{goal_name}/contribute")
-async def contribute_to_goal(goal_name: str, amount: float):
+async def contribute_to_goal(goal_name: str, amount: float, user_id: str = DEFAULT_USER_ID):
     """Contribute to a financial goal"""
-    goal = await update_user_goal_progress(goal_name, amount)
+    goal = await update_user_goal_progress(goal_name, amount, user_id)
     if not goal:
         raise HTTPException(status_code=404, detail=f"Goal '{goal_name}' not found")
     
@@ -153,10 +147,10 @@ async def contribute_to_goal(goal_name: str, amount: float):
     }
 
 @router.post("/simulate-transaction")
-async def simulate_new_transaction():
+async def simulate_new_transaction(user_id: str = DEFAULT_USER_ID):
     """Simulate a new transaction (for demo purposes)"""
-    data = await get_user_financial_data()
-    transaction = await simulate_transaction(data)
+    data = await get_user_financial_data(user_id=user_id)
+    transaction = await simulate_transaction(user_id)
     
     return {
         "status": "success",
@@ -4,13 +4,16 @@ Team API: Ask all agents and return a curated plan with brief disagreements.
 
 import os
 import asyncio
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import json
 
 from app.agents.personalities import AGENTS
+from app.agents.intents import IntentMatcher, classify
+from app.services.llm_client import LLMClient
 
 # Optional Gemini curator
 try:
@@ -25,158 +28,185 @@ try:
 except Exception:
     _CURATOR_MODEL = None
 
+_CURATOR_LLM = LLMClient(_CURATOR_MODEL) if _CURATOR_MODEL else None
+
+# Latency budget for /ask (seconds)
+TEAM_DEADLINE = float(os.getenv("TEAM_DEADLINE", 20))
+TEAM_CURATOR_RESERVE = float(os.getenv("TEAM_CURATOR_RESERVE", 5))
+TEAM_HEDGE_AFTER = float(os.getenv("TEAM_HEDGE_AFTER", 6))  # 0 disables hedging
+
+TEAM_AGENT_IDS = ["sofia", "marcus", "luna"]
+
+# Concrete recommendations worth spotting in agent replies
+_ADVICE = IntentMatcher({
+    "secured_card": ("secured credit card",),
+    "authorized_user": ("authorized user",),
+    "builder_loan": ("credit builder loan", "credit-builder loan"),
+    "reporting": ("rent reporting", "utility reporting"),
+    "payment_history": ("payment history",),
+})
+
 router = APIRouter()
 
 class AskTeamRequest(BaseModel):
     question: str
 
-@router.post("/ask")
-async def ask_team(req: AskTeamRequest):
-    question = req.question.strip()
-    if not question:
-        raise HTTPException(status_code=400, detail="Question is required")
+def _heuristic_curate(question_text: str, responses: List[Dict[str, Any]]):
+    """Extract actionable steps from agent responses"""
+    # Classify the question once
+    intents = classify(question_text)
 
-    # Fan-out to all agents concurrently
-    async def ask_agent(agent_id: str):
-        try:
-            agent = AGENTS[agent_id]
-            reply = await agent.chat(question, [])
-            return {"agent_id": agent_id, "agent_name": agent.name, "response": reply}
-        except Exception as e:
-            return {"agent_id": agent_id, "agent_name": AGENTS[agent_id].name, "response": f"(Error: {e})"}
+    # Extract key advice from all agents in one pass
+    all_advice = _ADVICE.match("\n".join(r.get("response", "") for r in responses))
 
-    agent_ids = ["sofia", "marcus", "luna"]
-    results: List[Dict[str, Any]] = await asyncio.gather(*[ask_agent(aid) for aid in agent_ids])
+    # Build appropriate steps based on question context
+    steps = []
 
-    # Curate a unified plan if possible
-    curated: Dict[str, Any] = {
-        "summary": None,
-        "steps": [],
-        "disagreements": [],
-        "recommended_agent": None,
+    # Credit building questions
+    if "credit" in intents:
+        steps = [
+            "Start with a secured credit card - deposit what you can afford ($200-500)",
+            "Use the card for one small monthly purchase and pay it off immediately", 
+            "Keep credit utilization below 30% (ideally under 10%)",
+            "Consider becoming an authorized user on a trusted family member's card",
+            "Set up autopay to ensure you never miss a payment"
+        ]
+    # Budgeting questions
+    elif "budget" in intents:
+        steps = [
+            "Track all expenses for one week to understand spending patterns",
+            "Apply the 50/30/20 rule (or adjust to 70/20/10 based on income)",
+            "Automate savings - even $10/week builds to $520/year",
+            "Cancel unused subscriptions and find small cost-cutting wins",
+            "Use the envelope method for discretionary spending"
+        ]
+    # Investment questions  
+    elif "invest" in intents:
+        steps = [
+            "Start with employer 401(k) match if available - it's free money",
+            "Open a Roth IRA with low-cost index funds (VTSAX, VOO)",
+            "Begin with as little as $25/month - consistency matters more than amount",
+            "Use fractional shares to own pieces of expensive stocks",
+            "Focus on time in market rather than timing the market"
+        ]
+    # Debt questions
+    elif "debt" in intents:
+        steps = [
+            "List all debts from smallest to largest (snowball method)",
+            "Make minimum payments on all debts",
+            "Put any extra money toward the smallest debt first",
+            "Consider debt consolidation if interest rates are high",
+            "Look into hardship programs with creditors for reduced payments"
+        ]
+    # Emergency fund or savings
+    elif "save" in intents:
+        steps = [
+            "Open a high-yield savings account (4-5% APY available)",
+            "Start with $1,000 as your first emergency fund goal",
+            "Automate weekly transfers - even $10 adds up",
+            "Use the 52-week challenge or round-up apps",
+            "Keep emergency funds separate from checking account"
+        ]
+    # Default general financial advice
+    else:
+        steps = [
+            "Create a simple budget to track income and expenses",
+            "Build an emergency fund starting with $500",
+            "Focus on consistent bill payments to build credit",
+            "Educate yourself with free financial resources",
+            "Set one achievable financial goal for this month"
+        ]
+
+    # Generate appropriate summary based on question
+    if "credit" in intents:
+        summary = "Building credit with limited income is achievable through strategic, consistent actions. All three advisors agree that secured credit cards and payment history are crucial. The key is starting small and being consistent."
+    elif "budget" in intents:
+        summary = "Creating a budget on limited income requires tracking expenses and making small adjustments. Our advisors emphasize starting with awareness and celebrating small wins."
+    elif "invest" in intents:
+        summary = "Investing with limited funds is possible through employer matches, low-cost index funds, and fractional shares. Time in the market beats timing the market."
+    else:
+        summary = "Your financial advisors have analyzed your question and created a personalized action plan. Each step builds toward greater financial stability."
+
+    # Determine recommended agent based on question type
+    if intents & {"credit", "debt"}:
+        recommended = "sofia"
+    elif intents & {"invest", "retirement"}:
+        recommended = "marcus"
+    elif intents & {"habit", "stress", "spend"}:
+        recommended = "luna" 
+    else:
+        recommended = "sofia"  # Default to Sofia for general questions
+
+    # Note any disagreements (simplified)
+    disagreements = []
+    if "secured_card" in all_advice and "builder_loan" in all_advice:
+        disagreements.append("Sofia prefers secured cards while Marcus also suggests credit-builder loans")
+
+    return {
+        "summary": summary,
+        "steps": steps[:5],  # Return top 5 steps
+        "disagreements": disagreements[:2],  # Limit disagreements
+        "recommended_agent": recommended,
     }
 
-    def _heuristic_curate(question_text: str, responses: List[Dict[str, Any]]):
-        """Extract actionable steps from agent responses"""
-        # Analyze question to determine focus
-        question = question_text.lower()
-        
-        # Extract key advice from each agent
-        all_advice = []
-        for r in responses:
-            raw = r.get("response", "")
-            
-            # Look for specific actionable patterns
-            if "secured credit card" in raw.lower():
-                all_advice.append("secured_card")
-            if "authorized user" in raw.lower():
-                all_advice.append("authorized_user")
-            if "credit builder loan" in raw.lower() or "credit-builder loan" in raw.lower():
-                all_advice.append("builder_loan")
-            if "rent reporting" in raw.lower() or "utility reporting" in raw.lower():
-                all_advice.append("reporting")
-            if "payment history" in raw.lower():
-                all_advice.append("payment_history")
-                
-        # Build appropriate steps based on question context
-        steps = []
-        
-        # Credit building questions
-        if "credit" in question:
-            steps = [
-                "Start with a secured credit card - deposit what you can afford ($200-500)",
-                "Use the card for one small monthly purchase and pay it off immediately", 
-                "Keep credit utilization below 30% (ideally under 10%)",
-                "Consider becoming an authorized user on a trusted family member's card",
-                "Set up autopay to ensure you never miss a payment"
-            ]
-        # Budgeting questions
-        elif "budget" in question:
-            steps = [
-                "Track all expenses for one week to understand spending patterns",
-                "Apply the 50/30/20 rule (or adjust to 70/20/10 based on income)",
-                "Automate savings - even $10/week builds to $520/year",
-                "Cancel unused subscriptions and find small cost-cutting wins",
-                "Use the envelope method for discretionary spending"
-            ]
-        # Investment questions  
-        elif "invest" in question or "portfolio" in question:
-            steps = [
-                "Start with employer 401(k) match if available - it's free money",
-                "Open a Roth IRA with low-cost index funds (VTSAX, VOO)",
-                "Begin with as little as $25/month - consistency matters more than amount",
-                "Use fractional shares to own pieces of expensive stocks",
-                "Focus on time in market rather than timing the market"
-            ]
-        # Debt questions
-        elif "debt" in question:
-            steps = [
-                "List all debts from smallest to largest (snowball method)",
-                "Make minimum payments on all debts",
-                "Put any extra money toward the smallest debt first",
-                "Consider debt consolidation if interest rates are high",
-                "Look into hardship programs with creditors for reduced payments"
-            ]
-        # Emergency fund or savings
-        elif "save" in question or "emergency" in question:
-            steps = [
-                "Open a high-yield savings account (4-5% APY available)",
-                "Start with $1,000 as your first emergency fund goal",
-                "Automate weekly transfers - even $10 adds up",
-                "Use the 52-week challenge or round-up apps",
-                "Keep emergency funds separate from checking account"
-            ]
-        # Default general financial advice
-        else:
-            steps = [
-                "Create a simple budget to track income and expenses",
-                "Build an emergency fund starting with $500",
-                "Focus on consistent bill payments to build credit",
-                "Educate yourself with free financial resources",
-                "Set one achievable financial goal for this month"
-            ]
-            
-        # Generate appropriate summary based on question
-        if "credit" in question:
-            summary = "Building credit with limited income is achievable through strategic, consistent actions. All three advisors agree that secured credit cards and payment history are crucial. The key is starting small and being consistent."
-        elif "budget" in question:
-            summary = "Creating a budget on limited income requires tracking expenses and making small adjustments. Our advisors emphasize starting with awareness and celebrating small wins."
-        elif "invest" in question:
-            summary = "Investing with limited funds is possible through employer matches, low-cost index funds, and fractional shares. Time in the market beats timing the market."
-        else:
-            summary = "Your financial advisors have analyzed your question and created a personalized action plan. Each step builds toward greater financial stability."
-            
-        # Determine recommended agent based on question type
-        if "credit" in question or "debt" in question:
-            recommended = "sofia"
-        elif "invest" in question or "retirement" in question:
-            recommended = "marcus"
-        elif "habit" in question or "stress" in question or "spend" in question:
-            recommended = "luna" 
-        else:
-            recommended = "sofia"  # Default to Sofia for general questions
-            
-        # Note any disagreements (simplified)
-        disagreements = []
-        if "secured_card" in all_advice and "builder_loan" in all_advice:
-            disagreements.append("Sofia prefers secured cards while Marcus also suggests credit-builder loans")
-            
-        return {
-            "summary": summary,
-            "steps": steps[:5],  # Return top 5 steps
-            "disagreements": disagreements[:2],  # Limit disagreements
-            "recommended_agent": recommended,
-        }
-
-    curated_result = None
-    if _CURATOR_MODEL:
-        try:
-            curator_prompt = f"""
+async def _ask_agent(agent_id: str, question: str, coalesce: bool = True) -> Dict[str, Any]:
+    try:
+        agent = AGENTS[agent_id]
+        reply = await agent.chat(question, [], coalesce=coalesce)
+        return {"agent_id": agent_id, "agent_name": agent.name, "response": reply}
+    except Exception as e:
+        return {"agent_id": agent_id, "agent_name": AGENTS[agent_id].name, "response": f"(Error: {e})"}
+
+async def _ask_agent_hedged(agent_id: str, question: str, hedge_after: float = TEAM_HEDGE_AFTER) -> Dict[str, Any]:
+    """Ask one agent; if it stalls past ``hedge_after``, race a second request"""
+    primary = asyncio.create_task(_ask_agent(agent_id, question))
+    if hedge_after <= 0:
+        return await primary
+
+    done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    if done:
+        return primary.result()
+
+    # The hedge must not join the stalled call it is meant to race
+    hedge = asyncio.create_task(_ask_agent(agent_id, question, coalesce=False))
+    try:
+        done, _ = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+        return done.pop().result()
+    finally:
+        primary.cancel()
+        hedge.cancel()
+
+async def _iter_team(question: str, deadline: float) -> AsyncIterator[Dict[str, Any]]:
+    """Fan out to every agent and yield replies as they arrive, until ``deadline`` (loop time)"""
+    loop = asyncio.get_running_loop()
+    pending = {
+        asyncio.create_task(_ask_agent_hedged(agent_id, question))
+        for agent_id in TEAM_AGENT_IDS
+    }
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Late agents (or a client that went away) leave nothing running
+        for task in pending:
+            task.cancel()
+
+async def _curate(question: str, results: List[Dict[str, Any]], deadline: float) -> Dict[str, Any]:
+    """Curate with the model if budget remains, otherwise (or on failure) heuristically"""
+    remaining = deadline - asyncio.get_running_loop().time()
+    if _CURATOR_LLM and results and remaining > 0:
+        responses = "\n".join(f"{r['agent_name'].upper()}: {r['response']}" for r in results)
+        curator_prompt = f"""
 You are the team curator for FinancePal.
 The user asked:
 "{question}"
 
-Three advisors responded (Sofia=Financial Literacy Coach, Marcus=Investment Educator, Luna=Behavioral Coach).
+Advisors responded (Sofia=Financial Literacy Coach, Marcus=Investment Educator, Luna=Behavioral Coach).
 Produce a short JSON with fields:
 - summary: one-paragraph concise plan
 - steps: array of 3-5 short action steps (imperative voice)
@@ -184,26 +214,77 @@ Produce a short JSON with fields:
 - recommended_agent: one of 'sofia', 'marcus', or 'luna' who should lead the next step
 
 Responses:
-SOFIA: {results[0]['response']}
-MARCUS: {results[1]['response']}
-LUNA: {results[2]['response']}
+{responses}
 
 Return ONLY compact JSON.
 """
-            resp = _CURATOR_MODEL.generate_content(curator_prompt)
-            text = (resp.text or "").strip()
-            # try parse json
+        try:
+            text = await _CURATOR_LLM.generate(curator_prompt, timeout=remaining)
             curated_result = json.loads(text)
+            if curated_result:
+                return curated_result
         except Exception:
-            curated_result = None
+            pass
 
-    if not curated_result:
-        curated_result = _heuristic_curate(question, results)
+    return _heuristic_curate(question, results)
 
-    curated.update(curated_result)
+async def team_events(question: str) -> AsyncIterator[Dict[str, Any]]:
+    """Ask the team as a stream of events: one per agent reply, then the curated plan"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + TEAM_DEADLINE
 
-    return {
+    answered: Dict[str, Dict[str, Any]] = {}
+    async for result in _iter_team(question, deadline - TEAM_CURATOR_RESERVE):
+        answered[result["agent_id"]] = result
+        yield {"type": "agent_reply", **result}
+
+    results: List[Dict[str, Any]] = [answered[aid] for aid in TEAM_AGENT_IDS if aid in answered]
+    pending = [aid for aid in TEAM_AGENT_IDS if aid not in answered]
+
+    # Curate a unified plan if possible
+    curated: Dict[str, Any] = {
+        "summary": None,
+        "steps": [],
+        "disagreements": [],
+        "recommended_agent": None,
+    }
+    curated.update(await _curate(question, results, deadline))
+
+    yield {
+        "type": "team_done",
         "question": question,
         "curated": curated,
         "agents": results,
+        "pending": pending,
     }
+
+def _require_question(req: AskTeamRequest) -> str:
+    question = req.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Question is required")
+    return question
+
+@router.post("/ask")
+async def ask_team(req: AskTeamRequest):
+    question = _require_question(req)
+
+    # Fan-out to all agents concurrently; late agents are left out
+    async for event in team_events(question):
+        if event["type"] == "team_done":
+            event.pop("type")
+            return event
+
+@router.post("/ask/stream")
+async def ask_team_stream(req: AskTeamRequest):
+    """Ask the team, streaming each agent's reply as Server-Sent Events as soon as it lands"""
+    question = _require_question(req)
+
+    async def event_stream():
+        async for event in team_events(question):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
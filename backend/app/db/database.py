@@ -1,10 +1,641 @@
 """
-Database setup (simplified for hackathon)
-Using in-memory data for demo
+Database setup
+Async SQLAlchemy persistence (aiosqlite by default) for conversations,
+financial state and notifications
 """
 
+import asyncio
+import copy
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import case, delete, event, insert, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.db.models import (
+    Base,
+    ConversationMessage,
+    FinancialState,
+    NotificationRecord,
+    NotificationSequence,
+    TransactionRecord,
+)
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./financepal.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", 200))
+DB_FLUSH_INTERVAL = float(os.getenv("DB_FLUSH_INTERVAL", 0.5))
+# Rows the write buffer holds at most (oldest dropped beyond that) and how many flushes
+# in a row may fail on a transient error before the batch is dropped
+DB_BUFFER_MAX = int(os.getenv("DB_BUFFER_MAX", 20000))
+DB_FLUSH_RETRIES = int(os.getenv("DB_FLUSH_RETRIES", 5))
+
+engine: Optional[AsyncEngine] = None
+SessionLocal: Optional[async_sessionmaker] = None
+
+# Called with (financial user ids, (user id, agent id or None) chat pairs) after this
+# worker commits changes that other workers may hold cached copies of
+ChangeListener = Callable[[Set[str], Set[Tuple[str, Optional[str]]]], Awaitable[None]]
+_change_listeners: List[ChangeListener] = []
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    """Pooled async engine; SQLite gets WAL so several workers can share the file"""
+    is_sqlite = url.startswith("sqlite")
+    db_engine = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+    )
+
+    if is_sqlite:
+        @event.listens_for(db_engine.sync_engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.close()
+
+    return db_engine
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Errors worth retrying as is: locks, timeouts, lost connections"""
+    if isinstance(error, (OperationalError, PoolTimeoutError, OSError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+class WriteBuffer:
+    """Write-behind buffer that turns many small writes into batched inserts
+
+    Rows are queued synchronously by request handlers and flushed by a
+    background task every ``DB_FLUSH_INTERVAL`` seconds, or as soon as
+    ``DB_BATCH_SIZE`` rows are waiting. Financial state is written as the
+    changes themselves (add to a balance, contribute to a goal), applied to
+    the saved row inside the flush transaction, so workers changing the same
+    user do not overwrite each other; only a full snapshot (personalization)
+    replaces the row, superseding the changes queued before it. Transactions
+    are appended to the user's history; a queued reset deletes the history
+    written so far, in the same transaction as the rows that replace it.
+
+    A batch that fails with a transient error (lock, timeout, lost
+    connection) is put back and retried, up to DB_FLUSH_RETRIES times in a
+    row before it is dropped. Any other failure splits the batch in halves
+    until the rows that cannot be written are isolated; those are dropped
+    with a log line so they never hold up the rows behind them. At most
+    DB_BUFFER_MAX rows are held; beyond that the oldest are dropped.
+    """
+
+    def __init__(self):
+        self.messages: List[Dict] = []
+        self.notifications: List[Dict] = []
+        # user_id -> {"data": latest snapshot, "ops": changes to apply in order}
+        self.financial_states: Dict[str, Dict] = {}
+        self.transactions: List[Dict] = []
+        self.transaction_resets: Set[str] = set()
+        # Notifications taken by the flush in progress, until they are committed
+        self.notifications_in_flight: List[Dict] = []
+        # Users and chats the flush in progress is writing
+        self.financial_in_flight: Set[str] = set()
+        self.conversations_in_flight: Set[Tuple[str, str]] = set()
+        self.failures = 0
+        self.dropped = 0
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def pending(self) -> int:
+        return (len(self.messages) + len(self.notifications) + len(self.financial_states)
+                + len(self.transactions) + len(self.transaction_resets))
+
+    def notify(self):
+        self._trim()
+        if self.pending() >= DB_BATCH_SIZE:
+            self._wakeup.set()
+
+    def _trim(self):
+        """Drop the oldest rows while more than DB_BUFFER_MAX are held"""
+        excess = self.pending() - DB_BUFFER_MAX
+        if excess <= 0:
+            return
+        self.dropped += excess
+        print(f"⚠️ Write buffer full, dropping the {excess} oldest rows")
+        for name in ("messages", "notifications", "transactions"):
+            rows = getattr(self, name)
+            count = min(excess, len(rows))
+            setattr(self, name, rows[count:])
+            excess -= count
+        for user_id in list(self.financial_states)[:excess]:
+            del self.financial_states[user_id]
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Let the flusher finish its current batch, then write what is left"""
+        self._stopping = True
+        self._wakeup.set()
+        if self._task:
+            await self._task
+            self._task = None
+        # Rows queued before the flusher ever ran (or during its last batch)
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Error flushing database writes: {e}")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=DB_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing database writes: {e}")
+
+    async def flush(self):
+        """Write everything queued so far in one transaction"""
+        if SessionLocal is None or not self.pending():
+            return
+
+        messages, self.messages = self.messages, []
+        notifications, self.notifications = self.notifications, []
+        states, self.financial_states = self.financial_states, {}
+        transactions, self.transactions = self.transactions, []
+        resets, self.transaction_resets = self.transaction_resets, set()
+        self.notifications_in_flight = notifications
+        self.financial_in_flight = set(states) | resets | {t["user_id"] for t in transactions}
+        self.conversations_in_flight = {(m["user_id"], m["agent_id"]) for m in messages}
+
+        try:
+            try:
+                await self._write(messages, notifications, states, transactions, resets)
+            except Exception as e:
+                self.failures += 1
+                if not is_transient_error(e):
+                    await self._write_each(messages, notifications, states, transactions, resets)
+                elif self.failures <= DB_FLUSH_RETRIES:
+                    self._requeue(messages, notifications, states, transactions, resets)
+                    raise
+                else:
+                    count = len(messages) + len(notifications) + len(states) + len(transactions) + len(resets)
+                    self.dropped += count
+                    print(f"⚠️ Dropped {count} buffered rows after {self.failures} failed flushes: {e}")
+                    return
+            self.failures = 0
+            await _announce_changes(self.financial_in_flight, set(self.conversations_in_flight))
+        finally:
+            self.notifications_in_flight = []
+            self.financial_in_flight = set()
+            self.conversations_in_flight = set()
+
+    def _requeue(self, messages: List[Dict], notifications: List[Dict], states: Dict[str, Dict],
+                 transactions: List[Dict], resets: Set[str]):
+        """Put a failed batch back ahead of rows queued meanwhile so the next flush retries it"""
+        self.messages = messages + self.messages
+        self.notifications = notifications + self.notifications
+        for user_id, older in states.items():
+            newer = self.financial_states.get(user_id)
+            if newer is None:
+                self.financial_states[user_id] = older
+            elif not _replaces_row(newer):
+                # A snapshot queued since supersedes our changes; otherwise ours come first
+                self.financial_states[user_id] = {"data": newer["data"], "ops": older["ops"] + newer["ops"]}
+        # Unless the user's history was reset since
+        self.transactions = [
+            t for t in transactions if t["user_id"] not in self.transaction_resets
+        ] + self.transactions
+        self.transaction_resets |= resets
+        self._trim()
+
+    async def _write_each(self, messages: List[Dict], notifications: List[Dict], states: Dict[str, Dict],
+                          transactions: List[Dict], resets: Set[str]):
+        """Write what can be written of a batch that failed as a whole, dropping the bad rows"""
+        items = (
+            [("message", row) for row in messages]
+            + [("notification", row) for row in notifications]
+            + [("state", item) for item in states.items()]
+            + [("reset", user_id) for user_id in resets]
+            + [("transaction", row) for row in transactions]
+        )
+        for (kind, row), error in await self._write_isolated(items):
+            self.dropped += 1
+            user_id = row[0] if kind == "state" else row if kind == "reset" else row["user_id"]
+            print(f"⚠️ Dropped unwritable {kind} for '{user_id}': {error}")
+
+    async def _write_isolated(self, items: List) -> List:
+        """Write ``(kind, row)`` items in ever smaller halves; returns the ones that failed alone"""
+        try:
+            await self._write(
+                [row for kind, row in items if kind == "message"],
+                [row for kind, row in items if kind == "notification"],
+                dict(row for kind, row in items if kind == "state"),
+                [row for kind, row in items if kind == "transaction"],
+                {row for kind, row in items if kind == "reset"},
+            )
+            return []
+        except Exception as e:
+            if len(items) == 1:
+                return [(items[0], e)]
+        middle = len(items) // 2
+        return await self._write_isolated(items[:middle]) + await self._write_isolated(items[middle:])
+
+    async def _write(self, messages: List[Dict], notifications: List[Dict], states: Dict[str, Dict],
+                     transactions: List[Dict], resets: Set[str]):
+        async with SessionLocal() as session:
+            async with session.begin():
+                if resets:
+                    await session.execute(delete(TransactionRecord).where(TransactionRecord.user_id.in_(resets)))
+                if transactions:
+                    await session.execute(insert(TransactionRecord.__table__), transactions)
+                if messages:
+                    await session.execute(insert(ConversationMessage), messages)
+                if notifications:
+                    await session.execute(insert(NotificationRecord), notifications)
+                if states:
+                    await self._write_states(session, states)
+
+    @staticmethod
+    async def _write_states(session, states: Dict[str, Dict]):
+        """Apply each user's queued changes to their saved row"""
+        now = datetime.now()
+        # Lock the rows first (on SQLite: take the write lock) so nobody changes them between read and write
+        await session.execute(
+            update(FinancialState).where(FinancialState.user_id.in_(list(states))).values(updated_at=now)
+        )
+        for user_id, pending in states.items():
+            row = await session.get(FinancialState, user_id)
+            data = _apply_financial_changes(row.data if row else None, pending)
+            await session.merge(FinancialState(user_id=user_id, data=data, updated_at=now))
+
+
+def _replaces_row(pending: Dict) -> bool:
+    return bool(pending["ops"]) and pending["ops"][0]["kind"] == "set"
+
+
+def _apply_financial_changes(saved: Optional[Dict], pending: Dict) -> Dict:
+    """The saved snapshot with a user's queued changes applied in order
+
+    Without a saved row there is nothing to apply them to, so the worker's
+    own latest snapshot (which already includes them) is written instead.
+    """
+    if saved is None and not _replaces_row(pending):
+        return pending["data"]
+    data = copy.deepcopy(saved)
+    for op in pending["ops"]:
+        if op["kind"] == "set":
+            data = copy.deepcopy(op["data"])
+        elif op["kind"] == "add":
+            for field, delta in op["fields"].items():
+                data[field] = (data.get(field) or 0) + delta
+        elif op["kind"] == "goal":
+            for goal in data.get("goals", []):
+                if goal["name"] == op["name"]:
+                    goal["current"] = min(goal["current"] + op["amount"], goal["target"])
+                    if goal["current"] >= goal["target"]:
+                        goal["completed"] = True
+        for field, version in op.get("versions", {}).items():
+            data[field] = max(int(data.get(field) or 0), version)
+    return data
+
+
+def on_change(callback: ChangeListener):
+    """Call ``await callback(financial_users, conversations)`` after this worker commits shared changes
+
+    Used to tell other workers which cached records and chat histories are
+    stale. Listeners are dropped by ``close_db``.
+    """
+    _change_listeners.append(callback)
+
+
+async def _announce_changes(financial: Set[str], conversations: Set[Tuple[str, Optional[str]]]):
+    if not (financial or conversations):
+        return
+    for listener in list(_change_listeners):
+        try:
+            await listener(financial, conversations)
+        except Exception as e:
+            print(f"Error announcing database changes: {e}")
+
+
+_buffer: Optional[WriteBuffer] = None
+
+
+def _parse_timestamp(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+
 async def init_db():
-    """Initialize database (placeholder for hackathon)"""
-    print("📊 Database initialized (using in-memory data for demo)")
-    # In production, would set up SQLAlchemy models and tables
-    return True
\ No newline at end of file
+    """Create the engine, make sure tables exist and start the write buffer"""
+    global engine, SessionLocal, _buffer
+
+    engine = _create_engine(DATABASE_URL)
+    SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    _buffer = WriteBuffer()
+    _buffer.start()
+
+    print(f"📊 Database initialized ({engine.dialect.name})")
+    return True
+
+
+async def close_db():
+    """Flush pending writes and release pooled connections"""
+    global engine, SessionLocal, _buffer
+
+    if _buffer:
+        await _buffer.stop()
+        _buffer = None
+    _change_listeners.clear()
+    if engine:
+        await engine.dispose()
+    engine = None
+    SessionLocal = None
+
+
+def queue_conversation_message(user_id: str, agent_id: str, message: Dict):
+    """Queue a chat turn for the next batched insert"""
+    if _buffer is None:
+        return
+    _buffer.messages.append({
+        "user_id": user_id,
+        "agent_id": agent_id,
+        "role": message["role"],
+        "content": message["content"],
+        "created_at": _parse_timestamp(message.get("timestamp")),
+    })
+    _buffer.notify()
+
+
+def queue_notification(user_id: str, notification: Dict):
+    """Queue a notification for the next batched insert"""
+    if _buffer is None:
+        return
+    _buffer.notifications.append({
+        "id": notification["id"],
+        "user_id": user_id,
+        "agent_id": notification.get("agentId") or notification.get("agent_id", ""),
+        "payload": notification,
+        "created_at": _parse_timestamp(notification.get("timestamp")),
+    })
+    _buffer.notify()
+
+
+def queue_financial_state(user_id: str, data: Dict):
+    """Queue a full financial snapshot that replaces the user's saved row
+
+    Changes queued before it are superseded. Only for a record rebuilt from
+    scratch; everyday changes go through ``queue_financial_update``.
+    """
+    if _buffer is None:
+        return
+    _buffer.financial_states[user_id] = {"data": data, "ops": [{"kind": "set", "data": data}]}
+    _buffer.notify()
+
+
+def queue_financial_update(user_id: str, op: Dict, data: Dict):
+    """Queue one change to a user's saved financial state
+
+    ``op`` is ``{"kind": "add", "fields": {field: delta}}`` or ``{"kind":
+    "goal", "name": ..., "amount": ...}``, with optional ``"versions"`` that
+    are raised to at least the given values. ``data`` is the worker's
+    snapshot after the change, written as is if the user has no saved row yet.
+    """
+    if _buffer is None:
+        return
+    pending = _buffer.financial_states.setdefault(user_id, {"data": data, "ops": []})
+    pending["data"] = data
+    pending["ops"].append(op)
+    _buffer.notify()
+
+
+def pending_financial_changes(user_id: str) -> bool:
+    """Whether this worker has financial changes for a user that are not committed yet"""
+    if _buffer is None:
+        return False
+    return (
+        user_id in _buffer.financial_states
+        or user_id in _buffer.financial_in_flight
+        or user_id in _buffer.transaction_resets
+        or any(t["user_id"] == user_id for t in _buffer.transactions)
+    )
+
+
+def _transaction_row(user_id: str, transaction: Dict) -> Dict:
+    return {
+        "user_id": user_id,
+        "txn_id": str(transaction.get("id", "")),
+        "merchant": transaction.get("merchant", ""),
+        "amount": float(transaction.get("amount", 0)),
+        "category": transaction.get("category", ""),
+        "timestamp": _parse_timestamp(transaction.get("date")).timestamp(),
+        "version": int(transaction.get("version", 0)),
+    }
+
+
+def queue_transactions(user_id: str, transactions: Iterable[Dict], replace: bool = False):
+    """Queue transactions (oldest first) for a user's persisted history
+
+    With ``replace`` the history saved so far is deleted first.
+    """
+    if _buffer is None:
+        return
+    if replace:
+        _buffer.transactions = [t for t in _buffer.transactions if t["user_id"] != user_id]
+        _buffer.transaction_resets.add(user_id)
+    _buffer.transactions.extend(_transaction_row(user_id, t) for t in transactions)
+    _buffer.notify()
+
+
+async def save_transaction_histories(histories: Dict[str, Iterable[tuple]]):
+    """Replace the persisted history of every user in ``histories`` in one transaction
+
+    Histories are ``(id, merchant, amount, category, timestamp, version)``
+    rows, oldest first. For bulk backfills, which would overflow the write
+    buffer; rows go through a Core insert to skip per-row ORM work.
+    """
+    if SessionLocal is None or not histories:
+        return
+    if _buffer:
+        # Queued changes to these histories are superseded
+        _buffer.transactions = [t for t in _buffer.transactions if t["user_id"] not in histories]
+        _buffer.transaction_resets -= set(histories)
+    rows = [
+        {"user_id": user_id, "txn_id": txn_id, "merchant": merchant, "amount": amount,
+         "category": category, "timestamp": timestamp, "version": version}
+        for user_id, history in histories.items()
+        for txn_id, merchant, amount, category, timestamp, version in history
+    ]
+    async with SessionLocal() as session:
+        async with session.begin():
+            await session.execute(delete(TransactionRecord).where(TransactionRecord.user_id.in_(list(histories))))
+            if rows:
+                await session.execute(insert(TransactionRecord.__table__), rows)
+    await _announce_changes(set(histories), set())
+
+
+async def load_transaction_rows(user_id: str) -> List[tuple]:
+    """A user's persisted history as ``(id, merchant, amount, category, timestamp, version)`` rows, oldest first"""
+    if engine is None:
+        return []
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            select(
+                TransactionRecord.txn_id,
+                TransactionRecord.merchant,
+                TransactionRecord.amount,
+                TransactionRecord.category,
+                TransactionRecord.timestamp,
+                TransactionRecord.version,
+            )
+            .where(TransactionRecord.user_id == user_id)
+            .order_by(TransactionRecord.id)
+        )
+        return [tuple(row) for row in result]
+
+
+async def users_with_transactions(user_ids: Iterable[str]) -> Set[str]:
+    """Which of ``user_ids`` have a persisted transaction history"""
+    if SessionLocal is None:
+        return set()
+    user_ids = list(user_ids)
+    found: Set[str] = set()
+    async with SessionLocal() as session:
+        # In chunks, to stay under the database's limit on bound parameters
+        for offset in range(0, len(user_ids), 500):
+            found.update((await session.execute(
+                select(TransactionRecord.user_id)
+                .where(TransactionRecord.user_id.in_(user_ids[offset:offset + 500]))
+                .distinct()
+            )).scalars().all())
+    return found
+
+
+async def load_conversation(user_id: str, agent_id: str, limit: int = 20) -> List[Dict]:
+    """Most recent chat turns for a user/agent pair, oldest first"""
+    if SessionLocal is None:
+        return []
+    async with SessionLocal() as session:
+        rows = (await session.execute(
+            select(ConversationMessage)
+            .where(ConversationMessage.user_id == user_id, ConversationMessage.agent_id == agent_id)
+            .order_by(ConversationMessage.created_at.desc(), ConversationMessage.id.desc())
+            .limit(limit)
+        )).scalars().all()
+    return [
+        {"role": row.role, "content": row.content, "timestamp": row.created_at.isoformat()}
+        for row in reversed(rows)
+    ]
+
+
+async def delete_conversation(user_id: str, agent_id: Optional[str] = None):
+    """Delete persisted chat turns for a user (optionally only one agent)"""
+    if SessionLocal is None:
+        return
+    if _buffer:
+        # Drop queued turns too so they are not written after the delete
+        _buffer.messages = [
+            m for m in _buffer.messages
+            if not (m["user_id"] == user_id and (agent_id is None or m["agent_id"] == agent_id))
+        ]
+    stmt = delete(ConversationMessage).where(ConversationMessage.user_id == user_id)
+    if agent_id is not None:
+        stmt = stmt.where(ConversationMessage.agent_id == agent_id)
+    async with SessionLocal() as session:
+        async with session.begin():
+            await session.execute(stmt)
+    await _announce_changes(set(), {(user_id, agent_id)})
+
+
+async def load_financial_state(user_id: str) -> Optional[Dict]:
+    """Latest persisted financial snapshot for a user"""
+    if SessionLocal is None:
+        return None
+    async with SessionLocal() as session:
+        row = await session.get(FinancialState, user_id)
+    return row.data if row else None
+
+
+def pending_conversation_messages(user_id: str, agent_id: str) -> bool:
+    """Whether this worker has chat turns for a user/agent pair that are not committed yet"""
+    if _buffer is None:
+        return False
+    return (user_id, agent_id) in _buffer.conversations_in_flight or any(
+        m["user_id"] == user_id and m["agent_id"] == agent_id for m in _buffer.messages
+    )
+
+
+def pending_notifications(user_id: str) -> List[Dict]:
+    """Notifications for a user that are queued or being written but not committed yet"""
+    if _buffer is None:
+        return []
+    return [
+        row["payload"] for row in _buffer.notifications_in_flight + _buffer.notifications
+        if row["user_id"] == user_id
+    ]
+
+
+async def allocate_notification_seq(user_id: str, floor: int = 0) -> int:
+    """Atomically hand out the user's next notification sequence number
+
+    The counter lives in the database so workers never pick the same
+    number; ``floor`` is the highest number the caller already knows of, in
+    case the counter row is missing or behind (e.g. a new table).
+    """
+    for _ in range(2):
+        async with SessionLocal() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(NotificationSequence)
+                    .where(NotificationSequence.user_id == user_id)
+                    .values(last_seq=case(
+                        (NotificationSequence.last_seq < floor, floor),
+                        else_=NotificationSequence.last_seq,
+                    ) + 1)
+                )
+                if result.rowcount:
+                    # Still inside the write transaction, so nobody has moved it since
+                    return (await session.execute(
+                        select(NotificationSequence.last_seq).where(NotificationSequence.user_id == user_id)
+                    )).scalar_one()
+
+        # First notification for this user; whoever inserts the row first wins
+        try:
+            async with SessionLocal() as session:
+                async with session.begin():
+                    await session.execute(insert(NotificationSequence).values(user_id=user_id, last_seq=floor + 1))
+            return floor + 1
+        except IntegrityError:
+            continue
+    raise RuntimeError(f"Could not allocate a notification sequence for '{user_id}'")
+
+
+async def load_notifications(user_id: str, limit: int = 50, agent_id: Optional[str] = None) -> List[Dict]:
+    """Most recent notifications for a user, newest first"""
+    if SessionLocal is None:
+        return []
+    stmt = select(NotificationRecord.payload).where(NotificationRecord.user_id == user_id)
+    if agent_id is not None:
+        stmt = stmt.where(NotificationRecord.agent_id == agent_id)
+    stmt = stmt.order_by(NotificationRecord.created_at.desc()).limit(limit)
+    async with SessionLocal() as session:
+        return list((await session.execute(stmt)).scalars().all())
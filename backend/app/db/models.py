@@ -0,0 +1,108 @@
+"""
+SQLAlchemy models for persisted state
+"""
+
+from datetime import datetime
+
+from sqlalchemy import JSON, DateTime, Float, Index, Integer, String, Text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class ConversationMessage(Base):
+    """One chat turn between a user and an agent"""
+
+    __tablename__ = "conversation_messages"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[str] = mapped_column(String(64))
+    agent_id: Mapped[str] = mapped_column(String(32))
+    role: Mapped[str] = mapped_column(String(16))
+    content: Mapped[str] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_conversation_user_agent_time", "user_id", "agent_id", "created_at"),
+    )
+
+
+class FinancialState(Base):
+    """Latest financial snapshot for a user"""
+
+    __tablename__ = "financial_state"
+
+    user_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    data: Mapped[dict] = mapped_column(JSON)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, index=True)
+
+
+class TransactionRecord(Base):
+    """One transaction in a user's append-only history (the snapshot only keeps the newest few)"""
+
+    __tablename__ = "transactions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[str] = mapped_column(String(64))
+    txn_id: Mapped[str] = mapped_column(String(64))
+    merchant: Mapped[str] = mapped_column(String(64))
+    amount: Mapped[float] = mapped_column(Float)
+    category: Mapped[str] = mapped_column(String(32))
+    timestamp: Mapped[float] = mapped_column(Float)
+    version: Mapped[int] = mapped_column(Integer)
+
+    __table_args__ = (
+        Index("ix_transactions_user_order", "user_id", "id"),
+    )
+
+
+class NotificationRecord(Base):
+    """A proactive notification delivered (or queued) for a user"""
+
+    __tablename__ = "notifications"
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(64))
+    agent_id: Mapped[str] = mapped_column(String(32))
+    payload: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_notifications_user_time", "user_id", "created_at"),
+        Index("ix_notifications_agent_time", "agent_id", "created_at"),
+    )
+
+
+class NotificationSequence(Base):
+    """The last notification sequence number handed out for a user (shared by workers)"""
+
+    __tablename__ = "notification_sequences"
+
+    user_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    last_seq: Mapped[int] = mapped_column(Integer)
+
+
+class PubSubEvent(Base):
+    """A socket event published by one worker for every worker to deliver"""
+
+    __tablename__ = "pubsub_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    origin: Mapped[str] = mapped_column(String(96))
+    payload: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[float] = mapped_column(Float, index=True)
+
+    # AUTOINCREMENT keeps ids increasing even after old rows are pruned
+    __table_args__ = {"sqlite_autoincrement": True}
+
+
+class Lease(Base):
+    """A named, expiring lock held by one worker (leader election)"""
+
+    __tablename__ = "leases"
+
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(96))
+    expires_at: Mapped[float] = mapped_column(Float)
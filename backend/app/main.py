@@ -9,23 +9,56 @@ from contextlib import asynccontextmanager
 import asyncio
 import os
 from dotenv import load_dotenv
-from typing import List
+from typing import List, Optional
 import json
 
-from app.db.database import init_db
-from app.services.websocket_manager import ConnectionManager
+from app.db.database import init_db, close_db, load_notifications, on_change, queue_notification
+from app.services.websocket_manager import (
+    ConnectionManager, ANNOUNCEMENTS_TOPIC, WS_MAX_CHATS_PER_CONNECTION, agent_topic
+)
 from app.services.proactive_analyzer import ProactiveAnalyzer
+from app.services.pubsub import NotificationHub, create_pubsub, PUBSUB_BACKEND
+from app.services.outbox import outbox
+from app.services.leader import LeaderElector, LocalLease, DatabaseLease
+from app.services.bulk_generator import backfill_on_startup
+from app.services.llm_client import shutdown_executor
 from app.api import chat, auth, financial_data
 from app.api import team as team_api
+from app.agents.personalities import AGENTS
 from app.models.schemas import ProactiveNotification
+from app.services.financial_store import DEFAULT_USER_ID
+from app.services.financial_simulator import invalidate_user_record
 
 load_dotenv()
 
-# WebSocket connection manager
+# WebSocket connection manager (this worker's sockets)
 manager = ConnectionManager()
 
-# Proactive analyzer instance
+# Fans socket events out to every worker
+hub = NotificationHub(manager, create_pubsub())
+
+# Proactive analyzer instance (runs only on the elected worker)
 analyzer = None
+analyzer_task = None
+elector = None
+
+async def _start_analyzer():
+    global analyzer_task
+    analyzer_task = asyncio.create_task(analyzer.start())
+
+async def _stop_analyzer():
+    global analyzer_task
+    await analyzer.stop()
+    if analyzer_task:
+        analyzer_task.cancel()
+        analyzer_task = None
+
+def _invalidate_caches(financial, conversations):
+    """Drop cached records and chat histories another worker has changed"""
+    for user_id in financial:
+        invalidate_user_record(user_id)
+    for user_id, agent_id in conversations:
+        chat.invalidate_history(user_id, agent_id)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -35,19 +68,31 @@ async def lifespan(app: FastAPI):
     
     # Initialize database
     await init_db()
+    await backfill_on_startup()
+    await hub.start()
+    # Keep other workers' cached records and chats in step with what this one commits
+    on_change(hub.invalidate)
+    hub.on_invalidate(_invalidate_caches)
     
-    # Start proactive analyzer
-    global analyzer
-    analyzer = ProactiveAnalyzer(manager)
-    asyncio.create_task(analyzer.start())
+    # Start proactive analyzer once this worker holds the analyzer lease
+    global analyzer, elector
+    analyzer = ProactiveAnalyzer(hub)
+    hub.on_join(analyzer.add_user)
+    lease_type = LocalLease if PUBSUB_BACKEND == "memory" else DatabaseLease
+    elector = LeaderElector(lease_type("proactive_analyzer"), _start_analyzer, _stop_analyzer)
+    elector.start()
     
     print("✅ Backend ready!")
     
     yield
     
-    # Shutdown
-    if analyzer:
-        await analyzer.stop()
+    # Shutdown: close sockets with 1001 so clients reconnect elsewhere
+    await manager.drain()
+    if elector:
+        await elector.stop()
+    await hub.stop()
+    shutdown_executor()
+    await close_db()
     print("👋 Backend stopped")
 
 app = FastAPI(
@@ -79,31 +124,108 @@ async def root():
         "status": "online",
         "service": "FinancePal Backend",
         "version": "1.0.0",
-        "agents": ["sofia", "marcus", "luna"]
+        "agents": ["sofia", "marcus", "luna"],
+        "websocket": manager.stats()
     }
 
 @app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    """WebSocket endpoint for real-time proactive notifications"""
-    await manager.connect(websocket, client_id)
+async def websocket_endpoint(websocket: WebSocket, client_id: str, user_id: str = DEFAULT_USER_ID,
+                             batch: bool = False, since: Optional[int] = None):
+    """WebSocket endpoint for real-time proactive notifications
+    
+    Each socket is tracked on its own, so a user can have several tabs or
+    devices open. Sockets start subscribed to every agent; clients can narrow
+    that with {"type": "subscribe" | "unsubscribe", "topics": ["agent:luna", ...]}.
+    With ?batch=1, bursts arrive as {"type": "batch", "messages": [...]}.
+    Notifications carry a per-user "seq"; reconnect with ?since=<last seq>
+    to get the ones missed in a single {"type": "batch", "replay": true} frame.
+    """
+    if since is not None:
+        await outbox.load(user_id)
+    connection = await manager.connect(websocket, client_id, user_id, batch=batch)
+    if connection is None:
+        return
+    if since is not None:
+        # Queued before any live notification can reach this socket
+        manager.send_to_connection(connection, outbox.replay(user_id, since))
+    await hub.user_joined(user_id)
     try:
         while True:
             # Keep connection alive and listen for any client messages
             data = await websocket.receive_text()
+            manager.touch(connection)
             
             # Handle ping/pong for connection keepalive
             if data == "ping":
                 await websocket.send_text("pong")
+                continue
+            if data == "pong":
+                continue
+            
+            try:
+                payload = json.loads(data)
+            except ValueError:
+                payload = None
+            
+            message_type = payload.get("type") if isinstance(payload, dict) else None
+            if message_type == "pong":
+                # Reply to a server heartbeat; touch() already recorded it
+                continue
+            elif message_type == "chat":
+                # Stream the agent's reply back over this socket
+                if len(connection.tasks) >= WS_MAX_CHATS_PER_CONNECTION:
+                    manager.send_to_connection(connection, {
+                        "type": "chat_error",
+                        "agent_id": payload.get("agent_id"),
+                        "message": "Too many chats in progress; wait for a reply to finish"
+                    })
+                else:
+                    connection.spawn(_stream_chat_to_client(connection, payload))
+            elif message_type in ("subscribe", "unsubscribe"):
+                topics = [t for t in payload.get("topics") or [] if isinstance(t, str)]
+                if message_type == "subscribe":
+                    manager.subscribe(connection, topics)
+                else:
+                    manager.unsubscribe(connection, topics)
+                manager.send_to_connection(connection, {"type": "subscriptions", "topics": sorted(connection.topics)})
             else:
                 # Could handle other client messages here
                 print(f"Client {client_id} sent: {data}")
                 
     except WebSocketDisconnect:
-        manager.disconnect(client_id)
-        print(f"Client {client_id} disconnected")
+        pass
     except Exception as e:
         print(f"WebSocket error for {client_id}: {e}")
-        manager.disconnect(client_id)
+    finally:
+        manager.disconnect(connection)
+        await hub.user_left(user_id)
+
+async def _stream_chat_to_client(connection, payload: dict):
+    """Forward streamed chat chunks to the socket that asked"""
+    agent_id = payload.get("agent_id")
+    text = (payload.get("message") or "").strip()
+    if agent_id not in AGENTS or not text:
+        manager.send_to_connection(connection, {
+            "type": "chat_error",
+            "agent_id": agent_id,
+            "message": "A valid agent_id and message are required"
+        })
+        return
+    
+    try:
+        async for event in chat.stream_chat_events(agent_id, text):
+            if connection.closed:
+                break
+            manager.send_to_connection(connection, event)
+    except Exception as e:
+        print(f"Error streaming chat to {connection.client_id}: {e}")
+        manager.send_to_connection(connection, {"type": "chat_error", "agent_id": agent_id})
+
+@app.get("/api/notifications")
+async def get_notifications(user_id: str = DEFAULT_USER_ID, limit: int = 50):
+    """Recent persisted notifications for a user, newest first"""
+    notifications = await load_notifications(user_id, limit=min(limit, 200))
+    return {"notifications": notifications, "count": len(notifications)}
 
 @app.get("/api/test-notification")
 async def test_notification():
@@ -118,15 +240,18 @@ async def test_notification():
         action_required=True
     )
     
-    # Send to all connected clients
-    await manager.broadcast(notification.dict())
+    # Send to every socket subscribed to announcements
+    await hub.publish(ANNOUNCEMENTS_TOPIC, notification.dict())
     
     return {"status": "notification sent", "notification": notification.dict()}
 
 @app.post("/api/demo/trigger/{scenario}")
-async def trigger_demo_scenario(scenario: str):
+async def trigger_demo_scenario(scenario: str, user_id: Optional[str] = None):
     """Trigger specific demo scenarios for presentation
     
+    With ``user_id`` the notification goes only to that user's sockets;
+    without it, to everyone subscribed to the scenario's agent.
+    
     Available scenarios:
     - overspending: Luna alerts about budget exceeded
     - investment_opportunity: Marcus finds investment opportunity
@@ -190,11 +315,14 @@ async def trigger_demo_scenario(scenario: str):
     if isinstance(notif_dict.get('timestamp'), datetime):
         notif_dict['timestamp'] = notif_dict['timestamp'].isoformat()
     
-    # Send via WebSocket to all connected clients
-    await manager.broadcast({
-        "type": "notification",
-        "data": notif_dict
-    })
+    # Sequence, persist and send via WebSocket to the user or the agent's subscribers
+    topic = agent_topic(notification.agent_id)
+    if user_id:
+        await hub.notify(user_id, notif_dict, topic=topic)
+    else:
+        # Everyone on the topic gets it, so it is not sequenced into any one user's outbox
+        queue_notification(DEFAULT_USER_ID, notif_dict)
+        await hub.publish(topic, {"type": "notification", "data": notif_dict})
     
     return {"status": "success", "scenario": scenario, "notification": notification.dict()}
 
@@ -204,5 +332,7 @@ if __name__ == "__main__":
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=True,
+        # Compress frames for clients that offer it (browsers do); pays off most on batched frames
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() != "false"
     )
\ No newline at end of file
@@ -0,0 +1,249 @@
+"""
+Spending Analytics
+Rolling 7/30/90-day per-category aggregates over each user's transaction log
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.transaction_log import TransactionLog, categories
+
+WINDOWS = (7, 30, 90)
+MAX_WINDOW = max(WINDOWS)
+SECONDS_PER_DAY = 86400
+TOP_CATEGORIES = 5
+# 7-day spend this far above the 30-day weekly pace counts as a spike
+TREND_SPIKE = 0.5
+
+
+def day_index(timestamp: float) -> int:
+    """UTC day number; every aggregate buckets by this"""
+    return int(timestamp // SECONDS_PER_DAY)
+
+
+def _today() -> int:
+    return day_index(time.time())
+
+
+class SpendingAnalytics:
+    """Per-category spend in daily buckets with running window totals
+
+    Each expense adds to its day's bucket and to every window that covers
+    that day, so reads never rescan transactions. When the date rolls over,
+    the buckets that slid out of each window are subtracted. Buckets older
+    than the longest window are dropped. ``rebuild`` recomputes everything
+    from the log's columns with NumPy, for backfills and first use.
+    """
+
+    def __init__(self, log: TransactionLog):
+        self.log = log
+        self.version = 0
+        self._summary: Optional[Dict] = None
+        self.rebuild()
+
+    # Maintenance
+
+    def rebuild(self, today: Optional[int] = None):
+        """Recompute buckets and window totals from the whole log (vectorized)"""
+        today = _today() if today is None else today
+        first_day = today - MAX_WINDOW + 1
+        log = self.log
+
+        amounts = np.concatenate([
+            np.frombuffer(log.amounts, dtype=np.float64),
+            np.array([float(t.get("amount", 0)) for t in log.recent], dtype=np.float64),
+        ])
+        days = np.concatenate([
+            np.frombuffer(log.timestamps, dtype=np.float64),
+            np.array(log.recent_timestamps, dtype=np.float64),
+        ]) // SECONDS_PER_DAY
+        codes = np.concatenate([
+            np.frombuffer(log.category_codes, dtype=np.uint16).astype(np.int64),
+            np.array([categories.code(t.get("category", "")) for t in log.recent], dtype=np.int64),
+        ])
+
+        days = np.minimum(days.astype(np.int64), today)
+        keep = days >= first_day
+        amounts, days, codes = amounts[keep], days[keep], codes[keep]
+
+        width = int(codes.max()) + 1 if len(codes) else 1
+        slots = (days - first_day) * width + codes
+        spend = np.bincount(slots, weights=np.where(amounts < 0, -amounts, 0.0), minlength=MAX_WINDOW * width)
+        income = np.bincount(days - first_day, weights=np.where(amounts > 0, amounts, 0.0), minlength=MAX_WINDOW)
+        spend = spend.reshape(MAX_WINDOW, width)
+
+        self._buckets: Dict[int, Dict[int, float]] = {}
+        self._income: Dict[int, float] = {}
+        for offset, code in zip(*np.nonzero(spend)):
+            self._buckets.setdefault(first_day + int(offset), {})[int(code)] = float(spend[offset, code])
+        for offset in np.nonzero(income)[0]:
+            self._income[first_day + int(offset)] = float(income[offset])
+
+        self._totals: Dict[int, Dict[int, float]] = {}
+        self._income_totals: Dict[int, float] = {}
+        for window in WINDOWS:
+            by_code = spend[MAX_WINDOW - window:].sum(axis=0)
+            self._totals[window] = {int(c): float(by_code[c]) for c in np.nonzero(by_code)[0]}
+            self._income_totals[window] = float(income[MAX_WINDOW - window:].sum())
+
+        self._today = today
+        self._changed()
+
+    def add(self, transaction: Dict, timestamp: Optional[float] = None):
+        """Fold one new transaction into the buckets and window totals"""
+        self.advance()
+        if timestamp is None:
+            date = transaction.get("date")
+            timestamp = datetime.fromisoformat(date).timestamp() if date else time.time()
+        day = min(day_index(timestamp), self._today)
+        age = self._today - day
+        if age >= MAX_WINDOW:
+            return
+
+        amount = float(transaction.get("amount", 0))
+        if amount > 0:
+            self._income[day] = self._income.get(day, 0.0) + amount
+            for window in WINDOWS:
+                if age < window:
+                    self._income_totals[window] += amount
+        elif amount < 0:
+            code = categories.code(transaction.get("category", ""))
+            bucket = self._buckets.setdefault(day, {})
+            bucket[code] = bucket.get(code, 0.0) - amount
+            for window in WINDOWS:
+                if age < window:
+                    totals = self._totals[window]
+                    totals[code] = totals.get(code, 0.0) - amount
+        self._changed()
+
+    def advance(self, today: Optional[int] = None):
+        """Slide the windows forward to ``today``, expiring buckets that fell out"""
+        today = _today() if today is None else today
+        if today <= self._today:
+            return
+        if today - self._today >= MAX_WINDOW:
+            self.rebuild(today)
+            return
+
+        for window in WINDOWS:
+            totals = self._totals[window]
+            # Days that were inside the window yesterday but are not today
+            for day in range(self._today - window + 1, today - window + 1):
+                for code, amount in self._buckets.get(day, {}).items():
+                    remaining = totals.get(code, 0.0) - amount
+                    if remaining > 0.005:
+                        totals[code] = remaining
+                    else:
+                        totals.pop(code, None)
+                self._income_totals[window] -= self._income.get(day, 0.0)
+
+        horizon = today - MAX_WINDOW + 1
+        for day in [d for d in self._buckets if d < horizon]:
+            del self._buckets[day]
+        for day in [d for d in self._income if d < horizon]:
+            del self._income[day]
+        self._today = today
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self._summary = None
+
+    # Reads
+
+    def summary(self) -> Dict:
+        """Compact aggregates for dashboards and prompts (cached until the next change)"""
+        self.advance()
+        if self._summary is not None:
+            return self._summary
+
+        windows = {}
+        for window in WINDOWS:
+            by_category = {
+                categories.value(code): round(amount, 2)
+                for code, amount in sorted(self._totals[window].items(), key=lambda item: -item[1])
+            }
+            windows[f"{window}d"] = {
+                "spend": round(sum(by_category.values()), 2),
+                "income": round(self._income_totals[window], 2),
+                "by_category": by_category,
+            }
+
+        # Month to date, from the daily buckets (at most 31 of them)
+        today = datetime.fromtimestamp(self._today * SECONDS_PER_DAY, tz=timezone.utc)
+        month_start = self._today - (today.day - 1)
+        month_to_date: Dict[str, float] = defaultdict(float)
+        for day in range(month_start, self._today + 1):
+            for code, amount in self._buckets.get(day, {}).items():
+                month_to_date[categories.value(code)] += amount
+
+        # Last 7 days against the weekly pace of the last 30
+        trends = {}
+        week, month = windows["7d"]["by_category"], windows["30d"]["by_category"]
+        for category, spend_30 in month.items():
+            weekly_pace = spend_30 * 7 / 30
+            if weekly_pace > 0:
+                trends[category] = round(week.get(category, 0.0) / weekly_pace - 1, 3)
+
+        self._summary = {
+            "as_of": today.date().isoformat(),
+            "windows": windows,
+            "month_to_date": {
+                "spend": round(sum(month_to_date.values()), 2),
+                "by_category": {k: round(v, 2) for k, v in sorted(month_to_date.items(), key=lambda item: -item[1])},
+            },
+            "trends": trends,
+        }
+        return self._summary
+
+    def prompt_lines(self) -> List[str]:
+        """A few lines summarizing spending, in place of raw transactions in prompts"""
+        summary = self.summary()
+        lines = []
+        for window in ("7d", "30d"):
+            stats = summary["windows"][window]
+            top = ", ".join(
+                f"{category} ${amount:,.0f}"
+                for category, amount in list(stats["by_category"].items())[:TOP_CATEGORIES]
+            )
+            lines.append(f"Spending ({window}): ${stats['spend']:,.2f} (income ${stats['income']:,.2f}); top: {top or 'none'}")
+        spikes = [
+            f"{category} +{change:.0%}" for category, change in summary["trends"].items()
+            if change >= TREND_SPIKE
+        ]
+        if spikes:
+            lines.append("Rising vs 30-day pace: " + ", ".join(spikes))
+        return lines
+
+
+class AnalyticsStore:
+    """Spending analytics keyed by user id
+
+    An entry is tied to the TransactionLog it was built from; when a user's
+    log is replaced (personalization, restore, bulk backfill) the next read
+    rebuilds it.
+    """
+
+    def __init__(self):
+        self._analytics: Dict[str, SpendingAnalytics] = {}
+
+    def get(self, user_id: str, log: TransactionLog) -> SpendingAnalytics:
+        analytics = self._analytics.get(user_id)
+        if analytics is None or analytics.log is not log:
+            analytics = SpendingAnalytics(log)
+            self._analytics[user_id] = analytics
+        return analytics
+
+    def record(self, user_id: str, log: TransactionLog, transaction: Dict):
+        """Apply a transaction just appended to ``log``; lazily built entries catch it on first read"""
+        analytics = self._analytics.get(user_id)
+        if analytics is not None and analytics.log is log:
+            analytics.add(transaction)
+
+
+# Shared analytics for every user
+analytics_store = AnalyticsStore()
@@ -0,0 +1,201 @@
+"""
+Bulk Transaction Generator
+Vectorized synthetic transaction histories for load tests and demo backfills
+
+Usage (from backend/):
+    python -m app.services.bulk_generator --users 1000 --per-user 1000 --seed 42
+
+The CLI only measures generation; to serve histories set BACKFILL_USERS and
+the server generates them at startup and saves them to the transactions table.
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Collection, Dict, Optional, Sequence
+
+import numpy as np
+
+from app.db.database import save_transaction_histories, users_with_transactions
+from app.services.financial_simulator import (
+    TRANSACTION_TEMPLATES,
+    financial_store,
+    load_user_record,
+    queue_record_change,
+)
+from app.services.transaction_log import TransactionLog, categories, merchants
+
+# Users generated per NumPy batch (bounds peak memory for large runs)
+BATCH_USERS = 500
+# Users whose histories are saved per database transaction
+SAVE_USERS = 50
+
+# Startup backfill (BACKFILL_USERS=0 disables it); give every worker the same seed
+BACKFILL_USERS = int(os.getenv("BACKFILL_USERS", 0))
+BACKFILL_PER_USER = int(os.getenv("BACKFILL_PER_USER", 1000))
+BACKFILL_DAYS = int(os.getenv("BACKFILL_DAYS", 365))
+BACKFILL_SEED = int(os.getenv("BACKFILL_SEED", 42))
+BACKFILL_PREFIX = os.getenv("BACKFILL_PREFIX", "load_user_")
+# Bulk ids start well above the 4-digit ids handed out by the simulator
+_BULK_ID_BASE = 10_000_000
+_next_id = _BULK_ID_BASE
+
+# Template columns, built once
+_AMOUNTS = np.array([t["amount"] for t in TRANSACTION_TEMPLATES], dtype=np.float64)
+_CATEGORY_CODES = np.array([categories.code(t["category"]) for t in TRANSACTION_TEMPLATES], dtype=np.uint16)
+_MERCHANT_CODES = np.array([merchants.code(t["merchant"]) for t in TRANSACTION_TEMPLATES], dtype=np.uint32)
+
+
+def generate_columns(rng: np.random.Generator, users: int, per_user: int,
+                     start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+    """Sample ``users`` x ``per_user`` transactions as 2-D columns, each row sorted by time
+
+    Templates are drawn uniformly (like ``random.choice``) and expense amounts
+    are jittered by 0.8-1.5x, matching ``generate_recent_transactions``.
+    """
+    global _next_id
+    shape = (users, per_user)
+
+    picks = rng.integers(0, len(TRANSACTION_TEMPLATES), size=shape)
+    amounts = _AMOUNTS[picks]
+    jitter = rng.uniform(0.8, 1.5, size=shape)
+    amounts = np.round(np.where(amounts < 0, amounts * jitter, amounts), 2)
+
+    timestamps = rng.uniform(start.timestamp(), end.timestamp(), size=shape)
+    order = np.argsort(timestamps, axis=1)
+    timestamps = np.take_along_axis(timestamps, order, axis=1)
+    picks = np.take_along_axis(picks, order, axis=1)
+    amounts = np.take_along_axis(amounts, order, axis=1)
+
+    total = users * per_user
+    id_numbers = np.arange(_next_id, _next_id + total, dtype=np.uint64).reshape(shape)
+    _next_id += total
+
+    return {
+        "amounts": amounts,
+        "timestamps": timestamps,
+        "category_codes": _CATEGORY_CODES[picks],
+        "merchant_codes": _MERCHANT_CODES[picks],
+        "id_numbers": id_numbers,
+    }
+
+
+def build_log(columns: Dict[str, np.ndarray], row: int, version: int) -> TransactionLog:
+    """Turn one user's row of generated columns into a TransactionLog
+
+    Everything but the newest few transactions is copied straight into the
+    columnar archive; the newest fill the recent buffer as regular dicts.
+    """
+    log = TransactionLog()
+    count = columns["amounts"].shape[1]
+    split = max(count - log.recent.maxlen, 0)
+
+    log.extend_columns(
+        columns["amounts"][row, :split],
+        columns["timestamps"][row, :split],
+        columns["category_codes"][row, :split],
+        columns["merchant_codes"][row, :split],
+        np.full(split, version, dtype=np.int64),
+        columns["id_numbers"][row, :split],
+    )
+    for i in range(split, count):
+        log.append({
+            "merchant": merchants.value(int(columns["merchant_codes"][row, i])),
+            "amount": float(columns["amounts"][row, i]),
+            "category": categories.value(int(columns["category_codes"][row, i])),
+            "date": datetime.fromtimestamp(columns["timestamps"][row, i]).isoformat(),
+            "id": f"txn_{int(columns['id_numbers'][row, i])}",
+            "version": version,
+        })
+    return log
+
+
+def backfill(user_ids: Sequence[str], per_user: int, seed: Optional[int] = None,
+             days: int = 365, batch_users: int = BATCH_USERS, skip: Collection[str] = ()) -> Dict:
+    """Replace each user's transaction history with ``per_user`` synthetic transactions
+
+    Users in ``skip`` keep their history; their rows are still drawn, so the
+    other users' histories do not depend on who was skipped. Runs
+    synchronously; call it before serving traffic or from the CLI, not from
+    inside a request. Balances are left as they are.
+    """
+    rng = np.random.default_rng(seed)
+    end = datetime.now()
+    start = end - timedelta(days=days)
+    started = time.perf_counter()
+
+    for offset in range(0, len(user_ids), batch_users):
+        batch = user_ids[offset:offset + batch_users]
+        columns = generate_columns(rng, len(batch), per_user, start, end)
+        for row, user_id in enumerate(batch):
+            if user_id in skip:
+                continue
+            record = financial_store.get(user_id)
+            record.transactions = build_log(columns, row, record.touch("transactions"))
+
+    elapsed = time.perf_counter() - started
+    users = len([user_id for user_id in user_ids if user_id not in skip])
+    total = users * per_user
+    return {
+        "users": users,
+        "transactions": total,
+        "seconds": round(elapsed, 3),
+        "per_second": round(total / elapsed) if elapsed else None,
+    }
+
+
+async def backfill_on_startup() -> Optional[Dict]:
+    """Generate BACKFILL_USERS histories before the server takes traffic
+
+    Users whose history is already saved (an earlier start, or another
+    worker) keep it and are restored on first use. The rest get their
+    persisted balances and goals restored and a generated history, which is
+    saved to the transactions table.
+    """
+    if BACKFILL_USERS <= 0:
+        return None
+    user_ids = [f"{BACKFILL_PREFIX}{i}" for i in range(BACKFILL_USERS)]
+    existing = await users_with_transactions(user_ids)
+    for user_id in user_ids:
+        if user_id not in existing:
+            await load_user_record(user_id)
+    stats = backfill(user_ids, BACKFILL_PER_USER, seed=BACKFILL_SEED, days=BACKFILL_DAYS, skip=existing)
+
+    generated = [user_id for user_id in user_ids if user_id not in existing]
+    for offset in range(0, len(generated), SAVE_USERS):
+        chunk = generated[offset:offset + SAVE_USERS]
+        # Workers starting together generate the same histories; save each only once
+        saved = await users_with_transactions(chunk)
+        histories = {}
+        for user_id in chunk:
+            if user_id in saved:
+                continue
+            record = financial_store.get(user_id)
+            histories[user_id] = record.transactions.rows()
+            # Balances are untouched; only the versions moved
+            queue_record_change(user_id, record, fields={})
+        await save_transaction_histories(histories)
+
+    print(f"📈 Backfilled {stats['transactions']:,} transactions for {stats['users']:,} users "
+          f"in {stats['seconds']}s ({len(existing):,} already had a saved history)")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic transaction histories")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--per-user", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--prefix", default="load_user_", help="user id prefix")
+    args = parser.parse_args()
+
+    user_ids = [f"{args.prefix}{i}" for i in range(args.users)]
+    stats = backfill(user_ids, args.per_user, seed=args.seed, days=args.days)
+    print(f"✅ Generated {stats['transactions']:,} transactions for {stats['users']:,} users "
+          f"in {stats['seconds']}s ({stats['per_second']:,}/s)")
+
+
+if __name__ == "__main__":
+    main()
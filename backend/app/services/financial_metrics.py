@@ -0,0 +1,187 @@
+"""
+Financial Metrics
+Per-user dashboard metrics kept up to date as financial state changes
+"""
+
+import json
+import uuid
+from collections.abc import Mapping
+from typing import Dict, Optional
+
+# Distinguishes ETags across restarts and between workers, whose in-memory
+# versions count independently; random, since workers can start in the same second
+_EPOCH = uuid.uuid4().hex[:8]
+
+# Week-over-week changes shown on the dashboard cards (static demo values)
+METRIC_CHANGES = {
+    "total_balance": {"value": 12.5, "isPositive": True},
+    "credit_score": {"value": -8, "isPositive": False},
+    "savings_rate": {"value": 15, "isPositive": True},
+    "investment_balance": {"value": 3.2, "isPositive": True},
+}
+
+
+def make_etag(prefix: str, version: int) -> str:
+    """Strong ETag for a versioned resource, unique across restarts"""
+    return f'"{prefix}{_EPOCH}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag``
+
+    Per RFC 9110 the header is ``*`` or a comma-separated list of tags,
+    compared weakly, so a ``W/`` prefix is ignored.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+
+def _percent(numerator: float, denominator: float) -> float:
+    return (numerator / denominator) * 100 if denominator > 0 else 0
+
+
+class MetricsAggregate:
+    """Dashboard figures for one user, adjusted in place on every change
+
+    Transactions and goal contributions apply their deltas directly instead
+    of rescanning the record. Each change bumps ``version``; the JSON body is
+    encoded at most once per version, so repeated polls just return bytes.
+    """
+
+    __slots__ = (
+        "user_id", "version", "total_balance", "checking_balance", "savings_balance",
+        "investment_balance", "credit_card_debt", "credit_score", "savings_rate",
+        "monthly_income", "goal_current", "goal_target", "_body",
+    )
+
+    def __init__(self, user_id: str, data: Mapping):
+        self.user_id = user_id
+        self.version = 0
+        self.reset(data)
+
+    def reset(self, data: Mapping):
+        """Recompute everything from a full record (personalization, restore)"""
+        self.total_balance = float(data.get("total_balance") or 0)
+        self.checking_balance = float(data.get("checking_balance") or 0)
+        self.savings_balance = float(data.get("savings_balance") or 0)
+        self.investment_balance = float(data.get("investment_balance") or 0)
+        self.credit_card_debt = float(data.get("credit_card_debt") or 0)
+        self.credit_score = data.get("credit_score") or 0
+        self.savings_rate = float(data.get("savings_rate") or 0)
+        self.monthly_income = float(data.get("monthly_income") or 0)
+        goals = data.get("goals") or []
+        self.goal_current = float(sum(g.get("current", 0) for g in goals))
+        self.goal_target = float(sum(g.get("target", 0) for g in goals))
+        self._touch()
+
+    def apply_transaction(self, amount: float):
+        """A transaction moved ``amount`` in or out of checking"""
+        self.total_balance += amount
+        self.checking_balance += amount
+        self._touch()
+
+    def apply_goal_contribution(self, delta: float):
+        self.goal_current += delta
+        self._touch()
+
+    def _touch(self):
+        self.version += 1
+        self._body = None
+
+    @property
+    def net_worth(self) -> float:
+        return self.total_balance - self.credit_card_debt
+
+    @property
+    def etag(self) -> str:
+        return make_etag("m", self.version)
+
+    def payload(self) -> Dict:
+        return {
+            "metrics": [
+                {
+                    "title": "Total Balance",
+                    "value": self.total_balance,
+                    "kind": "currency",
+                    "currency": "USD",
+                    "change": METRIC_CHANGES["total_balance"]
+                },
+                {
+                    "title": "Credit Score",
+                    "value": self.credit_score,
+                    "kind": "number",
+                    "change": METRIC_CHANGES["credit_score"]
+                },
+                {
+                    "title": "Savings Rate",
+                    "value": self.savings_rate / 100,  # Convert to decimal for percent
+                    "kind": "percent",
+                    "change": METRIC_CHANGES["savings_rate"]
+                },
+                {
+                    "title": "Investment Portfolio",
+                    "value": self.investment_balance,
+                    "kind": "currency",
+                    "currency": "USD",
+                    "change": METRIC_CHANGES["investment_balance"]
+                }
+            ],
+            "summary": {
+                "checking": self.checking_balance,
+                "savings": self.savings_balance,
+                "investments": self.investment_balance,
+                "debt": self.credit_card_debt,
+                "net_worth": self.net_worth,
+                "savings_percentage": _percent(self.savings_balance, self.total_balance),
+                "debt_to_income": _percent(self.credit_card_debt, self.monthly_income),
+            },
+            "version": self.version,
+        }
+
+    def body(self) -> bytes:
+        """JSON-encoded payload, cached until the next change"""
+        if self._body is None:
+            self._body = json.dumps(self.payload(), separators=(",", ":")).encode("utf-8")
+        return self._body
+
+
+class MetricsStore:
+    """Metrics aggregates keyed by user id"""
+
+    def __init__(self):
+        self._aggregates: Dict[str, MetricsAggregate] = {}
+
+    def get(self, user_id: str, data: Mapping) -> MetricsAggregate:
+        """Return the user's aggregate, building it from ``data`` on first use"""
+        aggregate = self._aggregates.get(user_id)
+        if aggregate is None:
+            aggregate = MetricsAggregate(user_id, data)
+            self._aggregates[user_id] = aggregate
+        return aggregate
+
+    def reset(self, user_id: str, data: Mapping):
+        """Rebuild after the user's record was replaced wholesale"""
+        aggregate = self._aggregates.get(user_id)
+        if aggregate is None:
+            self._aggregates[user_id] = MetricsAggregate(user_id, data)
+        else:
+            aggregate.reset(data)
+
+    def apply_transaction(self, user_id: str, amount: float):
+        # Users without an aggregate yet get one built from the updated record on first read
+        aggregate = self._aggregates.get(user_id)
+        if aggregate is not None:
+            aggregate.apply_transaction(amount)
+
+    def apply_goal_contribution(self, user_id: str, delta: float):
+        aggregate = self._aggregates.get(user_id)
+        if aggregate is not None:
+            aggregate.apply_goal_contribution(delta)
+
+
+# Shared metrics for every user
+metrics_store = MetricsStore()
@@ -3,9 +3,27 @@ Financial Data Simulator
 Generates realistic financial data for demo purposes
 """
 
+import copy
 import random
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from app.db.database import (
+    load_financial_state,
+    load_transaction_rows,
+    pending_financial_changes,
+    queue_financial_state,
+    queue_financial_update,
+    queue_transactions,
+)
+from app.services.analytics import analytics_store
+from app.services.financial_metrics import metrics_store
+from app.services.financial_store import (
+    DEFAULT_USER_ID,
+    FinancialStateStore,
+    UserFinancialRecord,
+)
+from app.services.transaction_log import TransactionLog
 
 # Default user financial data - will be personalized based on quiz
 DEFAULT_USER_DATA = {
@@ -29,8 +47,14 @@ DEFAULT_USER_DATA = {
     ]
 }
 
+def _default_record(user_id: str) -> UserFinancialRecord:
+    """Fresh default record for a user (never shares lists with the template)"""
+    record = UserFinancialRecord.from_dict(DEFAULT_USER_DATA)
+    record.user_id = user_id
+    return record
+
 # Store personalized data per user
-USER_DATA = DEFAULT_USER_DATA.copy()
+financial_store = FinancialStateStore(_default_record)
 
 # Transaction templates
 TRANSACTION_TEMPLATES = [
@@ -53,130 +77,201 @@ TRANSACTION_TEMPLATES = [
     {"merchant": "Gym", "amount": -35.00, "category": "Health"},
 ]
 
-def personalize_financial_data(quiz_data: Dict) -> None:
+def personalize_financial_data(quiz_data: Dict, user_id: str = DEFAULT_USER_ID) -> UserFinancialRecord:
     """Personalize financial data based on quiz responses"""
-    global USER_DATA
-    
     # Reset to default
-    USER_DATA = DEFAULT_USER_DATA.copy()
+    data = copy.deepcopy(DEFAULT_USER_DATA)
     
     # Adjust based on income level
     if quiz_data.get('income') == 'under-50k':
-        USER_DATA['monthly_income'] = 3200.00
-        USER_DATA['total_balance'] = 8500.00
-        USER_DATA['savings_balance'] = 3200.00
-        USER_DATA['checking_balance'] = 1800.00
-        USER_DATA['investment_balance'] = 3500.00
-        USER_DATA['credit_score'] = 680
-        USER_DATA['credit_card_debt'] = 2800.00
+        data['monthly_income'] = 3200.00
+        data['total_balance'] = 8500.00
+        data['savings_balance'] = 3200.00
+        data['checking_balance'] = 1800.00
+        data['investment_balance'] = 3500.00
+        data['credit_score'] = 680
+        data['credit_card_debt'] = 2800.00
     elif quiz_data.get('income') == '50k-100k':
-        USER_DATA['monthly_income'] = 5500.00
-        USER_DATA['total_balance'] = 24563.00
-        USER_DATA['savings_balance'] = 12943.00
-        USER_DATA['checking_balance'] = 3200.00
-        USER_DATA['investment_balance'] = 8420.00
-        USER_DATA['credit_score'] = 742
-        USER_DATA['credit_card_debt'] = 1850.00
+        data['monthly_income'] = 5500.00
+        data['total_balance'] = 24563.00
+        data['savings_balance'] = 12943.00
+        data['checking_balance'] = 3200.00
+        data['investment_balance'] = 8420.00
+        data['credit_score'] = 742
+        data['credit_card_debt'] = 1850.00
     elif quiz_data.get('income') == '100k-150k':
-        USER_DATA['monthly_income'] = 9200.00
-        USER_DATA['total_balance'] = 45000.00
-        USER_DATA['savings_balance'] = 22000.00
-        USER_DATA['checking_balance'] = 5000.00
-        USER_DATA['investment_balance'] = 18000.00
-        USER_DATA['credit_score'] = 780
-        USER_DATA['credit_card_debt'] = 1200.00
+        data['monthly_income'] = 9200.00
+        data['total_balance'] = 45000.00
+        data['savings_balance'] = 22000.00
+        data['checking_balance'] = 5000.00
+        data['investment_balance'] = 18000.00
+        data['credit_score'] = 780
+        data['credit_card_debt'] = 1200.00
     elif quiz_data.get('income') == 'over-150k':
-        USER_DATA['monthly_income'] = 15000.00
-        USER_DATA['total_balance'] = 85000.00
-        USER_DATA['savings_balance'] = 35000.00
-        USER_DATA['checking_balance'] = 8000.00
-        USER_DATA['investment_balance'] = 42000.00
-        USER_DATA['credit_score'] = 820
-        USER_DATA['credit_card_debt'] = 800.00
+        data['monthly_income'] = 15000.00
+        data['total_balance'] = 85000.00
+        data['savings_balance'] = 35000.00
+        data['checking_balance'] = 8000.00
+        data['investment_balance'] = 42000.00
+        data['credit_score'] = 820
+        data['credit_card_debt'] = 800.00
     
     # Adjust based on savings level
     if quiz_data.get('savings') == 'under-5k':
-        USER_DATA['savings_balance'] = min(USER_DATA['savings_balance'], 3000)
-        USER_DATA['total_balance'] = USER_DATA['checking_balance'] + USER_DATA['savings_balance'] + USER_DATA['investment_balance']
+        data['savings_balance'] = min(data['savings_balance'], 3000)
+        data['total_balance'] = data['checking_balance'] + data['savings_balance'] + data['investment_balance']
     elif quiz_data.get('savings') == '5k-25k':
-        USER_DATA['savings_balance'] = min(max(USER_DATA['savings_balance'], 5000), 25000)
+        data['savings_balance'] = min(max(data['savings_balance'], 5000), 25000)
     elif quiz_data.get('savings') == '25k-50k':
-        USER_DATA['savings_balance'] = min(max(USER_DATA['savings_balance'], 25000), 50000)
+        data['savings_balance'] = min(max(data['savings_balance'], 25000), 50000)
     elif quiz_data.get('savings') == 'over-50k':
-        USER_DATA['savings_balance'] = max(USER_DATA['savings_balance'], 50000)
+        data['savings_balance'] = max(data['savings_balance'], 50000)
     
     # Adjust goals based on primary goal
     primary_goal = quiz_data.get('primaryGoal')
     if primary_goal == 'emergency-fund':
-        USER_DATA['goals'] = [
-            {"name": "Emergency Fund", "target": 15000, "current": min(USER_DATA['savings_balance'] * 0.6, 8500), "completed": False},
+        data['goals'] = [
+            {"name": "Emergency Fund", "target": 15000, "current": min(data['savings_balance'] * 0.6, 8500), "completed": False},
             {"name": "Short-term Savings", "target": 5000, "current": 2100, "completed": False}
         ]
     elif primary_goal == 'pay-debt':
         # Higher debt for debt-focused users
-        USER_DATA['credit_card_debt'] = max(USER_DATA['credit_card_debt'], 3500)
-        USER_DATA['goals'] = [
-            {"name": "Pay Off Credit Cards", "target": USER_DATA['credit_card_debt'], "current": 0, "completed": False},
+        data['credit_card_debt'] = max(data['credit_card_debt'], 3500)
+        data['goals'] = [
+            {"name": "Pay Off Credit Cards", "target": data['credit_card_debt'], "current": 0, "completed": False},
             {"name": "Emergency Fund", "target": 5000, "current": 1200, "completed": False}
         ]
     elif primary_goal == 'save-home':
-        USER_DATA['goals'] = [
-            {"name": "Home Down Payment", "target": 50000, "current": min(USER_DATA['savings_balance'] * 0.4, 15000), "completed": False},
+        data['goals'] = [
+            {"name": "Home Down Payment", "target": 50000, "current": min(data['savings_balance'] * 0.4, 15000), "completed": False},
             {"name": "Closing Costs", "target": 8000, "current": 2500, "completed": False}
         ]
     elif primary_goal == 'retirement':
-        USER_DATA['goals'] = [
+        data['goals'] = [
             {"name": "401(k) Contribution", "target": 20000, "current": 12000, "completed": False},
             {"name": "IRA Maxing", "target": 6500, "current": 3200, "completed": False}
         ]
     elif primary_goal == 'invest':
         # Higher investment balance for investment-focused users
-        USER_DATA['investment_balance'] = max(USER_DATA['investment_balance'], USER_DATA['total_balance'] * 0.4)
-        USER_DATA['goals'] = [
-            {"name": "Investment Portfolio Growth", "target": 25000, "current": USER_DATA['investment_balance'], "completed": False},
+        data['investment_balance'] = max(data['investment_balance'], data['total_balance'] * 0.4)
+        data['goals'] = [
+            {"name": "Investment Portfolio Growth", "target": 25000, "current": data['investment_balance'], "completed": False},
             {"name": "Diversified Holdings", "target": 10000, "current": 6500, "completed": False}
         ]
     
     # Adjust risk-based metrics
     if quiz_data.get('riskTolerance') == 'conservative':
-        USER_DATA['investment_balance'] = min(USER_DATA['investment_balance'], USER_DATA['total_balance'] * 0.2)
-        USER_DATA['savings_balance'] = max(USER_DATA['savings_balance'], USER_DATA['total_balance'] * 0.6)
+        data['investment_balance'] = min(data['investment_balance'], data['total_balance'] * 0.2)
+        data['savings_balance'] = max(data['savings_balance'], data['total_balance'] * 0.6)
     elif quiz_data.get('riskTolerance') == 'aggressive':
-        USER_DATA['investment_balance'] = max(USER_DATA['investment_balance'], USER_DATA['total_balance'] * 0.5)
-        USER_DATA['savings_balance'] = min(USER_DATA['savings_balance'], USER_DATA['total_balance'] * 0.3)
+        data['investment_balance'] = max(data['investment_balance'], data['total_balance'] * 0.5)
+        data['savings_balance'] = min(data['savings_balance'], data['total_balance'] * 0.3)
     
     # Recalculate total balance
-    USER_DATA['total_balance'] = USER_DATA['checking_balance'] + USER_DATA['savings_balance'] + USER_DATA['investment_balance']
+    data['total_balance'] = data['checking_balance'] + data['savings_balance'] + data['investment_balance']
     
     # Ensure realistic monthly expenses first
     if quiz_data.get('income') == 'under-50k':
-        USER_DATA['monthly_expenses'] = USER_DATA['monthly_income'] * 0.85  # 85% expense ratio for lower income
+        data['monthly_expenses'] = data['monthly_income'] * 0.85  # 85% expense ratio for lower income
     elif quiz_data.get('income') == 'over-150k':
-        USER_DATA['monthly_expenses'] = USER_DATA['monthly_income'] * 0.60  # 60% expense ratio for higher income
+        data['monthly_expenses'] = data['monthly_income'] * 0.60  # 60% expense ratio for higher income
     else:
-        USER_DATA['monthly_expenses'] = USER_DATA['monthly_income'] * 0.76  # 76% expense ratio for middle income
+        data['monthly_expenses'] = data['monthly_income'] * 0.76  # 76% expense ratio for middle income
     
     # Calculate realistic savings rate
-    if USER_DATA['monthly_income'] > 0:
-        monthly_savings = USER_DATA['monthly_income'] - USER_DATA['monthly_expenses']
-        USER_DATA['savings_rate'] = (monthly_savings / USER_DATA['monthly_income']) * 100
-        USER_DATA['savings_rate'] = max(5, min(USER_DATA['savings_rate'], 40))  # Cap between 5-40%
+    if data['monthly_income'] > 0:
+        monthly_savings = data['monthly_income'] - data['monthly_expenses']
+        data['savings_rate'] = (monthly_savings / data['monthly_income']) * 100
+        data['savings_rate'] = max(5, min(data['savings_rate'], 40))  # Cap between 5-40%
 
+    record = UserFinancialRecord.from_dict(data)
+    financial_store.put(user_id, record)
+    metrics_store.reset(user_id, record)
+    return record
+
+
+async def _restore_record(user_id: str) -> bool:
+    """Replace the worker's record with the persisted one, if there is one"""
+    saved = await load_financial_state(user_id)
+    history = await load_transaction_rows(user_id)
+    if not (saved or history):
+        return False
+    record = UserFinancialRecord.from_dict(saved) if saved else _default_record(user_id)
+    if history:
+        # The snapshot only carries the newest few; the table has them all
+        record.transactions = TransactionLog.from_rows(history)
+    elif record.recent_transactions:
+        # Saved before histories had their own table
+        queue_transactions(user_id, reversed(record.recent_transactions))
+    financial_store.put(user_id, record)
+    metrics_store.reset(user_id, financial_store.get(user_id))
+    return True
+
+
+async def load_user_record(user_id: str = DEFAULT_USER_ID) -> UserFinancialRecord:
+    """The user's live record, restoring persisted state if this worker's copy is missing or stale
+
+    Use this instead of ``financial_store.get`` before changing and saving a
+    record, so a default record never overwrites the persisted snapshot. A
+    stale copy is kept while this worker still has changes of its own to
+    write; it is reloaded once they are committed.
+    """
+    if user_id not in financial_store:
+        # Restore persisted state (e.g. after a restart or from another worker)
+        async with financial_store.lock(user_id):
+            if user_id not in financial_store:
+                await _restore_record(user_id)
+    elif financial_store.is_stale(user_id) and not pending_financial_changes(user_id):
+        async with financial_store.lock(user_id):
+            if financial_store.is_stale(user_id) and not pending_financial_changes(user_id):
+                financial_store.revalidate(user_id)
+                await _restore_record(user_id)
+    return financial_store.get(user_id)
+
+
+def invalidate_user_record(user_id: str):
+    """Mark a user's record as changed by another worker"""
+    financial_store.invalidate(user_id)
+
+
+def queue_record_change(user_id: str, record: UserFinancialRecord, kind: str = "add", **change):
+    """Queue one change to the user's saved state, raising its versions to the record's"""
+    op = {"kind": kind, **change}
+    op["versions"] = {field: getattr(record, field) for field in UserFinancialRecord.VERSION_FIELDS}
+    queue_financial_update(user_id, op, record.to_dict())
+
+
+async def get_user_financial_data(quiz_data: Dict = None, user_id: str = DEFAULT_USER_ID) -> UserFinancialRecord:
+    """Get current user financial data, personalized by quiz if provided
+
+    Returns the user's live record as a read-only mapping; nothing is copied.
+    """
+    record = await load_user_record(user_id)
 
-async def get_user_financial_data(quiz_data: Dict = None) -> Dict:
-    """Get current user financial data, personalized by quiz if provided"""
-    
     # Personalize data if quiz data is provided
-    if quiz_data:
-        personalize_financial_data(quiz_data)
-    
-    # Generate some recent transactions if empty
-    if not USER_DATA["recent_transactions"]:
-        USER_DATA["recent_transactions"] = generate_recent_transactions()
-    
-    return USER_DATA.copy()
+    if quiz_data or not record.recent_transactions:
+        async with financial_store.lock(user_id):
+            record = financial_store.get(user_id)
+            if quiz_data:
+                record = personalize_financial_data(quiz_data, user_id)
+
+            # Generate some recent transactions if empty
+            if not record.recent_transactions:
+                version = record.touch("transactions")
+                record.recent_transactions = generate_recent_transactions()
+                for transaction in record.recent_transactions:
+                    transaction["version"] = version
+                # A fresh (or re-personalized) record starts a new history
+                queue_transactions(user_id, reversed(record.recent_transactions), replace=True)
 
-async def simulate_transaction(data: Dict):
+            if quiz_data:
+                queue_financial_state(user_id, record.to_dict())
+            else:
+                queue_record_change(user_id, record, fields={})
+
+    return record
+
+async def simulate_transaction(user_id: str = DEFAULT_USER_ID):
     """Simulate a new transaction"""
     transaction = random.choice(TRANSACTION_TEMPLATES).copy()
     transaction["date"] = datetime.now().isoformat()
@@ -186,21 +281,27 @@ async def simulate_transaction(data: Dict):
     if transaction["amount"] < 0:
         transaction["amount"] *= random.uniform(0.8, 1.2)
     
-    # Update balances
-    if transaction["amount"] > 0:
-        data["total_balance"] += transaction["amount"]
-        data["checking_balance"] += transaction["amount"]
-    else:
-        data["total_balance"] += transaction["amount"]
-        data["checking_balance"] += transaction["amount"]
-        data["monthly_expenses"] += abs(transaction["amount"])
-    
-    # Add to recent transactions
-    data["recent_transactions"].insert(0, transaction)
-    data["recent_transactions"] = data["recent_transactions"][:20]  # Keep last 20
-    
-    # Update global data
-    USER_DATA.update(data)
+    await load_user_record(user_id)
+    async with financial_store.lock(user_id):
+        data = financial_store.get(user_id)
+
+        # Update balances
+        data.total_balance += transaction["amount"]
+        data.checking_balance += transaction["amount"]
+        if transaction["amount"] < 0:
+            data.monthly_expenses += abs(transaction["amount"])
+        metrics_store.apply_transaction(user_id, transaction["amount"])
+        
+        # Add to recent transactions
+        transaction["version"] = data.touch("transactions")
+        data.transactions.append(transaction)
+        analytics_store.record(user_id, data.transactions, transaction)
+
+        queue_transactions(user_id, [transaction])
+        changes = {"total_balance": transaction["amount"], "checking_balance": transaction["amount"]}
+        if transaction["amount"] < 0:
+            changes["monthly_expenses"] = abs(transaction["amount"])
+        queue_record_change(user_id, data, fields=changes)
     
     return transaction
 
@@ -226,12 +327,19 @@ def generate_recent_transactions() -> List[Dict]:
     
     return transactions
 
-async def update_user_goal_progress(goal_name: str, amount: float):
+async def update_user_goal_progress(goal_name: str, amount: float, user_id: str = DEFAULT_USER_ID) -> Optional[Dict]:
     """Update progress on a financial goal"""
-    for goal in USER_DATA["goals"]:
-        if goal["name"] == goal_name:
-            goal["current"] = min(goal["current"] + amount, goal["target"])
-            if goal["current"] >= goal["target"]:
-                goal["completed"] = True
-            return goal
+    await load_user_record(user_id)
+    async with financial_store.lock(user_id):
+        record = financial_store.get(user_id)
+        for goal in record.goals:
+            if goal["name"] == goal_name:
+                previous = goal["current"]
+                goal["current"] = min(goal["current"] + amount, goal["target"])
+                metrics_store.apply_goal_contribution(user_id, goal["current"] - previous)
+                record.touch("goals")
+                if goal["current"] >= goal["target"]:
+                    goal["completed"] = True
+                queue_record_change(user_id, record, kind="goal", name=goal_name, amount=amount)
+                return goal
     return None
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Financial State Store
+Keyed, per-user financial records with per-user write locks
+"""
+
+import asyncio
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from app.services.transaction_log import TransactionLog
+
+DEFAULT_USER_ID = "demo_user"
+
+
+class UserFinancialRecord(Mapping):
+    """Compact financial state for one user
+
+    Fields live in ``__slots__`` rather than a per-instance dict. The record is
+    also a read-only ``Mapping`` so callers can keep using ``data["field"]``,
+    ``data.get(...)`` and ``FinancialData(**data)`` without copying it.
+    Mutation goes through attribute assignment while holding the user's lock.
+    Transactions live in an append-only TransactionLog; ``recent_transactions``
+    exposes its ring buffer newest first.
+
+    ``version`` increases on every change; ``goals_version`` and
+    ``transactions_version`` record the version at which that part last
+    changed, so pollers can tell whether their copy is still current.
+    """
+
+    FIELDS = (
+        "user_id",
+        "name",
+        "total_balance",
+        "monthly_income",
+        "monthly_expenses",
+        "savings_rate",
+        "credit_score",
+        "investment_balance",
+        "checking_balance",
+        "savings_balance",
+        "credit_card_debt",
+        "credit_limit",
+        "recent_transactions",
+        "goals",
+    )
+    # recent_transactions is a view over the transaction log, not a slot
+    __slots__ = tuple(f for f in FIELDS if f != "recent_transactions") + (
+        "transactions", "version", "goals_version", "transactions_version"
+    )
+    _FIELD_SET = frozenset(FIELDS)
+    # Saved with the record so ETags and ``since`` cursors stay valid across restarts
+    VERSION_FIELDS = ("version", "goals_version", "transactions_version")
+
+    def __init__(self, **values):
+        self.transactions = TransactionLog()
+        for field in self.FIELDS:
+            setattr(self, field, values.get(field))
+        if self.goals is None:
+            self.goals = []
+        self.version = 0
+        self.goals_version = 0
+        self.transactions_version = 0
+
+    def touch(self, section: Optional[str] = None) -> int:
+        """Bump the version after a change to ``section`` (None: the whole record)"""
+        self.version += 1
+        if section in (None, "goals"):
+            self.goals_version = self.version
+        if section in (None, "transactions"):
+            self.transactions_version = self.version
+        return self.version
+
+    @property
+    def recent_transactions(self) -> List[Dict]:
+        """Newest-first recent transactions (read-only; append via ``transactions``)"""
+        return self.transactions.recent_transactions()
+
+    @recent_transactions.setter
+    def recent_transactions(self, transactions: Optional[List[Dict]]):
+        # Given newest first, as stored and served; the log wants oldest first
+        self.transactions = TransactionLog(reversed(transactions or []))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UserFinancialRecord":
+        """Build a record that owns its own lists (no sharing with ``data``)"""
+        values = dict(data)
+        values["recent_transactions"] = [dict(t) for t in data.get("recent_transactions", [])]
+        values["goals"] = [dict(g) for g in data.get("goals", [])]
+        record = cls(**values)
+        for field in cls.VERSION_FIELDS:
+            setattr(record, field, int(data.get(field) or 0))
+        return record
+
+    def __getitem__(self, key: str):
+        if key not in self._FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def to_dict(self) -> Dict:
+        """Detached snapshot of the record and its versions (copies the nested lists)"""
+        data = {field: getattr(self, field) for field in self.FIELDS + self.VERSION_FIELDS}
+        data["recent_transactions"] = [dict(t) for t in self.recent_transactions]
+        data["goals"] = [dict(g) for g in self.goals]
+        return data
+
+
+class FinancialStateStore:
+    """Per-user financial records keyed by user id
+
+    A record another worker has changed since it was loaded is marked stale
+    (``invalidate``) and reloaded from the database on next use.
+    """
+
+    def __init__(self, default_factory: Callable[[str], UserFinancialRecord]):
+        self._default_factory = default_factory
+        self._records: Dict[str, UserFinancialRecord] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._stale: Set[str] = set()
+
+    def get(self, user_id: str = DEFAULT_USER_ID) -> UserFinancialRecord:
+        """Return the live record for a user, creating a default one on first use"""
+        record = self._records.get(user_id)
+        if record is None:
+            record = self._default_factory(user_id)
+            self._records[user_id] = record
+        return record
+
+    def put(self, user_id: str, record: UserFinancialRecord) -> None:
+        """Replace a user's record, continuing its version sequence"""
+        record.user_id = user_id
+        previous = self._records.get(user_id)
+        record.version = max(record.version, previous.version if previous else 0)
+        record.touch()
+        self._records[user_id] = record
+
+    def invalidate(self, user_id: str) -> None:
+        """Mark a user's record as changed elsewhere (no-op if this worker has none)"""
+        if user_id in self._records:
+            self._stale.add(user_id)
+
+    def is_stale(self, user_id: str) -> bool:
+        return user_id in self._stale
+
+    def revalidate(self, user_id: str) -> None:
+        """Clear the stale mark before reloading, so changes made meanwhile mark it again"""
+        self._stale.discard(user_id)
+
+    def lock(self, user_id: str = DEFAULT_USER_ID) -> asyncio.Lock:
+        """Per-user write lock; readers never need it"""
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks.setdefault(user_id, asyncio.Lock())
+        return lock
+
+    def users(self) -> List[str]:
+        """Ids of every user with a record"""
+        return list(self._records)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._records
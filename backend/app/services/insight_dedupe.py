@@ -0,0 +1,102 @@
+"""
+Insight Dedupe
+Change detection on each agent's slice of financial data, plus a time-windowed
+LRU that suppresses repeated insights
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Mapping, Tuple
+
+INSIGHT_DEDUPE_WINDOW = float(os.getenv("INSIGHT_DEDUPE_WINDOW", 3600))
+INSIGHT_DEDUPE_MAX_ENTRIES = int(os.getenv("INSIGHT_DEDUPE_MAX_ENTRIES", 10000))
+
+# The fields each agent actually looks at
+AGENT_FOCUS_FIELDS = {
+    "sofia": ("credit_score", "credit_card_debt", "credit_limit", "monthly_income", "monthly_expenses"),
+    "marcus": ("total_balance", "investment_balance", "savings_balance", "savings_rate", "monthly_expenses"),
+    "luna": ("monthly_income", "monthly_expenses", "savings_rate"),
+}
+# Agents whose analysis also depends on goals / latest transactions
+AGENTS_WATCHING_ACTIVITY = {"luna"}
+
+
+def _digest(parts) -> str:
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def fingerprint(agent_id: str, data: Mapping) -> str:
+    """Hash of the slice of financial data relevant to one agent
+
+    Amounts are rounded to whole dollars so cents-level noise does not count
+    as a change.
+    """
+    parts = [round(float(data.get(field) or 0)) for field in AGENT_FOCUS_FIELDS.get(agent_id, ())]
+    if agent_id in AGENTS_WATCHING_ACTIVITY:
+        parts.append(tuple(
+            (g.get("name"), round(float(g.get("current", 0))), bool(g.get("completed")))
+            for g in data.get("goals", [])
+        ))
+        parts.append(tuple(t.get("id") for t in data.get("recent_transactions", [])[:5]))
+    return _digest(parts)
+
+
+class FingerprintTracker:
+    """Remembers the last analyzed fingerprint per (user, agent)
+
+    ``changed`` only compares; the caller ``commit``s the fingerprint once
+    the analysis of that data has actually completed, so a failed model call
+    is retried on the next run instead of being mistaken for "no change".
+    """
+
+    def __init__(self):
+        self._fingerprints: Dict[Tuple[str, str], str] = {}
+        self.unchanged = 0
+
+    def changed(self, user_id: str, agent_id: str, data: Mapping) -> bool:
+        """True when the agent's slice differs from the last committed one"""
+        if self._fingerprints.get((user_id, agent_id)) == fingerprint(agent_id, data):
+            self.unchanged += 1
+            return False
+        return True
+
+    def commit(self, user_id: str, agent_id: str, data: Mapping):
+        """Remember ``data`` as analyzed for this (user, agent)"""
+        self._fingerprints[(user_id, agent_id)] = fingerprint(agent_id, data)
+
+    def forget(self, user_id: str):
+        for key in [key for key in self._fingerprints if key[0] == user_id]:
+            del self._fingerprints[key]
+
+
+class InsightDeduper:
+    """Bounded LRU of recently sent insights keyed on (user, type, title)"""
+
+    def __init__(self, window: float = INSIGHT_DEDUPE_WINDOW, max_entries: int = INSIGHT_DEDUPE_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self.suppressed = 0
+
+    @staticmethod
+    def key(user_id: str, insight: Mapping) -> str:
+        title = " ".join(str(insight.get("title", "")).lower().split())
+        return _digest((user_id, str(insight.get("type", "")), title))
+
+    def is_duplicate(self, user_id: str, insight: Mapping) -> bool:
+        """True if this insight was sent within the window; otherwise record it"""
+        key = self.key(user_id, insight)
+        now = time.monotonic()
+
+        expires_at = self._seen.get(key)
+        if expires_at is not None and expires_at > now:
+            self.suppressed += 1
+            return True
+
+        self._seen[key] = now + self.window
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return False
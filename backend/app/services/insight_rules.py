@@ -0,0 +1,172 @@
+"""
+Insight Rules
+Cheap deterministic checks that decide whether an agent's LLM analysis is worth running
+"""
+
+import os
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+# Thresholds
+UTILIZATION_HIGH = 0.30          # credit_card_debt / credit_limit
+CREDIT_SCORE_LOW = 670
+EXPENSE_RATIO_HIGH = 0.90        # monthly_expenses / monthly_income
+SAVINGS_RATE_LOW = 10.0          # percent
+IDLE_CASH_MONTHS = 6             # savings above this many months of expenses
+INVESTMENT_SHARE_LOW = 0.15      # investment_balance / total_balance
+GOAL_NEAR = 0.90                 # fraction of target
+LARGE_DISCRETIONARY = 150.00     # single shopping/dining/entertainment purchase
+DISCRETIONARY_CATEGORIES = {"Shopping", "Dining", "Entertainment", "Electronics"}
+SPENDING_SPIKE = 0.50            # 7-day category spend vs its 30-day weekly pace
+SPENDING_SPIKE_MIN = 100.00      # ignore spikes in categories below this 7-day spend
+
+# Relative change in a tracked metric that counts as "meaningful"
+CHANGE_THRESHOLD = float(os.getenv("INSIGHT_CHANGE_THRESHOLD", 0.05))
+
+# Metrics compared against the snapshot taken at the last LLM analysis
+TRACKED_METRICS = (
+    "total_balance",
+    "monthly_expenses",
+    "savings_rate",
+    "credit_score",
+    "investment_balance",
+    "savings_balance",
+    "credit_card_debt",
+)
+
+
+def _ratio(numerator, denominator) -> float:
+    return numerator / denominator if denominator else 0.0
+
+
+def _goal_progress(goal: Mapping) -> float:
+    return _ratio(goal.get("current", 0), goal.get("target", 0))
+
+
+def _sofia_rules(data: Mapping, analytics: Optional[Mapping] = None) -> List[Dict]:
+    hits = []
+    utilization = _ratio(data.get("credit_card_debt", 0), data.get("credit_limit", 0))
+    if utilization >= UTILIZATION_HIGH:
+        hits.append({"rule": "high_utilization", "detail": f"Credit utilization is {utilization:.0%}"})
+    if 0 < data.get("credit_score", 0) < CREDIT_SCORE_LOW:
+        hits.append({"rule": "low_credit_score", "detail": f"Credit score is {data['credit_score']}"})
+    if data.get("credit_card_debt", 0) > data.get("monthly_income", 0) * 0.5 > 0:
+        hits.append({"rule": "debt_vs_income", "detail": "Card debt exceeds half of monthly income"})
+    return hits
+
+
+def _marcus_rules(data: Mapping, analytics: Optional[Mapping] = None) -> List[Dict]:
+    hits = []
+    monthly_expenses = data.get("monthly_expenses", 0)
+    savings = data.get("savings_balance", 0)
+    investments = data.get("investment_balance", 0)
+    if monthly_expenses and savings > monthly_expenses * IDLE_CASH_MONTHS and investments < savings:
+        hits.append({"rule": "idle_cash", "detail": f"Savings cover {savings / monthly_expenses:.1f} months of expenses"})
+    share = _ratio(investments, data.get("total_balance", 0))
+    if data.get("total_balance", 0) > 0 and share < INVESTMENT_SHARE_LOW:
+        hits.append({"rule": "low_investment_share", "detail": f"Investments are {share:.0%} of balances"})
+    return hits
+
+
+def _luna_rules(data: Mapping, analytics: Optional[Mapping] = None) -> List[Dict]:
+    hits = []
+    expense_ratio = _ratio(data.get("monthly_expenses", 0), data.get("monthly_income", 0))
+    if expense_ratio >= EXPENSE_RATIO_HIGH:
+        hits.append({"rule": "overspending", "detail": f"Expenses are {expense_ratio:.0%} of income"})
+    if data.get("savings_rate", 0) < SAVINGS_RATE_LOW:
+        hits.append({"rule": "low_savings_rate", "detail": f"Savings rate is {data.get('savings_rate', 0):.1f}%"})
+    for goal in data.get("goals", []):
+        progress = _goal_progress(goal)
+        if goal.get("completed") or progress >= 1:
+            hits.append({"rule": "goal_completed", "detail": f"Goal '{goal.get('name')}' is complete"})
+        elif progress >= GOAL_NEAR:
+            hits.append({"rule": "goal_near", "detail": f"Goal '{goal.get('name')}' is {progress:.0%} funded"})
+    for transaction in data.get("recent_transactions", [])[:5]:
+        if transaction.get("category") in DISCRETIONARY_CATEGORIES and -transaction.get("amount", 0) >= LARGE_DISCRETIONARY:
+            hits.append({"rule": "large_discretionary", "detail": f"${-transaction['amount']:,.2f} at {transaction.get('merchant')}"})
+            break
+    if analytics:
+        week = analytics["windows"]["7d"]["by_category"]
+        for category, change in analytics["trends"].items():
+            if change >= SPENDING_SPIKE and week.get(category, 0) >= SPENDING_SPIKE_MIN:
+                hits.append({"rule": "spending_spike", "detail": f"{category} spending is up {change:.0%} vs the 30-day pace"})
+                break
+    return hits
+
+
+AGENT_RULES: Dict[str, Callable[[Mapping, Optional[Mapping]], List[Dict]]] = {
+    "sofia": _sofia_rules,
+    "marcus": _marcus_rules,
+    "luna": _luna_rules,
+}
+
+
+def evaluate_rules(agent_id: str, data: Mapping, analytics: Optional[Mapping] = None) -> List[Dict]:
+    """Run an agent's rules over a user's financial data (and spending analytics, if any)"""
+    rules = AGENT_RULES.get(agent_id)
+    return rules(data, analytics) if rules else []
+
+
+def _snapshot(data: Mapping) -> Dict[str, float]:
+    snapshot = {metric: float(data.get(metric) or 0) for metric in TRACKED_METRICS}
+    snapshot["goal_progress"] = float(sum(g.get("current", 0) for g in data.get("goals", [])))
+    return snapshot
+
+
+def _changed(previous: Dict[str, float], current: Dict[str, float]) -> bool:
+    for metric, value in current.items():
+        before = previous.get(metric, 0.0)
+        if abs(value - before) > abs(before) * CHANGE_THRESHOLD:
+            return True
+    return False
+
+
+class InsightGate:
+    """Decides per (user, agent) whether an LLM analysis is warranted
+
+    The model is called when a rule fires that did not fire at the previous
+    analysis, or when a tracked metric moved by more than CHANGE_THRESHOLD
+    since then. Otherwise the analysis is skipped without any model call.
+
+    ``check`` does not move the baseline when it lets a call through; the
+    caller ``commit``s it after the model replied, so a failed call is
+    retried on the next run.
+    """
+
+    def __init__(self):
+        self._last: Dict[Tuple[str, str], Tuple[Dict[str, float], FrozenSet[str]]] = {}
+        self.evaluated = 0
+        self.skipped = 0
+
+    def check(self, user_id: str, agent_id: str, data: Mapping,
+              analytics: Optional[Mapping] = None) -> Tuple[bool, List[Dict]]:
+        """Return (should_call_llm, fired_rules)"""
+        self.evaluated += 1
+        hits = evaluate_rules(agent_id, data, analytics)
+        fired = frozenset(hit["rule"] for hit in hits)
+        snapshot = _snapshot(data)
+
+        previous = self._last.get((user_id, agent_id))
+        if previous is None:
+            should_call = bool(hits)
+        else:
+            last_snapshot, last_fired = previous
+            should_call = bool(fired - last_fired) or _changed(last_snapshot, snapshot)
+
+        if not should_call:
+            if previous is None:
+                # First look with nothing to report: later changes are measured from here
+                self._last[(user_id, agent_id)] = (snapshot, fired)
+            self.skipped += 1
+        return should_call, hits
+
+    def commit(self, user_id: str, agent_id: str, data: Mapping, hits: List[Dict]):
+        """Record the data and fired rules of an analysis the model answered"""
+        self._last[(user_id, agent_id)] = (_snapshot(data), frozenset(hit["rule"] for hit in hits))
+
+    def forget(self, user_id: str):
+        """Drop state for a user who is no longer scheduled"""
+        for key in [key for key in self._last if key[0] == user_id]:
+            del self._last[key]
+
+    def stats(self) -> Dict:
+        return {"evaluated": self.evaluated, "skipped": self.skipped}
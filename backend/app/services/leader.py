@@ -0,0 +1,129 @@
+"""
+Leader Election
+Lease-based election so only one worker runs singleton background jobs
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.db import database
+from app.db.models import Lease
+from app.services.pubsub import WORKER_ID
+
+# Seconds a lease stays valid without renewal; holders renew every third of it
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", 15))
+
+
+class LocalLease:
+    """Always held; for a single process with nothing to coordinate"""
+
+    def __init__(self, name: str, holder: str = WORKER_ID, ttl: float = LEADER_LEASE_TTL):
+        self.name = name
+        self.holder = holder
+        self.ttl = ttl
+
+    async def try_acquire(self) -> bool:
+        return True
+
+    async def release(self):
+        pass
+
+
+class DatabaseLease(LocalLease):
+    """A row in the leases table that one worker holds until it expires
+
+    Acquiring takes the row if it is free, expired or already ours, and
+    pushes its expiry forward; renewal is the same call.
+    """
+
+    async def try_acquire(self) -> bool:
+        now = time.time()
+        async with database.SessionLocal() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(Lease)
+                    .where(Lease.name == self.name, or_(Lease.holder == self.holder, Lease.expires_at < now))
+                    .values(holder=self.holder, expires_at=now + self.ttl)
+                )
+        if result.rowcount:
+            return True
+
+        # No row yet (first start); whoever inserts it first wins
+        try:
+            async with database.SessionLocal() as session:
+                async with session.begin():
+                    await session.execute(
+                        insert(Lease).values(name=self.name, holder=self.holder, expires_at=now + self.ttl)
+                    )
+            return True
+        except IntegrityError:
+            return False
+
+    async def release(self):
+        async with database.SessionLocal() as session:
+            async with session.begin():
+                await session.execute(
+                    update(Lease)
+                    .where(Lease.name == self.name, Lease.holder == self.holder)
+                    .values(expires_at=0)
+                )
+
+
+class LeaderElector:
+    """Keeps trying to hold a lease and runs callbacks when leadership changes
+
+    A worker that cannot renew (lost the row, database error) steps down
+    straight away, so two leaders overlap for at most one renewal interval.
+    """
+
+    def __init__(self, lease: LocalLease,
+                 on_elected: Callable[[], Awaitable[None]],
+                 on_demoted: Callable[[], Awaitable[None]]):
+        self.lease = lease
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            await self._set_leader(False)
+            try:
+                await self.lease.release()
+            except Exception as e:
+                print(f"Error releasing lease '{self.lease.name}': {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                held = await self.lease.try_acquire()
+            except Exception as e:
+                print(f"Error renewing lease '{self.lease.name}': {e}")
+                held = False
+            if held != self.is_leader:
+                await self._set_leader(held)
+            await asyncio.sleep(self.lease.ttl / 3)
+
+    async def _set_leader(self, leader: bool):
+        self.is_leader = leader
+        if leader:
+            print(f"👑 {self.lease.holder} is now leader for '{self.lease.name}'")
+            await self.on_elected()
+        else:
+            print(f"⬇️ {self.lease.holder} stepped down as leader for '{self.lease.name}'")
+            await self.on_demoted()
@@ -0,0 +1,157 @@
+"""
+LLM Response Cache
+TTL + LRU cache for model replies keyed on agent id and a normalized prompt hash,
+plus single-flight coalescing of identical in-flight calls
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 2048))
+LLM_CACHE_MAX_CHARS = int(os.getenv("LLM_CACHE_MAX_CHARS", 8_000_000))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 3600))
+
+_WHITESPACE = re.compile(r"\s+")
+
+CacheKey = Tuple[str, str]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace and case so trivially different prompts share a key"""
+    return _WHITESPACE.sub(" ", prompt).strip().casefold()
+
+
+class LLMResponseCache:
+    """Bounded response cache with TTL expiry and LRU eviction
+
+    Bounded both by entry count and by the total number of cached characters.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 max_chars: int = LLM_CACHE_MAX_CHARS, ttl: float = LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self._entries: "OrderedDict[CacheKey, Tuple[float, str]]" = OrderedDict()
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(agent_id: str, prompt: str) -> CacheKey:
+        digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+        return (agent_id, digest)
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: CacheKey, value: str):
+        if len(value) > self.max_chars:
+            return
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._chars += len(value)
+
+        while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._chars = 0
+
+    def _remove(self, key: CacheKey):
+        _, value = self._entries.pop(key)
+        self._chars -= len(value)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "chars": self._chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key onto one in-flight task
+
+    The first caller for a key starts the call; callers arriving while it is
+    still running await the same task. Each waiter is shielded from the
+    others, and the shared call is cancelled only once every waiter has
+    given up.
+    """
+
+    def __init__(self):
+        self._calls: Dict[CacheKey, Tuple[asyncio.Task, list]] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: CacheKey, call: Callable[[], Awaitable[str]]) -> str:
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(call())
+            entry = (task, [0])
+            self._calls[key] = entry
+            task.add_done_callback(lambda _, key=key, task=task: self._finish(key, task))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and waiters[0] == 1:
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+
+    def _finish(self, key: CacheKey, task: asyncio.Task):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when nobody was left waiting
+            task.exception()
+
+    def stats(self) -> Dict:
+        calls = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+        }
+
+
+# Shared cache and in-flight registry for all agents
+response_cache = LLMResponseCache()
+inflight = SingleFlight()
@@ -0,0 +1,155 @@
+"""
+Async LLM Client
+Non-blocking wrapper around Gemini so model calls never freeze the event loop
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
+
+from app.services.llm_gate import llm_gate
+
+# Tunables (seconds / counts)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 256))
+LLM_THREAD_WORKERS = int(os.getenv("LLM_THREAD_WORKERS", 16))
+
+# Shared bounded pool for models that only expose a blocking API
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Lazily create the shared thread pool used for blocking model calls"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=LLM_THREAD_WORKERS,
+            thread_name_prefix="llm"
+        )
+    return _executor
+
+
+class LLMTimeoutError(asyncio.TimeoutError):
+    """Raised when a model call exceeds its deadline"""
+
+
+class LLMClient:
+    """Async facade over a Gemini GenerativeModel
+
+    Uses the model's native ``generate_content_async`` when available and
+    falls back to a bounded thread pool otherwise. Every call is bounded by
+    a per-call timeout and a process-wide concurrency limit, and cancelling
+    the awaiting task cancels the underlying request. Calls are admitted by
+    the shared LLM gate, which raises LLMUnavailableError instead of calling
+    the model while Gemini is rate limited or failing.
+    """
+
+    # One semaphore per event loop, shared by every client in the process
+    _semaphores = {}
+
+    def __init__(self, model, timeout: float = LLM_TIMEOUT):
+        self.model = model
+        self.timeout = timeout
+
+    @classmethod
+    def _semaphore(cls) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = cls._semaphores.get(loop)
+        if sem is None:
+            sem = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+            cls._semaphores[loop] = sem
+        return sem
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Generate a completion for ``prompt`` and return the stripped text"""
+        deadline = self.timeout if timeout is None else timeout
+        await llm_gate.admit(max_wait=deadline)
+        with llm_gate.track():
+            async with self._semaphore():
+                try:
+                    response = await asyncio.wait_for(self._call(prompt), timeout=deadline)
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(f"LLM call timed out after {deadline:.1f}s")
+            return (response.text or "").strip()
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield text chunks as the model produces them
+
+        ``timeout`` bounds the whole generation, not each chunk. Closing the
+        generator (e.g. when the client disconnects) cancels the request.
+        """
+        budget = self.timeout if timeout is None else timeout
+        deadline = asyncio.get_running_loop().time() + budget
+        await llm_gate.admit(max_wait=budget)
+        with llm_gate.track():
+            async with self._semaphore():
+                chunks = self._stream_chunks(prompt)
+                try:
+                    while True:
+                        remaining = deadline - asyncio.get_running_loop().time()
+                        if remaining <= 0:
+                            raise LLMTimeoutError("LLM stream exceeded its deadline")
+                        try:
+                            text = await asyncio.wait_for(chunks.__anext__(), timeout=remaining)
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            raise LLMTimeoutError("LLM stream exceeded its deadline")
+                        if text:
+                            yield text
+                finally:
+                    await chunks.aclose()
+
+    async def _stream_chunks(self, prompt: str) -> AsyncIterator[str]:
+        native = getattr(self.model, "generate_content_async", None)
+        if native is not None:
+            response = await native(prompt, stream=True)
+            async for chunk in response:
+                yield chunk.text
+            return
+
+        # Blocking streams are drained on the thread pool and handed back through a queue
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        cancelled = False
+
+        def _drain():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if cancelled:
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        future = loop.run_in_executor(_get_executor(), _drain)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled = True
+            future.cancel()
+
+    async def _call(self, prompt: str):
+        native = getattr(self.model, "generate_content_async", None)
+        if native is not None:
+            return await native(prompt)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), self.model.generate_content, prompt)
+
+
+def shutdown_executor():
+    """Release the shared thread pool (called on application shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,223 @@
+"""
+LLM Gate
+Process-wide token-bucket rate limiter and circuit breaker in front of Gemini
+"""
+
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+try:
+    from google.api_core.exceptions import ResourceExhausted
+except Exception:
+    ResourceExhausted = None
+
+# Token bucket sized to the Gemini quota (requests per minute / burst)
+LLM_RATE_PER_MIN = float(os.getenv("LLM_RATE_PER_MIN", 60))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", 10))
+LLM_RATE_MAX_WAIT = float(os.getenv("LLM_RATE_MAX_WAIT", 2))
+# Circuit breaker (consecutive 429s/timeouts before opening / seconds open)
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 3))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+
+# The adaptive rate never drops below this share of the configured rate
+MIN_RATE_FRACTION = 0.1
+
+
+class LLMUnavailableError(Exception):
+    """Raised instead of calling the model while the gate is closed to callers"""
+
+
+def is_quota_error(error: BaseException) -> bool:
+    """True for Gemini 429 / quota-exhausted errors"""
+    if ResourceExhausted is not None and isinstance(error, ResourceExhausted):
+        return True
+    text = str(error)
+    return "429" in text or "quota" in text.lower()
+
+
+class TokenBucket:
+    """Token bucket whose refill rate backs off on 429s and recovers on success
+
+    The rate is halved on every quota error (down to MIN_RATE_FRACTION of the
+    configured rate) and creeps back up by a tenth of the configured rate per
+    successful call.
+    """
+
+    def __init__(self, rate_per_min: float = LLM_RATE_PER_MIN, burst: int = LLM_RATE_BURST):
+        self.base_rate = rate_per_min / 60.0
+        self.rate = self.base_rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until the next token is available"""
+        self._refill()
+        return max(0.0, (1 - self._tokens) / self.rate)
+
+    def throttle(self):
+        self.rate = max(self.rate / 2, self.base_rate * MIN_RATE_FRACTION)
+
+    def recover(self):
+        self.rate = min(self.rate + self.base_rate * 0.1, self.base_rate)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through after the cool-down"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            # A single probe decides whether to close again
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            print("✅ LLM circuit closed")
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                print(f"⛔ LLM circuit open for {self.cooldown:.0f}s after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a probe slot without a verdict (e.g. the call was cancelled)"""
+        self._probing = False
+
+    def retry_after(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+
+class LLMGate:
+    """Admission control shared by every LLMClient
+
+    ``admit`` fails fast with LLMUnavailableError while the breaker is open
+    or when no rate token frees up within LLM_RATE_MAX_WAIT, so callers can
+    serve their fallback immediately instead of burning quota on retries.
+    """
+
+    def __init__(self, bucket: Optional[TokenBucket] = None, breaker: Optional[CircuitBreaker] = None,
+                 max_wait: float = LLM_RATE_MAX_WAIT):
+        self.bucket = bucket or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_wait = max_wait
+        self.admitted = 0
+        self.rejected = 0
+        self.quota_errors = 0
+        self.timeouts = 0
+
+    async def admit(self, max_wait: Optional[float] = None):
+        """Wait briefly for a rate token, or raise LLMUnavailableError"""
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise LLMUnavailableError(f"LLM circuit open, retry in {self.breaker.retry_after():.0f}s")
+
+        budget = self.max_wait if max_wait is None else min(max_wait, self.max_wait)
+        deadline = time.monotonic() + budget
+        try:
+            while not self.bucket.try_acquire():
+                wait = self.bucket.wait_time()
+                if time.monotonic() + wait > deadline:
+                    self.rejected += 1
+                    raise LLMUnavailableError("LLM rate limit reached")
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.breaker.release()
+            raise
+        self.admitted += 1
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Feed the outcome of an admitted call back into the breaker and bucket"""
+        try:
+            yield
+        except asyncio.TimeoutError:
+            self.record_timeout()
+            raise
+        except Exception as e:
+            if is_quota_error(e):
+                self.record_quota_error()
+            else:
+                self.release()
+            raise
+        except BaseException:
+            self.release()
+            raise
+        self.record_success()
+
+    def record_success(self):
+        self.bucket.recover()
+        self.breaker.record_success()
+
+    def record_quota_error(self):
+        self.quota_errors += 1
+        self.bucket.throttle()
+        self.breaker.record_failure()
+
+    def record_timeout(self):
+        self.timeouts += 1
+        self.breaker.record_failure()
+
+    def release(self):
+        """The call ended without a verdict on Gemini's health (cancelled, bad prompt, ...)"""
+        self.breaker.release()
+
+    def stats(self) -> Dict:
+        return {
+            "state": self.breaker.state,
+            "retry_after": round(self.breaker.retry_after(), 1),
+            "trips": self.breaker.trips,
+            "rate_per_min": round(self.bucket.rate * 60, 2),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "quota_errors": self.quota_errors,
+            "timeouts": self.timeouts,
+        }
+
+
+# Shared gate for every model call in the process
+llm_gate = LLMGate()
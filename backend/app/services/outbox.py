@@ -0,0 +1,140 @@
+"""
+Notification Outbox
+Per-user ring of recent sequenced notifications so reconnecting clients can catch up
+"""
+
+import os
+from collections import OrderedDict, deque
+from typing import Dict, List, Tuple
+
+from app.db import database
+from app.db.database import allocate_notification_seq, load_notifications, pending_notifications
+
+# Notifications kept per user / users kept in memory (least recently used are dropped)
+OUTBOX_SIZE = int(os.getenv("OUTBOX_SIZE", 100))
+OUTBOX_MAX_USERS = int(os.getenv("OUTBOX_MAX_USERS", 10000))
+# Seed outboxes from the notifications table so sequence numbers survive restarts
+OUTBOX_PERSIST = os.getenv("OUTBOX_PERSIST", "true").lower() != "false"
+# Same setting pub/sub reads: with several workers, sequence numbers come from the database
+SHARED_SEQUENCES = os.getenv("PUBSUB_BACKEND", "memory") == "sqlite"
+
+
+class UserOutbox:
+    """Recent notifications for one user, ordered by sequence number"""
+
+    __slots__ = ("entries", "next_seq")
+
+    def __init__(self, size: int = OUTBOX_SIZE):
+        self.entries: deque = deque(maxlen=size)
+        self.next_seq = 1
+
+    @property
+    def latest(self) -> int:
+        return self.next_seq - 1
+
+    def record(self, seq: int, message: Dict):
+        # Sequence numbers only move forward; anything older is a duplicate
+        if self.entries and seq <= self.entries[-1][0]:
+            return
+        self.entries.append((seq, message))
+        self.next_seq = max(self.next_seq, seq + 1)
+
+    def since(self, seq: int) -> Tuple[List[Dict], bool]:
+        """Messages after ``seq``, and whether that is everything the client missed"""
+        if seq > self.latest:
+            # The client is ahead of us: sequences restarted, so send everything
+            return [message for _, message in self.entries], False
+        missed = [message for s, message in self.entries if s > seq]
+        oldest = self.entries[0][0] if self.entries else self.next_seq
+        return missed, oldest <= seq + 1
+
+
+class NotificationOutbox:
+    """Sequenced, bounded notification history per user
+
+    Every notification for a user gets the next sequence number for that
+    user. The last OUTBOX_SIZE are kept in a ring buffer, so a client that
+    reconnects with the last sequence it saw can be sent just what it
+    missed. Notifications are already persisted with their sequence number,
+    so with OUTBOX_PERSIST an outbox is reloaded from the database the first
+    time a user is seen after a restart or eviction. Notifications still
+    waiting in the write buffer count too, so a user evicted before they
+    were written never gets a number twice.
+
+    This class numbers notifications in memory, which suits a single
+    process. With several workers use DatabaseOutbox: each worker keeps its
+    own copy fed from pub/sub, but numbers come from a shared counter.
+    """
+
+    def __init__(self, size: int = OUTBOX_SIZE, max_users: int = OUTBOX_MAX_USERS,
+                 persist: bool = OUTBOX_PERSIST):
+        self.size = size
+        self.max_users = max_users
+        self.persist = persist
+        self._outboxes: "OrderedDict[str, UserOutbox]" = OrderedDict()
+
+    async def load(self, user_id: str) -> UserOutbox:
+        """The user's outbox, seeded from persisted notifications on first use"""
+        user_outbox = self._outboxes.get(user_id)
+        if user_outbox is not None:
+            self._outboxes.move_to_end(user_id)
+            return user_outbox
+
+        user_outbox = UserOutbox(self.size)
+        if self.persist:
+            rows = await load_notifications(user_id, limit=self.size) + pending_notifications(user_id)
+            for payload in sorted((p for p in rows if p.get("seq")), key=lambda p: p["seq"]):
+                user_outbox.record(payload["seq"], notification_message(payload))
+        # Another call may have created it while we were reading
+        user_outbox = self._outboxes.setdefault(user_id, user_outbox)
+        self._outboxes.move_to_end(user_id)
+        while len(self._outboxes) > self.max_users:
+            self._outboxes.popitem(last=False)
+        return user_outbox
+
+    async def allocate(self, user_id: str) -> int:
+        """Reserve the user's next sequence number"""
+        user_outbox = await self.load(user_id)
+        seq = user_outbox.next_seq
+        user_outbox.next_seq += 1
+        return seq
+
+    async def record(self, user_id: str, seq: int, message: Dict):
+        (await self.load(user_id)).record(seq, message)
+
+    def replay(self, user_id: str, since: int) -> Dict:
+        """One batch frame with everything after ``since`` (call ``load`` first)"""
+        user_outbox = self._outboxes.get(user_id) or UserOutbox(self.size)
+        messages, complete = user_outbox.since(since)
+        return {
+            "type": "batch",
+            "replay": True,
+            "complete": complete,
+            "latest": user_outbox.latest,
+            "messages": messages,
+        }
+
+
+class DatabaseOutbox(NotificationOutbox):
+    """Outbox whose sequence numbers come from a counter row in the database
+
+    Any worker can publish for any user without two of them picking the
+    same number. Without a database it falls back to numbering in memory.
+    """
+
+    async def allocate(self, user_id: str) -> int:
+        if database.SessionLocal is None:
+            return await super().allocate(user_id)
+        user_outbox = await self.load(user_id)
+        seq = await allocate_notification_seq(user_id, floor=user_outbox.latest)
+        user_outbox.next_seq = max(user_outbox.next_seq, seq + 1)
+        return seq
+
+
+def notification_message(notification: Dict) -> Dict:
+    """The WebSocket message for a sequenced notification"""
+    return {"type": "notification", "seq": notification["seq"], "data": notification}
+
+
+# Shared outbox for every user on this worker
+outbox = DatabaseOutbox() if SHARED_SEQUENCES else NotificationOutbox()
@@ -4,109 +4,228 @@ Periodically analyzes user financial data and generates proactive insights
 """
 
 import asyncio
+import heapq
+import itertools
 import random
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import uuid
 import os
 
 from app.agents.personalities import AGENTS
-from app.services.websocket_manager import ConnectionManager
+from app.services.websocket_manager import agent_topic
+from app.services.pubsub import NotificationHub
 from app.services.financial_simulator import get_user_financial_data, simulate_transaction
+from app.services.financial_store import DEFAULT_USER_ID
+from app.services.analytics import analytics_store
+from app.services.insight_rules import InsightGate
+from app.services.insight_dedupe import FingerprintTracker, InsightDeduper
+from app.services.llm_gate import LLMUnavailableError
+
+DEFAULT_AGENT_INTERVALS = {
+    "sofia": 60,    # Sofia checks every minute (credit/budget focused)
+    "marcus": 90,   # Marcus checks every 1.5 minutes (investment focused)
+    "luna": 45      # Luna checks every 45 seconds (behavior focused)
+}
+
+def parse_agent_intervals(value: Optional[str]) -> Dict[str, float]:
+    """Parse per-agent cadences like "sofia=60,marcus=90,luna=45" """
+    intervals = dict(DEFAULT_AGENT_INTERVALS)
+    if not value:
+        return intervals
+    for item in value.split(","):
+        agent_id, _, seconds = item.partition("=")
+        agent_id = agent_id.strip()
+        if agent_id in AGENTS and seconds.strip():
+            intervals[agent_id] = float(seconds)
+    return intervals
 
 class ProactiveAnalyzer:
-    """Analyzes financial data and generates proactive insights"""
+    """Analyzes financial data and generates proactive insights
+
+    Work is kept in a time-ordered heap of (due_time, user, agent) entries.
+    A dispatcher pops entries as they come due and hands them to a bounded
+    pool of workers; each worker reschedules its entry after the analysis
+    finishes, so a slow model call never causes a backlog for that pair.
+    The schedule only exists while the analyzer runs: stop() clears it and
+    start() rebuilds it from every user connected to any worker, so a
+    worker that loses and later regains leadership picks up everyone.
+    Insights are delivered through the NotificationHub only to the sockets
+    of the user they concern, on whichever worker they live.
+    """
     
-    def __init__(self, connection_manager: ConnectionManager):
+    def __init__(self, connection_manager: NotificationHub):
         self.connection_manager = connection_manager
         self.running = False
-        self.analysis_interval = int(os.getenv("ANALYSIS_INTERVAL", 30))
+        self.agent_intervals = parse_agent_intervals(os.getenv("AGENT_INTERVALS"))
+        self.worker_count = int(os.getenv("ANALYZER_WORKERS", 4))
+        self.insight_gate = InsightGate()
+        self.fingerprints = FingerprintTracker()
+        self.deduper = InsightDeduper()
         
-        # Track last analysis time for each agent
-        self.last_agent_analysis = {
-            "sofia": datetime.now() - timedelta(minutes=10),
-            "marcus": datetime.now() - timedelta(minutes=15),
-            "luna": datetime.now() - timedelta(minutes=5)
-        }
+        # Scheduling state
+        self._schedule: List[Tuple[float, int, str, str, int]] = []
+        self._sequence = itertools.count()
+        # user_id -> generation; entries from an earlier add_user are stale
+        self._users: Dict[str, int] = {}
+        self._generations = itertools.count(1)
+        self._wakeup = asyncio.Event()
+        self._jobs: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        
+    def add_user(self, user_id: str):
+        """Start scheduling analyses for a user (no-op if already scheduled or not running)"""
+        if not self.running or user_id in self._users:
+            return
+        generation = next(self._generations)
+        self._users[user_id] = generation
+        
+        # Stagger agents slightly so a new user does not trigger three calls at once
+        now = time.monotonic()
+        for offset, agent_id in enumerate(self.agent_intervals):
+            self._push(now + offset * 2, user_id, agent_id, generation)
+    
+    def remove_user(self, user_id: str):
+        """Stop scheduling analyses for a user; queued entries are dropped lazily"""
+        self._users.pop(user_id, None)
+        self.insight_gate.forget(user_id)
+        self.fingerprints.forget(user_id)
+    
+    def _push(self, due: float, user_id: str, agent_id: str, generation: int):
+        heapq.heappush(self._schedule, (due, next(self._sequence), user_id, agent_id, generation))
+        self._wakeup.set()
+    
+    def _is_current(self, user_id: str, generation: int) -> bool:
+        """Whether an entry belongs to the user's current add_user (not one before a removal)"""
+        return self._users.get(user_id) == generation
         
     async def start(self):
         """Start the proactive analysis loop"""
         self.running = True
-        print(f"🤖 Proactive Analyzer started (interval: {self.analysis_interval}s)")
+        self._jobs = asyncio.Queue(maxsize=self.worker_count * 2)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        for user_id in self.connection_manager.users():
+            self.add_user(user_id)
+        print(f"🤖 Proactive Analyzer started ({self.worker_count} workers, cadences: {self.agent_intervals})")
         
         while self.running:
             try:
-                await self._analyze_and_notify()
-                await asyncio.sleep(self.analysis_interval)
+                await self._dispatch_due()
             except Exception as e:
                 print(f"Error in proactive analysis: {e}")
                 await asyncio.sleep(5)  # Wait before retrying
     
     async def stop(self):
-        """Stop the proactive analysis loop"""
+        """Stop the proactive analysis loop and forget the schedule"""
         self.running = False
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        # Queued and in-flight jobs are dropped with the schedule; start() rebuilds it
+        self._schedule = []
+        self._users = {}
+        self._jobs = None
         print("🛑 Proactive Analyzer stopped")
     
-    async def _analyze_and_notify(self):
-        """Perform analysis and send notifications"""
-        # Get current financial data (mock for now)
-        financial_data = await get_user_financial_data()
+    async def _dispatch_due(self):
+        """Wait for the next entry to come due and hand it to a worker"""
+        if not self._schedule:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+            return
+        
+        due, _, user_id, agent_id, generation = self._schedule[0]
+        delay = due - time.monotonic()
+        if delay > 0:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            return
+        
+        heapq.heappop(self._schedule)
+        if not self._is_current(user_id, generation):
+            return
+        if not self.connection_manager.has_user(user_id):
+            # Nobody is listening; stop analyzing until the user reconnects
+            self.remove_user(user_id)
+            return
         
+        # Blocks when every worker is busy, which is the backpressure we want
+        await self._jobs.put((user_id, agent_id, generation))
+    
+    async def _worker(self):
+        """Run analyses from the job queue"""
+        while True:
+            user_id, agent_id, generation = await self._jobs.get()
+            try:
+                await self._analyze_and_notify(user_id, agent_id)
+            except Exception as e:
+                print(f"Error analyzing {agent_id} for {user_id}: {e}")
+            finally:
+                if self._is_current(user_id, generation):
+                    self._push(time.monotonic() + self.agent_intervals[agent_id], user_id, agent_id, generation)
+    
+    async def _analyze_and_notify(self, user_id: str, agent_id: str):
+        """Perform one agent's analysis for one user and notify them"""
         # Randomly simulate a transaction to create dynamic data
         if random.random() < 0.3:  # 30% chance
-            await simulate_transaction(financial_data)
+            await simulate_transaction(user_id)
         
-        # Determine which agent should analyze (rotate through them)
-        current_time = datetime.now()
+        financial_data = await get_user_financial_data(user_id=user_id)
+        agent = AGENTS[agent_id]
         
-        # Find agent that hasn't analyzed recently
-        for agent_id, last_time in self.last_agent_analysis.items():
-            time_since_last = (current_time - last_time).total_seconds()
-            
-            # Each agent checks at different intervals
-            agent_intervals = {
-                "sofia": 60,    # Sofia checks every minute (credit/budget focused)
-                "marcus": 90,   # Marcus checks every 1.5 minutes (investment focused)
-                "luna": 45      # Luna checks every 45 seconds (behavior focused)
+        # Nothing this agent cares about changed since it last looked
+        if not self.fingerprints.changed(user_id, agent_id, financial_data):
+            return
+        
+        # Only spend a model call when a rule fires or the data moved meaningfully
+        spending = analytics_store.get(user_id, financial_data.transactions)
+        should_analyze, signals = self.insight_gate.check(user_id, agent_id, financial_data, spending.summary())
+        if not should_analyze:
+            self.fingerprints.commit(user_id, agent_id, financial_data)
+            return
+        
+        # Generate insight from aggregates rather than raw transactions; the
+        # gate and fingerprint only move once the model has answered, so a
+        # failed call is retried next time
+        try:
+            insight = await agent.analyze_for_insights(financial_data, signals, spending.prompt_lines(),
+                                                       raise_errors=True)
+        except LLMUnavailableError:
+            return
+        self.fingerprints.commit(user_id, agent_id, financial_data)
+        self.insight_gate.commit(user_id, agent_id, financial_data, signals)
+        
+        if insight and self.deduper.is_duplicate(user_id, insight):
+            print(f"🔁 Suppressed repeat insight from {agent.name} for {user_id}: {insight['title']}")
+            return
+        
+        if insight:
+            # Create notification
+            notification = {
+                "id": str(uuid.uuid4()),
+                "agentId": insight['agent_id'],
+                "type": insight['type'],
+                "title": insight['title'],
+                "message": insight['message'],
+                "timestamp": datetime.now().isoformat(),
+                "isRead": False,
+                "priority": insight['priority'],
+                "actionRequired": insight.get('action_required', False)
             }
             
-            if time_since_last > agent_intervals.get(agent_id, 60):
-                agent = AGENTS[agent_id]
-                
-                # Generate insight
-                insight = await agent.analyze_for_insights(financial_data)
-                
-                if insight:
-                    # Create notification
-                    notification = {
-                        "id": str(uuid.uuid4()),
-                        "agentId": insight['agent_id'],
-                        "type": insight['type'],
-                        "title": insight['title'],
-                        "message": insight['message'],
-                        "timestamp": datetime.now().isoformat(),
-                        "isRead": False,
-                        "priority": insight['priority'],
-                        "actionRequired": insight.get('action_required', False)
-                    }
-                    
-                    # Send to all connected clients
-                    await self.connection_manager.broadcast({
-                        "type": "notification",
-                        "data": notification
-                    })
-                    
-                    print(f"📢 {agent.name} sent insight: {insight['title']}")
-                    
-                # Update last analysis time
-                self.last_agent_analysis[agent_id] = current_time
-                
-                # Only one agent per cycle to avoid overwhelming
-                break
+            # Sequence, persist and send to this user's sockets
+            await self.connection_manager.notify(user_id, notification, topic=agent_topic(insight['agent_id']))
+            
+            print(f"📢 {agent.name} sent insight to {user_id}: {insight['title']}")
     
-    async def trigger_demo_scenarios(self, scenario: str):
+    async def trigger_demo_scenarios(self, scenario: str, user_id: str = DEFAULT_USER_ID):
         """Trigger specific demo scenarios for hackathon presentation"""
-        financial_data = await get_user_financial_data()
+        financial_data = await get_user_financial_data(user_id=user_id)
         
         scenarios = {
             "overspending": {
@@ -191,10 +310,7 @@ class ProactiveAnalyzer:
                     "actionRequired": insight.get('action_required', True)
                 }
                 
-                await self.connection_manager.broadcast({
-                    "type": "notification",
-                    "data": notification
-                })
+                await self.connection_manager.notify(user_id, notification, topic=agent_topic(insight['agent_id']))
                 
                 print(f"🎯 Demo scenario '{scenario}' triggered by {agent.name}")
                 return notification
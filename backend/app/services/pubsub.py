@@ -0,0 +1,386 @@
+"""
+Pub/Sub
+Fans WebSocket events out to every worker process, each delivering to its own sockets
+"""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, insert, select
+
+from app.db import database
+from app.db.database import queue_notification
+from app.db.models import PubSubEvent
+from app.services.outbox import NotificationOutbox, notification_message, outbox as default_outbox
+from app.services.websocket_manager import ConnectionManager
+
+# "memory" for a single process, "sqlite" to share events between uvicorn workers
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_POLL_INTERVAL = float(os.getenv("PUBSUB_POLL_INTERVAL", 0.1))
+PUBSUB_RETENTION = float(os.getenv("PUBSUB_RETENTION", 60))
+# Seconds between each worker's announcement of the users connected to it
+PRESENCE_INTERVAL = float(os.getenv("PRESENCE_INTERVAL", 15))
+
+# Events held at most while they cannot be written (oldest dropped beyond that)
+PUBSUB_OUTBOX_MAX = int(os.getenv("PUBSUB_OUTBOX_MAX", 10000))
+
+# Rows read from the events table per poll
+PUBSUB_READ_BATCH = 500
+
+# Identifies this process in events and leases
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+Handler = Callable[[Dict], Awaitable[None]]
+
+
+class InProcessPubSub:
+    """Single-process backend: events go straight to the local handler"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def publish(self, event: Dict):
+        if self._handler:
+            await self._handler(event)
+
+    async def stop(self):
+        self._handler = None
+
+
+class SQLitePubSub:
+    """Multi-worker backend that tails an append-only table in the app database
+
+    Published events are delivered to local sockets right away and queued
+    for the table; each poll writes the queue in one insert and reads rows
+    other workers added since the last id seen. Rows older than
+    PUBSUB_RETENTION are pruned. SQLite hands out ids in commit order, so
+    tailing by id never skips a row.
+
+    Failed inserts are handled like the database write buffer: transient
+    errors are retried up to DB_FLUSH_RETRIES times in a row, other errors
+    split the batch until the events that cannot be written are found and
+    dropped, and at most PUBSUB_OUTBOX_MAX events wait to be written.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, origin: str = WORKER_ID, poll_interval: float = PUBSUB_POLL_INTERVAL,
+                 retention: float = PUBSUB_RETENTION):
+        self.origin = origin
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.last_id = 0
+        self._handler: Optional[Handler] = None
+        self._outbox: List[Dict] = []
+        self.failures = 0
+        self.dropped = 0
+        self._task: Optional[asyncio.Task] = None
+        self._pruned_at = 0.0
+
+    async def start(self, handler: Handler):
+        if database.SessionLocal is None:
+            raise RuntimeError("SQLite pub/sub needs the database; call init_db() first")
+        self._handler = handler
+        async with database.SessionLocal() as session:
+            # Only events published from now on
+            self.last_id = (await session.execute(select(func.max(PubSubEvent.id)))).scalar() or 0
+        self._task = asyncio.create_task(self._run())
+
+    async def publish(self, event: Dict):
+        self._outbox.append({"origin": self.origin, "payload": event, "created_at": time.time()})
+        self._trim()
+        if self._handler:
+            await self._handler(event)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self._flush()
+        except Exception as e:
+            print(f"Error flushing pub/sub events: {e}")
+        self._handler = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._flush()
+                await self._poll()
+                if time.time() - self._pruned_at > self.retention / 2:
+                    await self._prune()
+            except Exception as e:
+                print(f"Error in pub/sub poll: {e}")
+
+    def _trim(self):
+        excess = len(self._outbox) - PUBSUB_OUTBOX_MAX
+        if excess > 0:
+            self.dropped += excess
+            print(f"⚠️ Pub/sub outbox full, dropping the {excess} oldest events")
+            self._outbox = self._outbox[excess:]
+
+    async def _flush(self):
+        if not self._outbox or database.SessionLocal is None:
+            return
+        rows, self._outbox = self._outbox, []
+        try:
+            await self._insert(rows)
+        except Exception as e:
+            self.failures += 1
+            if database.is_transient_error(e):
+                if self.failures <= database.DB_FLUSH_RETRIES:
+                    # Keep publish order: the failed rows go back ahead of newer ones
+                    self._outbox = rows + self._outbox
+                    self._trim()
+                    raise
+                self.dropped += len(rows)
+                print(f"⚠️ Dropped {len(rows)} pub/sub events after {self.failures} failed flushes: {e}")
+            else:
+                for row, error in await self._insert_isolated(rows):
+                    self.dropped += 1
+                    print(f"⚠️ Dropped unwritable pub/sub event {row['payload'].get('kind')}: {error}")
+        self.failures = 0
+
+    async def _insert_isolated(self, rows: List[Dict]) -> List:
+        """Insert rows in ever smaller halves; returns ``(row, error)`` for the ones that failed alone"""
+        try:
+            await self._insert(rows)
+            return []
+        except Exception as e:
+            if len(rows) == 1:
+                return [(rows[0], e)]
+        middle = len(rows) // 2
+        return await self._insert_isolated(rows[:middle]) + await self._insert_isolated(rows[middle:])
+
+    async def _insert(self, rows: List[Dict]):
+        async with database.SessionLocal() as session:
+            async with session.begin():
+                await session.execute(insert(PubSubEvent), rows)
+
+    async def _poll(self):
+        while True:
+            async with database.SessionLocal() as session:
+                rows = (await session.execute(
+                    select(PubSubEvent.id, PubSubEvent.origin, PubSubEvent.payload)
+                    .where(PubSubEvent.id > self.last_id)
+                    .order_by(PubSubEvent.id)
+                    .limit(PUBSUB_READ_BATCH)
+                )).all()
+            for event_id, origin, payload in rows:
+                self.last_id = event_id
+                if origin != self.origin and self._handler:
+                    await self._handler(payload)
+            if len(rows) < PUBSUB_READ_BATCH:
+                return
+
+    async def _prune(self):
+        self._pruned_at = time.time()
+        async with database.SessionLocal() as session:
+            async with session.begin():
+                await session.execute(
+                    delete(PubSubEvent).where(PubSubEvent.created_at < self._pruned_at - self.retention)
+                )
+
+
+def create_pubsub(backend: str = PUBSUB_BACKEND):
+    if backend == "sqlite":
+        return SQLitePubSub()
+    if backend != "memory":
+        print(f"Unknown PUBSUB_BACKEND '{backend}', using in-process pub/sub")
+    return InProcessPubSub()
+
+
+class NotificationHub:
+    """Sends socket traffic through the pub/sub backend
+
+    Offers the same send methods as ConnectionManager, but every worker
+    receives the event and delivers it to the sockets it holds. It also
+    tracks which users are connected to any worker: workers announce joins,
+    leaves and a periodic snapshot of their users, so the leader's analyzer
+    can schedule and keep users whose sockets live elsewhere.
+
+    Workers also announce the financial records and chats they commit
+    changes to, so the others drop their cached copies (``invalidate``).
+    """
+
+    def __init__(self, manager: ConnectionManager, backend=None, origin: str = WORKER_ID,
+                 outbox: NotificationOutbox = default_outbox):
+        self.manager = manager
+        self.backend = backend or InProcessPubSub()
+        self.origin = origin
+        self.outbox = outbox
+        # user_id -> {worker id: last time that worker reported the user}
+        self._remote_users: Dict[str, Dict[str, float]] = {}
+        self._join_listeners: List[Callable[[str], None]] = []
+        self._invalidate_listeners: List[Callable[[Set[str], Set[Tuple[str, Optional[str]]]], None]] = []
+        self._presence_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.backend.start(self._handle)
+        if self.backend.name != "memory":
+            self._presence_task = asyncio.create_task(self._announce_presence())
+        print(f"📡 Pub/sub started ({self.backend.name}, worker {self.origin})")
+
+    async def stop(self):
+        if self._presence_task:
+            self._presence_task.cancel()
+            self._presence_task = None
+        await self.backend.stop()
+
+    def on_join(self, callback: Callable[[str], None]):
+        """Call ``callback(user_id)`` whenever a user connects to any worker"""
+        self._join_listeners.append(callback)
+
+    def on_invalidate(self, callback: Callable[[Set[str], Set[Tuple[str, Optional[str]]]], None]):
+        """Call ``callback(financial_users, conversations)`` when another worker changes them"""
+        self._invalidate_listeners.append(callback)
+
+    async def invalidate(self, financial: Set[str], conversations: Set[Tuple[str, Optional[str]]]):
+        """Tell other workers their cached records and ``(user, agent or None)`` chats are stale"""
+        if self.backend.name == "memory":
+            # No other workers
+            return
+        await self._publish({
+            "kind": "invalidate",
+            "financial": sorted(financial),
+            "conversations": [list(pair) for pair in conversations],
+        })
+
+    # Sending
+
+    async def send_to_user(self, user_id: str, message: dict, topic: Optional[str] = None):
+        await self._publish({"kind": "user", "user_id": user_id, "topic": topic, "message": message})
+
+    async def publish(self, topic: str, message: dict):
+        await self._publish({"kind": "topic", "topic": topic, "message": message})
+
+    async def broadcast(self, message: dict):
+        await self._publish({"kind": "broadcast", "message": message})
+
+    async def notify(self, user_id: str, notification: Dict, topic: Optional[str] = None):
+        """Sequence, persist and deliver a notification for ``user_id``
+
+        It goes to the user's sockets subscribed to ``topic`` and lands in the
+        user's outbox for replay on reconnect. Notifications for a whole
+        topic go through ``publish`` instead and carry no sequence number,
+        since each recipient has its own sequence.
+        """
+        notification["seq"] = await self.outbox.allocate(user_id)
+        queue_notification(user_id, notification)
+        await self._publish({
+            "kind": "user",
+            "user_id": user_id,
+            "topic": topic,
+            "message": notification_message(notification),
+            "outbox": user_id,
+        })
+
+    # Presence
+
+    async def user_joined(self, user_id: str):
+        await self._publish({"kind": "join", "user_id": user_id})
+
+    async def user_left(self, user_id: str):
+        """Announce that a user has no sockets left on this worker"""
+        if not self.manager.has_user(user_id):
+            await self._publish({"kind": "leave", "user_id": user_id})
+
+    def has_user(self, user_id: str) -> bool:
+        """Whether a user has a socket on this or any other worker"""
+        if self.manager.has_user(user_id):
+            return True
+        cutoff = time.time() - PRESENCE_INTERVAL * 2.5
+        return any(seen >= cutoff for seen in self._remote_users.get(user_id, {}).values())
+
+    def users(self) -> Set[str]:
+        return set(self.manager.user_connections) | {u for u in self._remote_users if self.has_user(u)}
+
+    async def _announce_presence(self):
+        while True:
+            await asyncio.sleep(PRESENCE_INTERVAL)
+            self._expire_presence()
+            try:
+                await self._publish({"kind": "presence", "users": list(self.manager.user_connections)})
+            except Exception as e:
+                print(f"Error announcing presence: {e}")
+
+    # Delivery
+
+    async def _publish(self, event: Dict):
+        event["origin"] = self.origin
+        await self.backend.publish(event)
+
+    async def _handle(self, event: Dict):
+        """Apply an event from any worker (including this one) locally"""
+        kind = event.get("kind")
+        if event.get("outbox"):
+            message = event["message"]
+            await self.outbox.record(event["outbox"], message["seq"], message)
+        if kind == "user":
+            await self.manager.send_to_user(event["user_id"], event["message"], topic=event.get("topic"))
+        elif kind == "topic":
+            await self.manager.publish(event["topic"], event["message"])
+        elif kind == "broadcast":
+            await self.manager.broadcast(event["message"])
+        elif kind in ("join", "leave", "presence"):
+            self._apply_presence(event)
+        elif kind == "invalidate" and event.get("origin") != self.origin:
+            financial = set(event["financial"])
+            conversations = {tuple(pair) for pair in event["conversations"]}
+            for callback in self._invalidate_listeners:
+                callback(financial, conversations)
+
+    def _apply_presence(self, event: Dict):
+        origin, kind = event.get("origin"), event["kind"]
+        now = time.time()
+        remote = origin != self.origin
+
+        if kind == "presence":
+            listed = set(event.get("users") or ())
+            if remote:
+                for user_id in [u for u, seen in self._remote_users.items() if origin in seen and u not in listed]:
+                    self._forget(user_id, origin)
+                for user_id in listed:
+                    self._remote_users.setdefault(user_id, {})[origin] = now
+            joined = listed
+        elif kind == "join":
+            if remote:
+                self._remote_users.setdefault(event["user_id"], {})[origin] = now
+            joined = (event["user_id"],)
+        else:
+            if remote:
+                self._forget(event["user_id"], origin)
+            joined = ()
+
+        for user_id in joined:
+            for callback in self._join_listeners:
+                callback(user_id)
+
+    def _expire_presence(self):
+        """Drop reports from workers that stopped announcing (crashed or shut down)"""
+        cutoff = time.time() - PRESENCE_INTERVAL * 2.5
+        for user_id in list(self._remote_users):
+            for origin, seen in list(self._remote_users[user_id].items()):
+                if seen < cutoff:
+                    self._forget(user_id, origin)
+
+    def _forget(self, user_id: str, origin: str):
+        seen = self._remote_users.get(user_id)
+        if seen is not None:
+            seen.pop(origin, None)
+            if not seen:
+                del self._remote_users[user_id]
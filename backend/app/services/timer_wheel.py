@@ -0,0 +1,61 @@
+"""
+Timer Wheel
+Hashed timing wheel for large numbers of cheap, frequently reset timeouts
+"""
+
+import math
+import time
+from typing import Dict, Hashable, List, Optional
+
+
+class TimerWheel:
+    """Timers bucketed by expiry tick in a fixed ring of slots
+
+    ``schedule`` and ``cancel`` are O(1) dict operations, and ``advance``
+    only visits the slots for ticks that have passed, so keeping a timer per
+    WebSocket costs nothing per connection until it actually fires. Delays
+    longer than one turn of the wheel simply stay in their slot until their
+    tick comes round.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 64):
+        self.tick = tick
+        self.slots = slots
+        self._buckets: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[Hashable, int] = {}
+        self._origin = time.monotonic()
+        self._current = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slot_of
+
+    def schedule(self, key: Hashable, delay: float):
+        """Fire ``key`` after ``delay`` seconds, replacing any timer it already has"""
+        self.cancel(key)
+        deadline = self._current + max(1, math.ceil(delay / self.tick))
+        slot = deadline % self.slots
+        self._buckets[slot][key] = deadline
+        self._slot_of[key] = slot
+
+    def cancel(self, key: Hashable):
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._buckets[slot].pop(key, None)
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        """Move the wheel up to ``now`` and return the keys that expired"""
+        now = time.monotonic() if now is None else now
+        target = int((now - self._origin) / self.tick)
+        expired = []
+        # After a long stall every slot is visited once, not once per missed tick
+        for step in range(1, min(target - self._current, self.slots) + 1):
+            bucket = self._buckets[(self._current + step) % self.slots]
+            for key in [k for k, deadline in bucket.items() if deadline <= target]:
+                del bucket[key]
+                del self._slot_of[key]
+                expired.append(key)
+        self._current = max(self._current, target)
+        return expired
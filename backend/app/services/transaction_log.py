@@ -0,0 +1,282 @@
+"""
+Transaction Log
+Append-only per-user transaction history: a small ring buffer of recent
+transactions in front of a compact columnar archive
+"""
+
+import os
+from array import array
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+TXN_RECENT_CAPACITY = int(os.getenv("TXN_RECENT_CAPACITY", 20))
+ID_PREFIX = "txn_"
+# Field order of history rows, as saved in the transactions table
+ROW_FIELDS = ("id", "merchant", "amount", "category", "timestamp", "version")
+
+
+class _Interner:
+    """Maps repeated strings (categories, merchants) to small integer codes"""
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._values: List[str] = []
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self._values)
+            self._codes[value] = code
+            self._values.append(value)
+        return code
+
+    def value(self, code: int) -> str:
+        return self._values[code]
+
+
+# Shared by every log; the vocabulary is tiny compared to the number of rows
+categories = _Interner()
+merchants = _Interner()
+
+
+def _to_timestamp(date) -> float:
+    if isinstance(date, datetime):
+        return date.timestamp()
+    if isinstance(date, str) and date:
+        return datetime.fromisoformat(date).timestamp()
+    return datetime.now().timestamp()
+
+
+def _id_number(txn_id: str) -> Optional[int]:
+    """n for ids of the form txn_<n>, None for anything else"""
+    number = txn_id[len(ID_PREFIX):]
+    return int(number) if txn_id.startswith(ID_PREFIX) and number.isdigit() else None
+
+
+def _extend(column: array, values):
+    if hasattr(values, "tobytes"):
+        if getattr(values, "itemsize", column.itemsize) != column.itemsize:
+            raise ValueError(f"expected {column.itemsize}-byte items for '{column.typecode}' column")
+        column.frombytes(values.tobytes())
+    else:
+        column.extend(values)
+
+
+class TransactionLog:
+    """Append-only transaction history for one user
+
+    The newest ``recent_capacity`` transactions stay as dicts in a ring
+    buffer, which is what dashboards and prompts read. Older ones are moved
+    into parallel typed arrays (amount, timestamp, category code, merchant
+    code, version), so appends are O(1) and long histories cost a few dozen
+    bytes per row instead of a dict each.
+
+    Rows are addressed by sequence number (0 = oldest). Timestamps are
+    expected to arrive in order, which lets date-range queries bisect; if an
+    out-of-order row is ever appended, range queries fall back to a scan.
+    """
+
+    def __init__(self, transactions: Iterable[Dict] = (), recent_capacity: int = TXN_RECENT_CAPACITY):
+        self.recent: deque = deque(maxlen=recent_capacity)
+        self.recent_timestamps: deque = deque(maxlen=recent_capacity)
+        self.amounts = array("d")
+        self.timestamps = array("d")
+        self.category_codes = array("H")
+        self.merchant_codes = array("I")
+        self.versions = array("q")
+        # Ids of the form txn_<n> are stored as n; anything else goes in _named_ids
+        self.id_numbers = array("Q")
+        self._named_ids: Dict[int, str] = {}
+        self._ordered = True
+        self._newest_first: Optional[List[Dict]] = None
+        for transaction in transactions:
+            self.append(transaction)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple], recent_capacity: int = TXN_RECENT_CAPACITY) -> "TransactionLog":
+        """Rebuild a log from history rows (``ROW_FIELDS`` tuples, oldest first)
+
+        Everything but the newest ``recent_capacity`` rows goes straight into
+        the columnar archive, without building a dict per row.
+        """
+        log = cls(recent_capacity=recent_capacity)
+        split = max(len(rows) - recent_capacity, 0)
+        if split:
+            ids, merchant_names, amounts, category_names, timestamps, versions = zip(*rows[:split])
+            id_numbers = []
+            for seq, txn_id in enumerate(ids):
+                number = _id_number(txn_id)
+                if number is None:
+                    log._named_ids[seq] = txn_id
+                id_numbers.append(number or 0)
+            log.extend_columns(
+                amounts,
+                timestamps,
+                [categories.code(category) for category in category_names],
+                [merchants.code(merchant) for merchant in merchant_names],
+                versions,
+                id_numbers,
+            )
+            log._ordered = all(earlier <= later for earlier, later in zip(timestamps, timestamps[1:]))
+        for txn_id, merchant, amount, category, timestamp, version in rows[split:]:
+            log.append({
+                "id": txn_id,
+                "merchant": merchant,
+                "amount": amount,
+                "category": category,
+                "date": datetime.fromtimestamp(timestamp).isoformat(),
+                "version": version,
+            })
+        return log
+
+    def __len__(self) -> int:
+        return len(self.amounts) + len(self.recent)
+
+    # Writes
+
+    def append(self, transaction: Dict):
+        """Add a transaction (newer than everything already logged)"""
+        timestamp = _to_timestamp(transaction.get("date"))
+        if len(self) and timestamp < self._timestamp(len(self) - 1):
+            self._ordered = False
+        if len(self.recent) == self.recent.maxlen:
+            self._archive(self.recent[0], self.recent_timestamps[0])
+        self.recent.append(transaction)
+        self.recent_timestamps.append(timestamp)
+        self._newest_first = None
+
+    def extend_columns(self, amounts, timestamps, category_codes, merchant_codes, versions, id_numbers):
+        """Bulk-append archived rows given as columns (oldest first)
+
+        Columns may be lists, or arrays / NumPy arrays whose item size matches
+        the column (copied as raw bytes). Ids are the numbers of txn_<n> ids.
+
+        Only valid while the ring buffer is empty, i.e. when seeding history
+        before any recent transactions exist.
+        """
+        if self.recent:
+            raise ValueError("extend_columns requires an empty recent buffer")
+        if len(self.timestamps) and len(timestamps) and timestamps[0] < self.timestamps[-1]:
+            self._ordered = False
+        _extend(self.amounts, amounts)
+        _extend(self.timestamps, timestamps)
+        _extend(self.category_codes, category_codes)
+        _extend(self.merchant_codes, merchant_codes)
+        _extend(self.versions, versions)
+        _extend(self.id_numbers, id_numbers)
+
+    def _archive(self, transaction: Dict, timestamp: float):
+        self.amounts.append(float(transaction.get("amount", 0)))
+        self.timestamps.append(timestamp)
+        self.category_codes.append(categories.code(transaction.get("category", "")))
+        self.merchant_codes.append(merchants.code(transaction.get("merchant", "")))
+        self.versions.append(int(transaction.get("version", 0)))
+        txn_id = str(transaction.get("id", ""))
+        number = _id_number(txn_id)
+        if number is None:
+            self._named_ids[len(self.id_numbers)] = txn_id
+        self.id_numbers.append(number or 0)
+
+    # Reads
+
+    def recent_transactions(self) -> List[Dict]:
+        """Recent transactions, newest first (cached until the next append)"""
+        if self._newest_first is None:
+            self._newest_first = list(reversed(self.recent))
+        return self._newest_first
+
+    def rows(self) -> Iterator[Tuple]:
+        """Every transaction as a ``ROW_FIELDS`` tuple, oldest first"""
+        columns = zip(self.id_numbers, self.merchant_codes, self.amounts, self.category_codes,
+                      self.timestamps, self.versions)
+        for seq, (number, merchant, amount, category, timestamp, version) in enumerate(columns):
+            txn_id = self._named_ids.get(seq) or f"{ID_PREFIX}{number}"
+            yield txn_id, merchants.value(merchant), amount, categories.value(category), timestamp, version
+        for transaction, timestamp in zip(self.recent, self.recent_timestamps):
+            yield (
+                str(transaction.get("id", "")),
+                transaction.get("merchant", ""),
+                float(transaction.get("amount", 0)),
+                transaction.get("category", ""),
+                timestamp,
+                int(transaction.get("version", 0)),
+            )
+
+    def _timestamp(self, seq: int) -> float:
+        archived = len(self.amounts)
+        return self.timestamps[seq] if seq < archived else self.recent_timestamps[seq - archived]
+
+    def _version(self, seq: int) -> int:
+        archived = len(self.amounts)
+        return self.versions[seq] if seq < archived else self.recent[seq - archived].get("version", 0)
+
+    def row(self, seq: int) -> Dict:
+        """Transaction at sequence number ``seq`` as a dict"""
+        archived = len(self.amounts)
+        if seq >= archived:
+            return self.recent[seq - archived]
+        return {
+            "id": self._named_ids.get(seq) or f"{ID_PREFIX}{self.id_numbers[seq]}",
+            "merchant": merchants.value(self.merchant_codes[seq]),
+            "amount": self.amounts[seq],
+            "category": categories.value(self.category_codes[seq]),
+            "date": datetime.fromtimestamp(self.timestamps[seq]).isoformat(),
+            "version": self.versions[seq],
+        }
+
+    def _bisect(self, timestamp: float, right: bool) -> int:
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._timestamp(mid)
+            if value < timestamp or (right and value == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def since(self, version: int) -> List[Dict]:
+        """Transactions added after ``version``, newest first"""
+        rows = []
+        for seq in range(len(self) - 1, -1, -1):
+            if self._version(seq) <= version:
+                break
+            rows.append(self.row(seq))
+        return rows
+
+    def page(self, cursor: Optional[int] = None, limit: int = 50,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict:
+        """Newest-first page of transactions older than ``cursor``, optionally within [start, end]
+
+        ``next_cursor`` is passed back to fetch the following page, and is
+        None once history is exhausted.
+        """
+        upper = len(self) if cursor is None else max(0, min(cursor, len(self)))
+        lower = 0
+        start_ts = start.timestamp() if start else None
+        end_ts = end.timestamp() if end else None
+
+        if self._ordered:
+            if end_ts is not None:
+                upper = min(upper, self._bisect(end_ts, right=True))
+            if start_ts is not None:
+                lower = self._bisect(start_ts, right=False)
+            seqs: Iterator[int] = iter(range(upper - 1, lower - 1, -1))
+        else:
+            seqs = (
+                seq for seq in range(upper - 1, -1, -1)
+                if (start_ts is None or self._timestamp(seq) >= start_ts)
+                and (end_ts is None or self._timestamp(seq) <= end_ts)
+            )
+
+        rows, last = [], None
+        for seq in seqs:
+            if len(rows) == limit:
+                break
+            rows.append(self.row(seq))
+            last = seq
+        else:
+            last = None  # nothing left in range
+
+        return {"transactions": rows, "next_cursor": last, "total": len(self)}
@@ -1,58 +1,399 @@
 """
 WebSocket Connection Manager
-Manages WebSocket connections and broadcasts messages to clients
+Manages WebSocket connections and routes messages to users and topic subscribers
 """
 
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Set, Union
 from fastapi import WebSocket
+import asyncio
+import itertools
 import json
+import os
+import time
+
+from app.services.financial_store import DEFAULT_USER_ID
+from app.services.timer_wheel import TimerWheel
+
+# Outbound queue depth per socket and how to treat consumers that fall behind
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", 64))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", 5))
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")  # or "disconnect"
+# Server ping after this many silent seconds; sockets silent for WS_IDLE_TIMEOUT are closed
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", 30))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 75))
+# Connection caps (a user's oldest socket is closed to make room for a new one;
+# the shared anonymous DEFAULT_USER_ID is only subject to the global cap)
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", 10000))
+WS_MAX_PER_USER = int(os.getenv("WS_MAX_PER_USER", 10))
+# Chat replies a single socket may have streaming at once
+WS_MAX_CHATS_PER_CONNECTION = int(os.getenv("WS_MAX_CHATS_PER_CONNECTION", 2))
+# Seconds to let queued frames go out on shutdown before closing sockets
+WS_DRAIN_TIMEOUT = float(os.getenv("WS_DRAIN_TIMEOUT", 5))
+# Sockets opened with ?batch=1 get frames queued within this window as one "batch" frame
+WS_BATCH_WINDOW = float(os.getenv("WS_BATCH_WINDOW_MS", 50)) / 1000
+WS_BATCH_MAX_MESSAGES = int(os.getenv("WS_BATCH_MAX_MESSAGES", 100))
+
+# Close codes
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_TRY_AGAIN_LATER = 1013
+# Application code: replaced by a newer socket of the same user, do not reconnect
+CLOSE_REPLACED = 4000
+
+
+# Topics every new connection starts out subscribed to
+AGENT_TOPICS = ("agent:sofia", "agent:marcus", "agent:luna")
+ANNOUNCEMENTS_TOPIC = "announcements"
+DEFAULT_TOPICS = AGENT_TOPICS + (ANNOUNCEMENTS_TOPIC,)
+
+
+def agent_topic(agent_id: str) -> str:
+    return f"agent:{agent_id}"
+
+
+def encode_message(message: dict) -> str:
+    """Serialize a message once so it can be fanned out as a raw text frame"""
+    return json.dumps(message, separators=(",", ":"), default=str)
+
+
+def encode_batch(frames: List[str]) -> str:
+    """Wrap already-encoded frames in one batch frame without re-serializing them"""
+    return '{"type":"batch","messages":[' + ",".join(frames) + "]}"
+
+
+def offers_deflate(websocket: WebSocket) -> bool:
+    """Whether the client offered permessage-deflate (uvicorn negotiates it when enabled)"""
+    return "permessage-deflate" in websocket.headers.get("sec-websocket-extensions", "").lower()
+
+
+PING_FRAME = encode_message({"type": "ping"})
+
+
+class ClientConnection:
+    """A single socket with its own bounded outbound queue and sender task
+
+    Several connections may share a client_id or user_id (tabs, devices);
+    each one is identified by its own ``conn_id``.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket: WebSocket, client_id: str, user_id: str = DEFAULT_USER_ID,
+                 queue_size: int = WS_QUEUE_SIZE, topics: Iterable[str] = DEFAULT_TOPICS,
+                 batch: bool = False):
+        self.conn_id = next(self._ids)
+        self.websocket = websocket
+        self.client_id = client_id
+        self.batch = batch
+        self.user_id = user_id
+        self.topics: Set[str] = set(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.closed = False
+        self.connected_at = self.last_seen = time.monotonic()
+        self.sender_task: Optional[asyncio.Task] = None
+        self.close_task: Optional[asyncio.Task] = None
+        # Work started on behalf of this socket (streamed chats), cancelled when it closes
+        self.tasks: Set[asyncio.Task] = set()
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Run ``coro`` for this socket, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def enqueue(self, frame: str) -> bool:
+        """Queue a pre-serialized frame without waiting
+
+        Returns False when the consumer is too slow and should be disconnected.
+        """
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            if WS_SLOW_CONSUMER_POLICY == "disconnect":
+                return False
+            # Drop the oldest frame to make room for the newest one
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(frame)
+            return True
+
+    def __repr__(self) -> str:
+        return f"<ClientConnection {self.conn_id} client={self.client_id} user={self.user_id}>"
+
+
+def _index_add(index: Dict[str, Set[ClientConnection]], key: str, connection: ClientConnection):
+    index.setdefault(key, set()).add(connection)
+
+
+def _index_remove(index: Dict[str, Set[ClientConnection]], key: str, connection: ClientConnection):
+    members = index.get(key)
+    if members is not None:
+        members.discard(connection)
+        if not members:
+            del index[key]
+
 
 class ConnectionManager:
-    """Manages WebSocket connections"""
-    
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
-    
-    async def connect(self, websocket: WebSocket, client_id: str):
-        """Accept and store a new WebSocket connection"""
+    """Manages WebSocket connections
+
+    Connections are indexed by client id, by user and by subscribed topic,
+    so a message costs work proportional to its audience rather than to the
+    number of open sockets.
+
+    Each connection also has a timer in a shared TimerWheel. When it fires,
+    a socket that has been silent for WS_HEARTBEAT_INTERVAL gets a ping, and
+    one silent for WS_IDLE_TIMEOUT is closed and dropped from every index,
+    so dead peers stop receiving frames without waiting for a send to fail.
+    """
+
+    def __init__(self, max_connections: int = WS_MAX_CONNECTIONS, max_per_user: int = WS_MAX_PER_USER):
+        self.connections: Set[ClientConnection] = set()
+        self.client_connections: Dict[str, Set[ClientConnection]] = {}
+        self.user_connections: Dict[str, Set[ClientConnection]] = {}
+        self.topic_subscribers: Dict[str, Set[ClientConnection]] = {}
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.wheel = TimerWheel(tick=1.0)
+        self.draining = False
+        self.rejected = 0
+        self.reaped = 0
+        self.deflate_offered = 0
+        # Wire traffic: frames written, messages inside them, JSON characters
+        self.frames_sent = 0
+        self.messages_sent = 0
+        self.chars_sent = 0
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def connect(self, websocket: WebSocket, client_id: str, user_id: str = DEFAULT_USER_ID,
+                      batch: bool = False) -> Optional[ClientConnection]:
+        """Accept and register a new WebSocket connection
+
+        Returns None (after refusing the handshake) while draining or when
+        the server is at WS_MAX_CONNECTIONS. With ``batch``, frames queued
+        within WS_BATCH_WINDOW are coalesced into one "batch" frame.
+        """
+        if self.draining or len(self.connections) >= self.max_connections:
+            self.rejected += 1
+            print(f"🚫 Refused connection from {client_id} ({len(self.connections)} open)")
+            await websocket.close(code=CLOSE_GOING_AWAY if self.draining else CLOSE_TRY_AGAIN_LATER)
+            return None
+
+        # Make room by closing the user's oldest socket (usually a stale tab). Every
+        # anonymous client shares DEFAULT_USER_ID, so capping it would make tabs evict each other
+        existing = self.user_connections.get(user_id, ())
+        if user_id != DEFAULT_USER_ID and len(existing) >= self.max_per_user:
+            self.disconnect(min(existing, key=lambda c: c.conn_id), code=CLOSE_REPLACED)
+
         await websocket.accept()
-        self.active_connections[client_id] = websocket
+
+        connection = ClientConnection(websocket, client_id, user_id, batch=batch)
+        if offers_deflate(websocket):
+            self.deflate_offered += 1
+        connection.sender_task = asyncio.create_task(self._sender(connection))
+        self.connections.add(connection)
+        _index_add(self.client_connections, client_id, connection)
+        _index_add(self.user_connections, user_id, connection)
+        for topic in connection.topics:
+            _index_add(self.topic_subscribers, topic, connection)
+        self.wheel.schedule(connection, WS_HEARTBEAT_INTERVAL)
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._run_reaper())
         print(f"✅ Client {client_id} connected")
-        
+
         # Send welcome message
-        await self.send_personal_message({
+        self.send_to_connection(connection, {
             "type": "connection",
             "message": "Connected to FinancePal Backend",
-            "agents": ["sofia", "marcus", "luna"]
-        }, client_id)
-    
-    def disconnect(self, client_id: str):
-        """Remove a WebSocket connection"""
-        if client_id in self.active_connections:
-            del self.active_connections[client_id]
-            print(f"❌ Client {client_id} disconnected")
-    
+            "agents": ["sofia", "marcus", "luna"],
+            "topics": sorted(connection.topics)
+        })
+        return connection
+
+    def disconnect(self, target: Union[ClientConnection, str], code: int = CLOSE_NORMAL):
+        """Remove one connection, or every connection with a given client_id"""
+        if isinstance(target, str):
+            for connection in list(self.client_connections.get(target, ())):
+                self.disconnect(connection, code)
+            return
+
+        connection = target
+        if connection not in self.connections:
+            return
+        self.connections.discard(connection)
+        _index_remove(self.client_connections, connection.client_id, connection)
+        _index_remove(self.user_connections, connection.user_id, connection)
+        for topic in connection.topics:
+            _index_remove(self.topic_subscribers, topic, connection)
+        self.wheel.cancel(connection)
+        self._close(connection, code)
+        print(f"❌ Client {connection.client_id} disconnected")
+
+    def touch(self, connection: ClientConnection):
+        """Record that a client sent something (any message counts as a heartbeat)"""
+        connection.last_seen = time.monotonic()
+
+    async def drain(self, timeout: float = WS_DRAIN_TIMEOUT):
+        """Refuse new sockets, give queued frames a chance to go out, then close with 1001"""
+        self.draining = True
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(not c.queue.empty() for c in self.connections):
+            await asyncio.sleep(0.05)
+
+        connections = list(self.connections)
+        for connection in connections:
+            self.disconnect(connection, code=CLOSE_GOING_AWAY)
+        if connections:
+            await asyncio.gather(*(c.close_task for c in connections if c.close_task), return_exceptions=True)
+            print(f"👋 Drained {len(connections)} WebSocket connections")
+
+    def stats(self) -> Dict:
+        return {
+            "connections": len(self.connections),
+            "users": len(self.user_connections),
+            "topics": {topic: len(subscribers) for topic, subscribers in self.topic_subscribers.items()},
+            "rejected": self.rejected,
+            "reaped": self.reaped,
+            "deflate_offered": self.deflate_offered,
+            "frames_sent": self.frames_sent,
+            "messages_sent": self.messages_sent,
+            "chars_sent": self.chars_sent,
+            "draining": self.draining,
+        }
+
+    def subscribe(self, connection: ClientConnection, topics: Iterable[str]):
+        for topic in topics:
+            if connection in self.connections and topic not in connection.topics:
+                connection.topics.add(topic)
+                _index_add(self.topic_subscribers, topic, connection)
+
+    def unsubscribe(self, connection: ClientConnection, topics: Iterable[str]):
+        for topic in topics:
+            if topic in connection.topics:
+                connection.topics.discard(topic)
+                _index_remove(self.topic_subscribers, topic, connection)
+
+    def send_to_connection(self, connection: ClientConnection, message: dict):
+        """Send a message to one specific socket"""
+        self._deliver((connection,), encode_message(message))
+
     async def send_personal_message(self, message: dict, client_id: str):
-        """Send a message to a specific client"""
-        if client_id in self.active_connections:
-            websocket = self.active_connections[client_id]
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                print(f"Error sending to {client_id}: {e}")
-                self.disconnect(client_id)
-    
+        """Send a message to every socket opened with ``client_id``"""
+        connections = self.client_connections.get(client_id)
+        if connections:
+            self._deliver(connections, encode_message(message))
+
+    def has_user(self, user_id: str) -> bool:
+        """Whether a user has at least one open socket"""
+        return bool(self.user_connections.get(user_id))
+
+    async def send_to_user(self, user_id: str, message: dict, topic: Optional[str] = None):
+        """Send a message to a user's sockets (only those subscribed to ``topic``, if given)"""
+        connections = self.user_connections.get(user_id)
+        if not connections:
+            return
+        if topic is not None:
+            connections = [c for c in connections if topic in c.topics]
+        self._deliver(connections, encode_message(message))
+
+    async def publish(self, topic: str, message: dict):
+        """Send a message to every subscriber of ``topic``"""
+        subscribers = self.topic_subscribers.get(topic)
+        if subscribers:
+            self._deliver(subscribers, encode_message(message))
+
     async def broadcast(self, message: dict):
-        """Broadcast a message to all connected clients"""
-        disconnected_clients = []
-        
-        for client_id, websocket in self.active_connections.items():
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                print(f"Error broadcasting to {client_id}: {e}")
-                disconnected_clients.append(client_id)
-        
-        # Clean up disconnected clients
-        for client_id in disconnected_clients:
-            self.disconnect(client_id)
\ No newline at end of file
+        """Broadcast a message to all connected clients
+
+        The message is serialized once and handed to every connection's
+        outbound queue; per-connection sender tasks write to the sockets
+        concurrently, so a slow client never delays the others.
+        """
+        self._deliver(self.connections, encode_message(message))
+
+    def _deliver(self, connections: Iterable[ClientConnection], frame: str):
+        """Enqueue a frame on each connection, dropping the ones that cannot keep up"""
+        slow = [connection for connection in connections if not connection.enqueue(frame)]
+        for connection in slow:
+            print(f"Client {connection.client_id} is too slow, disconnecting")
+            self.disconnect(connection, code=CLOSE_TRY_AGAIN_LATER)
+
+    async def _sender(self, connection: ClientConnection):
+        """Drain a connection's queue onto its socket"""
+        try:
+            while True:
+                frame = await connection.queue.get()
+                count = 1
+                if connection.batch:
+                    frame, count = await self._coalesce(connection, frame)
+                await asyncio.wait_for(connection.websocket.send_text(frame), timeout=WS_SEND_TIMEOUT)
+                self.frames_sent += 1
+                self.messages_sent += count
+                self.chars_sent += len(frame)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending to {connection.client_id}: {e!r}")
+            self.disconnect(connection)
+
+    @staticmethod
+    async def _coalesce(connection: ClientConnection, first: str):
+        """Collect what else arrives within the batch window; a lone frame goes out as is"""
+        await asyncio.sleep(WS_BATCH_WINDOW)
+        frames = [first]
+        while len(frames) < WS_BATCH_MAX_MESSAGES and not connection.queue.empty():
+            frames.append(connection.queue.get_nowait())
+        if len(frames) == 1:
+            return first, 1
+        return encode_batch(frames), len(frames)
+
+    async def _run_reaper(self):
+        """Advance the timer wheel once a second and check the sockets whose timers fired"""
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            for connection in self.wheel.advance():
+                if connection in self.connections:
+                    self._check_liveness(connection)
+
+    def _check_liveness(self, connection: ClientConnection):
+        idle = time.monotonic() - connection.last_seen
+        if idle >= WS_IDLE_TIMEOUT:
+            self.reaped += 1
+            print(f"💤 Client {connection.client_id} idle for {idle:.0f}s, closing")
+            self.disconnect(connection, code=CLOSE_GOING_AWAY)
+            return
+        if idle >= WS_HEARTBEAT_INTERVAL:
+            # A dead peer fails (or times out) on this send and gets dropped by its sender
+            self._deliver((connection,), PING_FRAME)
+            self.wheel.schedule(connection, min(WS_HEARTBEAT_INTERVAL, WS_IDLE_TIMEOUT - idle))
+        else:
+            self.wheel.schedule(connection, WS_HEARTBEAT_INTERVAL - idle)
+
+    def _close(self, connection: ClientConnection, code: int = CLOSE_NORMAL):
+        """Stop a connection's sender and close its socket in the background"""
+        connection.closed = True
+        current = asyncio.current_task()
+        if connection.sender_task and connection.sender_task is not current:
+            connection.sender_task.cancel()
+        for task in list(connection.tasks):
+            if task is not current:
+                task.cancel()
+        connection.close_task = asyncio.create_task(self._close_socket(connection.websocket, code))
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
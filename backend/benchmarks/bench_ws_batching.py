@@ -0,0 +1,94 @@
+"""
+WebSocket Batching Benchmark
+Frames and bytes on the wire for a notification burst, per frame vs batched,
+with and without permessage-deflate
+
+Run from backend/:  python -m benchmarks.bench_ws_batching
+"""
+
+import asyncio
+import uuid
+import zlib
+from datetime import datetime
+
+from app.services.websocket_manager import ConnectionManager
+
+SOCKETS = 200
+# The four demo scenarios plus three agents firing in the same second
+BURST = [
+    ("luna", "alert", "Overspending Alert!", "You've exceeded your monthly budget by 20%. I noticed several large shopping purchases."),
+    ("marcus", "proactive", "Investment Opportunity", "You have $13,000 in savings earning minimal interest."),
+    ("sofia", "alert", "Credit Score Improvement", "Your credit utilization is high at 45%. Paying down $500 could boost your score."),
+    ("luna", "achievement", "Goal Achieved! 🎉", "Congratulations! You've completed your Emergency Fund goal of $5,000."),
+    ("sofia", "proactive", "Budget check-in", "Dining is running ahead of your usual pace this week."),
+    ("marcus", "proactive", "Rebalancing reminder", "Your portfolio drifted 6% from its target allocation."),
+    ("luna", "proactive", "Weekend spending", "Weekend purchases are up 40% compared to last month."),
+]
+
+
+def frame_header(length: int) -> int:
+    """Size of an unmasked server-to-client frame header (RFC 6455 5.2)"""
+    return 2 if length < 126 else 4 if length < 65536 else 10
+
+
+class WireSocket:
+    """Counts frames and bytes, compressing like permessage-deflate with context takeover"""
+
+    def __init__(self):
+        self.frames = 0
+        self.raw_bytes = 0
+        self.deflated_bytes = 0
+        self._compressor = zlib.compressobj(wbits=-15)
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        data = text.encode("utf-8")
+        deflated = len(self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+        self.frames += 1
+        self.raw_bytes += frame_header(len(data)) + len(data)
+        self.deflated_bytes += frame_header(deflated) + deflated
+
+    async def close(self, code: int = 1000):
+        pass
+
+    @property
+    def headers(self):
+        return {"sec-websocket-extensions": "permessage-deflate"}
+
+
+async def run(batch: bool):
+    manager = ConnectionManager(max_connections=SOCKETS, max_per_user=SOCKETS)
+    sockets = [WireSocket() for _ in range(SOCKETS)]
+    for i, socket in enumerate(sockets):
+        await manager.connect(socket, f"client-{i}", "demo_user", batch=batch)
+    await asyncio.sleep(0.2)
+    for socket in sockets:
+        socket.frames = socket.raw_bytes = socket.deflated_bytes = 0
+
+    for agent_id, kind, title, message in BURST:
+        await manager.send_to_user("demo_user", {"type": "notification", "data": {
+            "id": str(uuid.uuid4()), "agentId": agent_id, "type": kind, "title": title, "message": message,
+            "timestamp": datetime.now().isoformat(), "isRead": False, "priority": "medium", "actionRequired": True,
+        }})
+    await asyncio.sleep(0.2)
+    await manager.drain(timeout=1)
+
+    return (
+        sum(s.frames for s in sockets),
+        sum(s.raw_bytes for s in sockets),
+        sum(s.deflated_bytes for s in sockets),
+    )
+
+
+def main():
+    print(f"{len(BURST)} notifications x {SOCKETS} sockets")
+    print(f"{'mode':<12}{'frames':>10}{'bytes':>12}{'deflated':>12}")
+    for label, batch in (("per frame", False), ("batched", True)):
+        frames, raw, deflated = asyncio.run(run(batch))
+        print(f"{label:<12}{frames:>10,}{raw:>12,}{deflated:>12,}")
+
+
+if __name__ == "__main__":
+    main()
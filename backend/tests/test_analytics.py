@@ -0,0 +1,69 @@
+"""
+Spending Analytics tests
+Incrementally maintained windows must match a full rebuild
+"""
+
+import random
+from datetime import datetime
+
+import pytest
+
+from app.services import analytics
+from app.services.analytics import SECONDS_PER_DAY, SpendingAnalytics
+from app.services.transaction_log import TransactionLog
+
+TODAY = 20000
+CATEGORIES = ("Food", "Shopping", "Transport", "Entertainment")
+
+
+@pytest.fixture
+def today(monkeypatch):
+    clock = {"day": TODAY}
+    monkeypatch.setattr(analytics, "_today", lambda: clock["day"])
+    return clock
+
+
+def make_transactions(first_day: int, last_day: int, count: int = 300, seed: int = 7):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        timestamp = rng.randint(first_day, last_day) * SECONDS_PER_DAY + rng.randint(0, SECONDS_PER_DAY - 1)
+        amount = float(rng.choice([-1, -1, -1, 1]) * rng.randint(1, 200))
+        rows.append((timestamp, amount, rng.choice(CATEGORIES)))
+    rows.sort()
+    return [
+        {"id": f"txn_{i}", "merchant": "Shop", "amount": amount, "category": category,
+         "date": datetime.fromtimestamp(timestamp).isoformat()}
+        for i, (timestamp, amount, category) in enumerate(rows)
+    ]
+
+
+def test_incremental_adds_match_a_rebuild(today):
+    log = TransactionLog()
+    incremental = SpendingAnalytics(log)
+    for transaction in make_transactions(TODAY - 120, TODAY):
+        log.append(transaction)
+        incremental.add(transaction)
+
+    rebuilt = SpendingAnalytics(log)
+    assert incremental.summary() == rebuilt.summary()
+    assert incremental.summary()["windows"]["90d"]["spend"] > incremental.summary()["windows"]["7d"]["spend"] > 0
+
+
+@pytest.mark.parametrize("days", [1, 10, 45, 89, 90, 200])
+def test_sliding_forward_matches_a_rebuild(today, days):
+    log = TransactionLog(make_transactions(TODAY - 120, TODAY))
+    sliding = SpendingAnalytics(log)
+    sliding.summary()
+
+    today["day"] = TODAY + days
+    assert sliding.summary() == SpendingAnalytics(log).summary()
+
+
+def test_old_transactions_do_not_count(today):
+    log = TransactionLog()
+    stats = SpendingAnalytics(log)
+    stats.add({"amount": -50.0, "category": "Food"}, timestamp=(TODAY - 100) * SECONDS_PER_DAY)
+    stats.add({"amount": -20.0, "category": "Food"}, timestamp=(TODAY - 10) * SECONDS_PER_DAY)
+    windows = stats.summary()["windows"]
+    assert (windows["7d"]["spend"], windows["30d"]["spend"], windows["90d"]["spend"]) == (0, 20.0, 20.0)
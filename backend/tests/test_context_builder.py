@@ -0,0 +1,47 @@
+"""
+Conversation Context Builder tests
+Ring-buffer history and token-budgeted prompt assembly
+"""
+
+from app.agents.context_builder import ConversationBuffer, build_chat_prompt, estimate_tokens
+
+
+def turn(role: str, content: str):
+    return {"role": role, "content": content}
+
+
+def test_buffer_folds_evicted_user_turns_into_summary():
+    buffer = ConversationBuffer(maxlen=2)
+    buffer.append(turn("user", "Can I afford a car? I earn 4k."))
+    buffer.append(turn("assistant", "Let's look at your budget."))
+    buffer.append(turn("user", "What about a bike?"))
+    assert len(buffer) == 2
+    assert buffer.summary == "Can I afford a car?"
+    # Agent replies are not summarized
+    buffer.append(turn("user", "Thanks"))
+    assert buffer.summary == "Can I afford a car?"
+
+
+def test_prompt_stays_within_budget_and_keeps_newest_turns():
+    history = [turn("user" if i % 2 == 0 else "assistant", f"message number {i} " + "x" * 80) for i in range(30)]
+    prompt = build_chat_prompt("You are Luna.", "Luna", "What now?", history, token_budget=300)
+
+    assert estimate_tokens(prompt) <= 300
+    kept = [int(line.split()[3]) for line in prompt.splitlines() if line.split()[1:3] == ["message", "number"]]
+    assert kept == list(range(30 - len(kept), 30)) and 0 < len(kept) < 30
+    # Skipped user turns survive as a summary line
+    assert "(Earlier topics: message number 0" in prompt
+    assert prompt.endswith("User: What now?\nLuna:")
+
+
+def test_current_message_is_not_repeated_from_history():
+    history = [turn("user", "Hi"), turn("assistant", "Hello!"), turn("user", "How am I doing?")]
+    prompt = build_chat_prompt("System", "Sofia", "How am I doing?", history)
+    assert prompt.count("How am I doing?") == 1
+    assert "User: Hi\nSofia: Hello!\nUser: How am I doing?\nSofia:" in prompt
+
+
+def test_tiny_budget_sends_only_the_current_message():
+    history = [turn("user", "Earlier question"), turn("assistant", "Earlier answer")]
+    prompt = build_chat_prompt("System", "Marcus", "Now?", history, token_budget=10)
+    assert prompt == "System\n\nConversation History:\nUser: Now?\nMarcus:"
@@ -0,0 +1,274 @@
+"""
+Database tests
+Write buffer retries, bad-row isolation and size cap; field-level financial updates
+and stale caches; persisted transaction history
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.api import chat
+from app.db import database
+from app.services import bulk_generator, financial_simulator
+from app.services.financial_store import FinancialStateStore
+
+
+@pytest.fixture
+def run_with_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    # Flush only when the test asks to
+    monkeypatch.setattr(database, "DB_FLUSH_INTERVAL", 3600)
+    monkeypatch.setattr(database, "DB_BATCH_SIZE", 10 ** 6)
+
+    def run(test):
+        async def main():
+            await database.init_db()
+            try:
+                await test(database._buffer)
+            finally:
+                await database.close_db()
+
+        asyncio.run(main())
+
+    return run
+
+
+def notification(notification_id: str, **payload):
+    return {"id": notification_id, "agentId": "budget_agent", "message": "hi", **payload}
+
+
+def message(text: str):
+    return {"role": "user", "content": text}
+
+
+def test_duplicate_row_is_dropped_and_the_rest_written(run_with_db):
+    async def test(buffer):
+        database.queue_notification("alice", notification("n1"))
+        await buffer.flush()
+
+        database.queue_conversation_message("alice", "budget_agent", message("before"))
+        database.queue_notification("alice", notification("n1"))
+        database.queue_notification("alice", notification("n2"))
+        database.queue_financial_state("alice", {"total_balance": 10})
+        await buffer.flush()
+
+        assert buffer.dropped == 1
+        assert buffer.pending() == 0
+        ids = [n["id"] for n in await database.load_notifications("alice")]
+        assert sorted(ids) == ["n1", "n2"]
+        assert [m["content"] for m in await database.load_conversation("alice", "budget_agent")] == ["before"]
+        assert await database.load_financial_state("alice") == {"total_balance": 10}
+
+    run_with_db(test)
+
+
+def test_unserializable_payload_is_dropped(run_with_db):
+    async def test(buffer):
+        database.queue_notification("alice", notification("bad", extra=object()))
+        database.queue_notification("alice", notification("good"))
+        await buffer.flush()
+
+        assert buffer.dropped == 1
+        assert [n["id"] for n in await database.load_notifications("alice")] == ["good"]
+
+    run_with_db(test)
+
+
+def test_transient_errors_are_retried_then_dropped(run_with_db, monkeypatch):
+    monkeypatch.setattr(database, "DB_FLUSH_RETRIES", 2)
+
+    async def test(buffer):
+        write = buffer._write
+        failing = [True]
+
+        async def flaky_write(*args):
+            if failing[0]:
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            await write(*args)
+
+        monkeypatch.setattr(buffer, "_write", flaky_write)
+        database.queue_notification("alice", notification("n1"))
+
+        # Retried batches stay queued ahead of newer rows
+        for _ in range(2):
+            with pytest.raises(OperationalError):
+                await buffer.flush()
+        database.queue_notification("alice", notification("n2"))
+        assert [row["id"] for row in buffer.notifications] == ["n1", "n2"]
+
+        # One failure too many drops the batch instead of retrying forever
+        await buffer.flush()
+        assert buffer.pending() == 0
+        assert buffer.dropped == 2
+
+        # The next success resets the retry budget
+        failing[0] = False
+        database.queue_notification("alice", notification("n3"))
+        await buffer.flush()
+        assert buffer.failures == 0
+        assert [n["id"] for n in await database.load_notifications("alice")] == ["n3"]
+
+    run_with_db(test)
+
+
+def test_buffer_drops_oldest_rows_beyond_its_cap(run_with_db, monkeypatch):
+    monkeypatch.setattr(database, "DB_BUFFER_MAX", 3)
+
+    async def test(buffer):
+        database.queue_financial_state("alice", {"total_balance": 1})
+        for i in range(4):
+            database.queue_conversation_message("alice", "budget_agent", message(f"m{i}"))
+
+        assert buffer.pending() == 3
+        assert buffer.dropped == 2
+        assert [m["content"] for m in buffer.messages] == ["m2", "m3"]
+        assert "alice" in buffer.financial_states
+
+    run_with_db(test)
+
+
+def vacation(current: float, completed: bool = False):
+    return {"name": "Vacation", "target": 50, "current": current, "completed": completed}
+
+
+async def as_other_worker(monkeypatch, queue):
+    """Run ``queue()`` against a second worker's write buffer and commit what it queued"""
+    buffer = database._buffer
+    other = database.WriteBuffer()
+    monkeypatch.setattr(database, "_buffer", other)
+    queue()
+    await other.flush()
+    monkeypatch.setattr(database, "_buffer", buffer)
+
+
+def test_changes_from_two_workers_are_both_kept(run_with_db, monkeypatch):
+    async def test(buffer):
+        database.queue_financial_state("alice", {"total_balance": 100, "goals": [vacation(10)], "version": 3})
+        await buffer.flush()
+
+        # Both workers loaded the snapshot above; neither overwrites the other's change
+        database.queue_financial_update("alice", {"kind": "add", "fields": {"total_balance": -30},
+                                                  "versions": {"version": 4}}, {})
+        await as_other_worker(monkeypatch, lambda: database.queue_financial_update(
+            "alice", {"kind": "goal", "name": "Vacation", "amount": 45, "versions": {"version": 4}}, {}
+        ))
+        await buffer.flush()
+
+        assert await database.load_financial_state("alice") == {
+            "total_balance": 70, "goals": [vacation(50, completed=True)], "version": 4,
+        }
+
+    run_with_db(test)
+
+
+def test_snapshot_supersedes_earlier_changes(run_with_db):
+    async def test(buffer):
+        database.queue_financial_update("alice", {"kind": "add", "fields": {"total_balance": 5}}, {"total_balance": 5})
+        database.queue_financial_state("alice", {"total_balance": 1})
+        database.queue_financial_update("alice", {"kind": "add", "fields": {"total_balance": 2}}, {"total_balance": 3})
+        assert [op["kind"] for op in buffer.financial_states["alice"]["ops"]] == ["set", "add"]
+
+        await buffer.flush()
+        assert await database.load_financial_state("alice") == {"total_balance": 3}
+
+    run_with_db(test)
+
+
+def restart(monkeypatch):
+    """Forget every in-memory record, as a fresh worker would"""
+    monkeypatch.setattr(financial_simulator, "financial_store",
+                        FinancialStateStore(financial_simulator._default_record))
+    monkeypatch.setattr(bulk_generator, "financial_store", financial_simulator.financial_store)
+
+
+def test_full_transaction_history_survives_a_restart(run_with_db, monkeypatch):
+    restart(monkeypatch)
+
+    async def test(buffer):
+        for _ in range(30):
+            await financial_simulator.simulate_transaction("alice")
+        await buffer.flush()
+        before = list(financial_simulator.financial_store.get("alice").transactions.rows())
+
+        restart(monkeypatch)
+        record = await financial_simulator.load_user_record("alice")
+        assert len(record.transactions) == 30
+        assert list(record.transactions.rows()) == before
+
+        # Personalizing starts a new history, in the database too
+        await financial_simulator.get_user_financial_data({"income": "over-150k"}, user_id="alice")
+        await financial_simulator.simulate_transaction("alice")
+        await buffer.flush()
+        restart(monkeypatch)
+        record = await financial_simulator.load_user_record("alice")
+        assert len(record.transactions) == 16
+
+    run_with_db(test)
+
+
+def test_backfill_saves_histories_once(run_with_db, monkeypatch):
+    restart(monkeypatch)
+    monkeypatch.setattr(bulk_generator, "BACKFILL_USERS", 3)
+    monkeypatch.setattr(bulk_generator, "BACKFILL_PER_USER", 40)
+    monkeypatch.setattr(bulk_generator, "BACKFILL_PREFIX", "bulk_")
+
+    async def test(buffer):
+        assert (await bulk_generator.backfill_on_startup())["users"] == 3
+        generated = list(financial_simulator.financial_store.get("bulk_1").transactions.rows())
+
+        restart(monkeypatch)
+        assert (await bulk_generator.backfill_on_startup())["users"] == 0
+        record = await financial_simulator.load_user_record("bulk_1")
+        assert list(record.transactions.rows()) == generated
+
+    run_with_db(test)
+
+
+def test_stale_record_is_reloaded_once_local_changes_are_written(run_with_db, monkeypatch):
+    restart(monkeypatch)
+
+    async def test(buffer):
+        await financial_simulator.simulate_transaction("alice")
+        await buffer.flush()
+        before = financial_simulator.financial_store.get("alice").total_balance
+        transaction = await financial_simulator.simulate_transaction("alice")
+
+        await as_other_worker(monkeypatch, lambda: database.queue_financial_update(
+            "alice", {"kind": "add", "fields": {"total_balance": 1000}}, {}
+        ))
+        financial_simulator.invalidate_user_record("alice")
+
+        # A reload now would lose our own unwritten transaction
+        record = await financial_simulator.load_user_record("alice")
+        assert financial_simulator.financial_store.is_stale("alice")
+        assert record.total_balance == pytest.approx(before + transaction["amount"])
+
+        await buffer.flush()
+        record = await financial_simulator.load_user_record("alice")
+        assert not financial_simulator.financial_store.is_stale("alice")
+        assert record.total_balance == pytest.approx(before + transaction["amount"] + 1000)
+        assert len(record.transactions) == 2
+
+    run_with_db(test)
+
+
+def test_stale_chat_history_is_reloaded_once_local_turns_are_written(run_with_db, monkeypatch):
+    monkeypatch.setattr(chat, "conversation_history", {})
+    monkeypatch.setattr(chat, "_stale_histories", set())
+
+    async def test(buffer):
+        history = await chat._get_history("luna", user_id="alice")
+        chat._append_history("luna", message("mine"), user_id="alice")
+        await as_other_worker(monkeypatch, lambda: database.queue_conversation_message(
+            "alice", "luna", message("theirs")
+        ))
+        chat.invalidate_history("alice")
+        assert await chat._get_history("luna", user_id="alice") is history
+
+        await buffer.flush()
+        history = await chat._get_history("luna", user_id="alice")
+        assert [turn["content"] for turn in history] == ["mine", "theirs"]
+
+    run_with_db(test)
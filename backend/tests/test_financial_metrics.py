@@ -0,0 +1,26 @@
+"""
+Financial Metrics tests
+ETag matching for conditional requests
+"""
+
+from app.services.financial_metrics import etag_matches, make_etag
+
+
+def test_etag_matches_exact_and_weak_tags():
+    etag = make_etag("s", 3)
+    assert etag_matches(etag, etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert not etag_matches(make_etag("s", 4), etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+
+
+def test_etag_matches_any_tag_in_a_list():
+    etag = make_etag("m", 7)
+    assert etag_matches(f'"other", W/{etag} , "another"', etag)
+    assert not etag_matches('"other", "another"', etag)
+
+
+def test_etag_matches_star():
+    assert etag_matches("*", make_etag("t", 1))
+    assert etag_matches(" * ", make_etag("t", 1))
@@ -0,0 +1,48 @@
+"""
+Insight Rules tests
+Gating model calls on fired rules and changed metrics
+"""
+
+from app.services.insight_dedupe import FingerprintTracker
+from app.services.insight_rules import InsightGate
+
+HEALTHY = {
+    "monthly_income": 5000,
+    "monthly_expenses": 3000,
+    "savings_rate": 20,
+    "total_balance": 10000,
+}
+OVERSPENDING = {**HEALTHY, "monthly_expenses": 4800}
+
+
+def test_gate_stays_open_until_the_call_is_committed():
+    gate = InsightGate()
+    should_call, hits = gate.check("alex", "luna", OVERSPENDING)
+    assert should_call and [hit["rule"] for hit in hits] == ["overspending"]
+    # The model call failed: nothing was committed, so the next run asks again
+    assert gate.check("alex", "luna", OVERSPENDING)[0]
+
+    gate.commit("alex", "luna", OVERSPENDING, hits)
+    assert gate.check("alex", "luna", OVERSPENDING) == (False, hits)
+
+
+def test_gate_reopens_when_a_metric_moves():
+    gate = InsightGate()
+    assert gate.check("alex", "luna", HEALTHY) == (False, [])
+    assert not gate.check("alex", "luna", {**HEALTHY, "total_balance": 10100})[0]
+    assert gate.check("alex", "luna", {**HEALTHY, "total_balance": 12000})[0]
+    assert gate.stats() == {"evaluated": 3, "skipped": 2}
+
+
+def test_fingerprint_only_moves_on_commit():
+    tracker = FingerprintTracker()
+    assert tracker.changed("alex", "luna", HEALTHY)
+    assert tracker.changed("alex", "luna", HEALTHY)
+
+    tracker.commit("alex", "luna", HEALTHY)
+    assert not tracker.changed("alex", "luna", HEALTHY)
+    assert tracker.changed("alex", "luna", OVERSPENDING)
+    # Other agents and users are tracked separately
+    assert tracker.changed("alex", "marcus", HEALTHY)
+    tracker.forget("alex")
+    assert tracker.changed("alex", "luna", HEALTHY)
@@ -0,0 +1,58 @@
+"""
+LLM Response Cache tests
+Keying on agent and normalized prompt, TTL expiry and LRU bounds
+"""
+
+from app.services import llm_cache
+from app.services.llm_cache import LLMResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+def test_key_ignores_case_and_whitespace_but_not_agent():
+    key = LLMResponseCache.make_key("sofia", "How do I  build\ncredit?")
+    assert key == LLMResponseCache.make_key("sofia", "  how do i build credit?")
+    assert key != LLMResponseCache.make_key("marcus", "How do I build credit?")
+    assert key != LLMResponseCache.make_key("sofia", "How do I build savings?")
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_cache, "time", clock)
+    cache = LLMResponseCache(ttl=60)
+    key = cache.make_key("luna", "hello")
+    cache.set(key, "hi there")
+
+    clock.now += 59
+    assert cache.get(key) == "hi there"
+    clock.now += 2
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LLMResponseCache(max_entries=2)
+    a, b, c = (cache.make_key("luna", p) for p in "abc")
+    cache.set(a, "A")
+    cache.set(b, "B")
+    cache.get(a)
+    cache.set(c, "C")
+    assert cache.get(b) is None
+    assert (cache.get(a), cache.get(c)) == ("A", "C")
+
+
+def test_character_budget_bounds_the_cache():
+    cache = LLMResponseCache(max_chars=10)
+    cache.set(cache.make_key("luna", "big"), "x" * 11)
+    assert cache.stats()["entries"] == 0
+    for prompt in "abc":
+        cache.set(cache.make_key("luna", prompt), "x" * 4)
+    assert cache.stats()["chars"] == 8
+    assert cache.get(cache.make_key("luna", "a")) is None
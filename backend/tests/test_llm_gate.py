@@ -0,0 +1,105 @@
+"""
+LLM Gate tests
+Token bucket refill and back-off, circuit breaker states and admission
+"""
+
+import asyncio
+
+import pytest
+
+from app.services import llm_gate
+from app.services.llm_gate import CircuitBreaker, LLMGate, LLMUnavailableError, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_gate, "time", fake)
+    return fake
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate(clock):
+    bucket = TokenBucket(rate_per_min=60, burst=3)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == pytest.approx(1.0)
+    clock.now += 1
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_bucket_backs_off_and_recovers(clock):
+    bucket = TokenBucket(rate_per_min=60, burst=1)
+    for _ in range(10):
+        bucket.throttle()
+    assert bucket.rate == pytest.approx(bucket.base_rate * llm_gate.MIN_RATE_FRACTION)
+    for _ in range(20):
+        bucket.recover()
+    assert bucket.rate == pytest.approx(bucket.base_rate)
+
+
+def test_breaker_opens_after_threshold_and_probes_once(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # only one probe at a time
+
+    # A failed probe reopens straight away
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.trips == 2
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow() and breaker.allow()
+
+
+def test_cancelled_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=5)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+def test_gate_rejects_fast_when_open_or_out_of_tokens(clock):
+    gate = LLMGate(TokenBucket(rate_per_min=60, burst=1), CircuitBreaker(threshold=1, cooldown=30), max_wait=0)
+
+    async def run():
+        await gate.admit()
+        with pytest.raises(LLMUnavailableError, match="rate limit"):
+            await gate.admit()
+        clock.now += 1
+        await gate.admit()
+        with pytest.raises(RuntimeError):
+            with gate.track():
+                raise RuntimeError("429 quota exceeded")
+        with pytest.raises(LLMUnavailableError, match="circuit open"):
+            await gate.admit()
+
+    asyncio.run(run())
+    assert gate.stats()["state"] == "open"
+    assert (gate.admitted, gate.rejected, gate.quota_errors) == (2, 2, 1)
+    assert gate.bucket.rate == pytest.approx(gate.bucket.base_rate / 2)
+
+
+def test_non_quota_errors_do_not_trip_the_breaker(clock):
+    gate = LLMGate(breaker=CircuitBreaker(threshold=1))
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            with gate.track():
+                raise ValueError("bad prompt")
+    assert gate.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,53 @@
+"""
+Notification Outbox tests
+Replay of missed notifications with UserOutbox.since
+"""
+
+from app.services.outbox import UserOutbox
+
+
+def message(seq: int):
+    return {"type": "notification", "seq": seq}
+
+
+def make_outbox(last: int, size: int = 5) -> UserOutbox:
+    user_outbox = UserOutbox(size)
+    for seq in range(1, last + 1):
+        user_outbox.record(seq, message(seq))
+    return user_outbox
+
+
+def test_since_returns_only_missed_messages():
+    user_outbox = make_outbox(4)
+    missed, complete = user_outbox.since(2)
+    assert [m["seq"] for m in missed] == [3, 4]
+    assert complete
+
+
+def test_since_latest_is_empty_and_complete():
+    assert make_outbox(4).since(4) == ([], True)
+    assert UserOutbox().since(0) == ([], True)
+
+
+def test_since_reports_messages_lost_from_the_ring():
+    user_outbox = make_outbox(8, size=5)
+    missed, complete = user_outbox.since(1)
+    assert [m["seq"] for m in missed] == [4, 5, 6, 7, 8]
+    assert not complete
+    # Just old enough that nothing was lost
+    assert user_outbox.since(3)[1]
+
+
+def test_since_client_ahead_gets_everything():
+    user_outbox = make_outbox(3)
+    missed, complete = user_outbox.since(10)
+    assert [m["seq"] for m in missed] == [1, 2, 3]
+    assert not complete
+
+
+def test_duplicates_are_ignored():
+    user_outbox = make_outbox(3)
+    user_outbox.record(2, message(2))
+    user_outbox.record(3, message(3))
+    assert [m["seq"] for m in user_outbox.since(0)[0]] == [1, 2, 3]
+    assert user_outbox.next_seq == 4
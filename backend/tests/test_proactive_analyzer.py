@@ -0,0 +1,151 @@
+"""
+Proactive Analyzer tests
+Scheduling across disconnects, reconnects and leadership changes
+"""
+
+import asyncio
+
+from app.agents.personalities import AGENTS
+from app.services import proactive_analyzer
+from app.services.insight_rules import AGENT_RULES
+from app.services.llm_gate import LLMUnavailableError
+from app.services.proactive_analyzer import ProactiveAnalyzer
+
+
+class FakeHub:
+    def __init__(self, users=()):
+        self.connected = set(users)
+        self.sent = []
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self.connected
+
+    def users(self):
+        return set(self.connected)
+
+    async def notify(self, user_id: str, notification: dict, topic: str = None):
+        self.sent.append((user_id, notification["title"]))
+
+
+def running_analyzer(hub: FakeHub) -> ProactiveAnalyzer:
+    """An analyzer that accepts users without starting its loop"""
+    analyzer = ProactiveAnalyzer(hub)
+    analyzer.running = True
+    return analyzer
+
+
+def live_entries(analyzer: ProactiveAnalyzer):
+    return [e for e in analyzer._schedule if analyzer._is_current(e[2], e[4])]
+
+
+def dispatch_all(analyzer: ProactiveAnalyzer):
+    """Make every entry due, dispatch them all and return the queued jobs"""
+
+    async def run():
+        analyzer._jobs = asyncio.Queue()
+        analyzer._schedule = [(0.0, *entry[1:]) for entry in analyzer._schedule]
+        while analyzer._schedule:
+            await analyzer._dispatch_due()
+        jobs = []
+        while not analyzer._jobs.empty():
+            jobs.append(analyzer._jobs.get_nowait())
+        return jobs
+
+    return asyncio.run(run())
+
+
+def test_add_user_twice_schedules_once():
+    analyzer = running_analyzer(FakeHub())
+    analyzer.add_user("alex")
+    analyzer.add_user("alex")
+    assert len(analyzer._schedule) == len(analyzer.agent_intervals)
+
+
+def test_reconnects_leave_one_schedule_per_agent():
+    analyzer = running_analyzer(FakeHub({"alex"}))
+    for _ in range(4):
+        analyzer.add_user("alex")
+        analyzer.remove_user("alex")
+    analyzer.add_user("alex")
+
+    assert len(live_entries(analyzer)) == len(analyzer.agent_intervals)
+    jobs = dispatch_all(analyzer)
+    assert sorted(agent for _, agent, _ in jobs) == sorted(analyzer.agent_intervals)
+    assert {generation for _, _, generation in jobs} == {analyzer._users["alex"]}
+
+
+def test_entries_for_disconnected_users_are_dropped():
+    analyzer = running_analyzer(FakeHub())
+    analyzer.add_user("alex")
+    assert dispatch_all(analyzer) == []
+    assert "alex" not in analyzer._users
+
+
+def test_add_user_is_ignored_while_not_leader():
+    analyzer = ProactiveAnalyzer(FakeHub({"alex"}))
+    analyzer.add_user("alex")
+    assert analyzer._schedule == [] and analyzer._users == {}
+
+
+def test_stop_and_restart_reschedules_every_connected_user():
+    hub = FakeHub({"alex", "sam"})
+    analyzer = ProactiveAnalyzer(hub)
+    analyzed = []
+
+    async def analyze(user_id, agent_id):
+        analyzed.append((user_id, agent_id))
+
+    analyzer._analyze_and_notify = analyze
+
+    async def run():
+        task = asyncio.create_task(analyzer.start())
+        await asyncio.sleep(0.01)
+        assert len(live_entries(analyzer)) == 2 * len(analyzer.agent_intervals)
+
+        await analyzer.stop()
+        task.cancel()
+        assert analyzer._schedule == [] and analyzer._users == {}
+
+        # Users who joined while another worker led are picked up too
+        hub.connected.add("kim")
+        task = asyncio.create_task(analyzer.start())
+        await asyncio.sleep(0.01)
+        assert set(analyzer._users) == {"alex", "sam", "kim"}
+        assert len(live_entries(analyzer)) == 3 * len(analyzer.agent_intervals)
+        await analyzer.stop()
+        task.cancel()
+
+    asyncio.run(run())
+    assert {user_id for user_id, _ in analyzed} == {"alex", "sam", "kim"}
+
+
+def test_failed_model_call_is_retried_until_it_answers(monkeypatch):
+    monkeypatch.setattr(proactive_analyzer.random, "random", lambda: 1.0)  # no simulated transactions
+    monkeypatch.setitem(AGENT_RULES, "luna", lambda data, analytics=None: [{"rule": "test", "detail": "test"}])
+    replies = [LLMUnavailableError("rate limit"), RuntimeError("bad reply"), None]
+    calls = []
+
+    async def analyze(financial_data, signals=None, spending=None, raise_errors=False):
+        calls.append(raise_errors)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(AGENTS["luna"], "analyze_for_insights", analyze)
+    hub = FakeHub({"retry_user"})
+    analyzer = running_analyzer(hub)
+
+    async def run():
+        await analyzer._analyze_and_notify("retry_user", "luna")
+        try:
+            await analyzer._analyze_and_notify("retry_user", "luna")
+        except RuntimeError:
+            pass
+        # Answered (with nothing to say): the data counts as analyzed
+        await analyzer._analyze_and_notify("retry_user", "luna")
+        await analyzer._analyze_and_notify("retry_user", "luna")
+
+    asyncio.run(run())
+    assert calls == [True, True, True]
+    assert hub.sent == []
@@ -0,0 +1,149 @@
+"""
+Pub/Sub tests
+Cross-worker delivery, presence and cache invalidation over the SQLite backend
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.db import database
+from app.services import pubsub
+from app.services.pubsub import NotificationHub, SQLitePubSub
+from app.services.websocket_manager import ConnectionManager
+
+POLL = 0.02
+
+
+class FakeWebSocket:
+    headers = {}
+
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+@pytest.fixture
+def run_with_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path}/pubsub.db")
+
+    def run(test):
+        async def main():
+            await database.init_db()
+            hubs = []
+            for origin in ("w1", "w2"):
+                hub = NotificationHub(ConnectionManager(), SQLitePubSub(origin=origin, poll_interval=POLL), origin=origin)
+                await hub.start()
+                hubs.append(hub)
+            try:
+                await test(*hubs)
+            finally:
+                for hub in hubs:
+                    await hub.stop()
+                await database.close_db()
+
+        asyncio.run(main())
+
+    return run
+
+
+async def settle():
+    await asyncio.sleep(POLL * 6)
+
+
+def test_events_reach_sockets_on_other_workers(run_with_db):
+    async def test(w1, w2):
+        socket = FakeWebSocket()
+        await w2.manager.connect(socket, "tab", "alice")
+        await w1.send_to_user("alice", {"type": "notification", "n": 1})
+        await w1.send_to_user("bob", {"type": "notification", "n": 2})
+        await settle()
+        assert [m.get("n") for m in socket.sent if m["type"] == "notification"] == [1]
+
+    run_with_db(test)
+
+
+def test_join_and_leave_are_seen_by_other_workers(run_with_db):
+    async def test(w1, w2):
+        joined = []
+        w1.on_join(joined.append)
+        connection = await w2.manager.connect(FakeWebSocket(), "tab", "alice")
+        await w2.user_joined("alice")
+        await settle()
+        assert joined == ["alice"]
+        assert w1.has_user("alice") and w1.users() == {"alice"}
+
+        w2.manager.disconnect(connection)
+        await w2.user_left("alice")
+        await settle()
+        assert not w1.has_user("alice") and w1.users() == set()
+
+    run_with_db(test)
+
+
+def test_presence_snapshots_add_drop_and_expire_users(run_with_db, monkeypatch):
+    monkeypatch.setattr(pubsub, "PRESENCE_INTERVAL", POLL * 4)
+
+    async def test(w1, w2):
+        # Joined before w1 was listening: only the periodic snapshot tells w1
+        connection = await w2.manager.connect(FakeWebSocket(), "tab", "alice")
+        await asyncio.sleep(pubsub.PRESENCE_INTERVAL + POLL * 4)
+        assert w1.has_user("alice")
+
+        # A snapshot without the user drops it
+        w2.manager.disconnect(connection)
+        await asyncio.sleep(pubsub.PRESENCE_INTERVAL + POLL * 4)
+        assert not w1.has_user("alice")
+
+        # A worker that stops announcing is forgotten after 2.5 intervals
+        await w2.manager.connect(FakeWebSocket(), "tab", "carol")
+        await asyncio.sleep(pubsub.PRESENCE_INTERVAL + POLL * 4)
+        assert w1.has_user("carol")
+        w2._presence_task.cancel()  # as if w2 had crashed
+        await asyncio.sleep(pubsub.PRESENCE_INTERVAL * 3)
+        assert not w1.has_user("carol")
+
+    run_with_db(test)
+
+
+def test_unwritable_event_is_dropped_without_blocking_the_rest(run_with_db):
+    async def test(w1, w2):
+        socket = FakeWebSocket()
+        await w2.manager.connect(socket, "tab", "alice")
+        await w1.backend.publish({"kind": "user", "user_id": "bob", "message": {"type": "x", "bad": object()}})
+        await w1.send_to_user("alice", {"type": "notification", "n": 1})
+        # Isolating the bad event takes a few extra writes
+        for _ in range(5):
+            await settle()
+        assert w1.backend.dropped == 1
+        assert [m.get("n") for m in socket.sent if m["type"] == "notification"] == [1]
+
+    run_with_db(test)
+
+
+def test_committed_changes_invalidate_other_workers_caches(run_with_db):
+    async def test(w1, w2):
+        seen = {"w1": [], "w2": []}
+        w1.on_invalidate(lambda financial, chats: seen["w1"].append((financial, chats)))
+        w2.on_invalidate(lambda financial, chats: seen["w2"].append((financial, chats)))
+        database.on_change(w1.invalidate)
+
+        database.queue_conversation_message("alice", "luna", {"role": "user", "content": "hi"})
+        database.queue_financial_update("alice", {"kind": "add", "fields": {"total_balance": 5}}, {})
+        await database._buffer.flush()
+        await database.delete_conversation("bob")
+        await settle()
+        # Only the other worker drops its copies
+        assert seen["w1"] == []
+        assert seen["w2"] == [({"alice"}, {("alice", "luna")}), (set(), {("bob", None)})]
+
+    run_with_db(test)
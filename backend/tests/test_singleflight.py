@@ -0,0 +1,84 @@
+"""
+SingleFlight tests
+Coalescing identical in-flight calls and cancelling them only when nobody waits
+"""
+
+import asyncio
+
+from app.services.llm_cache import SingleFlight
+
+KEY = ("luna", "digest")
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = False
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return "reply"
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flight, upstream = SingleFlight(), Upstream()
+        waiters = [asyncio.create_task(flight.do(KEY, upstream)) for _ in range(3)]
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await asyncio.gather(*waiters), upstream.calls, flight.stats()
+
+    replies, calls, stats = asyncio.run(run())
+    assert replies == ["reply"] * 3 and calls == 1
+    assert stats["in_flight"] == 0 and stats["coalesced"] == 2
+
+
+def test_one_waiter_giving_up_does_not_cancel_the_others():
+    async def run():
+        flight, upstream = SingleFlight(), Upstream()
+        first = asyncio.create_task(flight.do(KEY, upstream))
+        second = asyncio.create_task(flight.do(KEY, upstream))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return await second, first.cancelled(), upstream.cancelled
+
+    assert asyncio.run(run()) == ("reply", True, False)
+
+
+def test_call_is_cancelled_once_every_waiter_has_gone():
+    async def run():
+        flight, upstream = SingleFlight(), Upstream()
+        waiters = [asyncio.create_task(flight.do(KEY, upstream)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return upstream.cancelled, flight.stats()["in_flight"]
+
+    assert asyncio.run(run()) == (True, 0)
+
+
+def test_errors_reach_every_waiter_and_the_next_call_starts_fresh():
+    async def failing() -> str:
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do(KEY, failing), flight.do(KEY, failing), return_exceptions=True)
+        upstream = Upstream()
+        upstream.release.set()
+        return results, await flight.do(KEY, upstream)
+
+    results, reply = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert reply == "reply"
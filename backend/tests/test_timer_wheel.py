@@ -0,0 +1,46 @@
+"""
+Timer Wheel tests
+"""
+
+from app.services.timer_wheel import TimerWheel
+
+
+def make_wheel(tick: float = 1.0, slots: int = 8) -> TimerWheel:
+    wheel = TimerWheel(tick=tick, slots=slots)
+    wheel._origin = 0.0
+    return wheel
+
+
+def test_timer_fires_once_its_tick_passes():
+    wheel = make_wheel()
+    wheel.schedule("a", 3)
+    assert wheel.advance(2.5) == []
+    assert wheel.advance(3.0) == ["a"]
+    assert "a" not in wheel and len(wheel) == 0
+    assert wheel.advance(20.0) == []
+
+
+def test_reschedule_replaces_and_cancel_removes():
+    wheel = make_wheel()
+    wheel.schedule("a", 2)
+    wheel.schedule("a", 5)
+    wheel.schedule("b", 2)
+    wheel.cancel("b")
+    assert wheel.advance(4.0) == []
+    assert wheel.advance(5.0) == ["a"]
+
+
+def test_delay_longer_than_one_turn_waits_for_its_tick():
+    wheel = make_wheel(slots=8)
+    wheel.schedule("late", 11)
+    # Slot 3 comes round at tick 3, but the deadline is tick 11
+    assert wheel.advance(8.0) == []
+    assert wheel.advance(11.0) == ["late"]
+
+
+def test_long_stall_expires_everything_due():
+    wheel = make_wheel(slots=8)
+    for i in range(1, 20):
+        wheel.schedule(i, i)
+    assert sorted(wheel.advance(100.0)) == list(range(1, 20))
+    assert len(wheel) == 0
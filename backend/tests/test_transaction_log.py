@@ -0,0 +1,89 @@
+"""
+Transaction Log tests
+Paging newest first across the archive and the recent buffer
+"""
+
+from datetime import datetime, timedelta
+
+from app.services.transaction_log import TransactionLog
+
+START = datetime(2025, 1, 1)
+
+
+def make_log(count: int = 50, recent_capacity: int = 5) -> TransactionLog:
+    log = TransactionLog(recent_capacity=recent_capacity)
+    for i in range(count):
+        log.append({
+            "id": f"txn_{i}",
+            "merchant": "Grocery Store",
+            "amount": -float(i),
+            "category": "Food",
+            "date": (START + timedelta(days=i)).isoformat(),
+            "version": i + 1,
+        })
+    return log
+
+
+def ids(rows):
+    return [int(row["id"][len("txn_"):]) for row in rows]
+
+
+def test_pages_cover_history_newest_first():
+    log = make_log()
+    seen, cursor = [], None
+    while True:
+        page = log.page(cursor=cursor, limit=20)
+        assert page["total"] == 50
+        seen.extend(ids(page["transactions"]))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == list(range(49, -1, -1))
+
+
+def test_last_full_page_has_no_cursor():
+    page = make_log(count=20).page(limit=20)
+    assert len(page["transactions"]) == 20
+    assert page["next_cursor"] is None
+
+
+def test_archived_rows_round_trip():
+    log = make_log()
+    row = log.page(cursor=11, limit=1)["transactions"][0]
+    assert row == {
+        "id": "txn_10",
+        "merchant": "Grocery Store",
+        "amount": -10.0,
+        "category": "Food",
+        "date": (START + timedelta(days=10)).isoformat(),
+        "version": 11,
+    }
+
+
+def test_date_range_pages():
+    log = make_log()
+    start, end = START + timedelta(days=10), START + timedelta(days=29)
+    first = log.page(limit=15, start=start, end=end)
+    assert ids(first["transactions"]) == list(range(29, 14, -1))
+    second = log.page(cursor=first["next_cursor"], limit=15, start=start, end=end)
+    assert ids(second["transactions"]) == list(range(14, 9, -1))
+    assert second["next_cursor"] is None
+
+
+def test_since_version():
+    log = make_log()
+    assert ids(log.since(47)) == [49, 48, 47]
+    assert log.since(50) == []
+
+
+def test_rows_rebuild_the_same_log():
+    log = TransactionLog(recent_capacity=5)
+    log.append({"id": "refund-1", "merchant": "Shop", "amount": 5.0, "category": "Refund",
+                "date": (START - timedelta(days=1)).isoformat(), "version": 1})
+    for transaction in reversed(make_log().page(limit=50)["transactions"]):
+        log.append(transaction)
+    rebuilt = TransactionLog.from_rows(list(log.rows()), recent_capacity=5)
+    assert list(rebuilt.rows()) == list(log.rows())
+    assert len(rebuilt) == 51
+    assert rebuilt.recent_transactions() == log.recent_transactions()
+    assert rebuilt.page(limit=60) == log.page(limit=60)
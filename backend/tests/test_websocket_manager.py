@@ -0,0 +1,114 @@
+"""
+WebSocket Connection Manager tests
+Fan-out through per-connection queues, the slow-consumer policies and batch frames
+"""
+
+import asyncio
+import json
+
+from app.services import websocket_manager
+from app.services.websocket_manager import ClientConnection, ConnectionManager
+
+
+class FakeWebSocket:
+    headers = {}
+
+    def __init__(self, stalled: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self._stalled = asyncio.Event() if stalled else None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self._stalled:
+            await self._stalled.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+def test_drop_oldest_keeps_newest_frames(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+
+    async def run():
+        connection = ClientConnection(FakeWebSocket(), "c1", queue_size=2)
+        assert all(connection.enqueue(frame) for frame in ("1", "2", "3"))
+        frames = [connection.queue.get_nowait() for _ in range(connection.queue.qsize())]
+        return frames, connection.dropped
+
+    assert asyncio.run(run()) == (["2", "3"], 1)
+
+
+def test_disconnect_policy_refuses_when_full(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "WS_SLOW_CONSUMER_POLICY", "disconnect")
+
+    async def run():
+        connection = ClientConnection(FakeWebSocket(), "c1", queue_size=1)
+        return connection.enqueue("1"), connection.enqueue("2")
+
+    assert asyncio.run(run()) == (True, False)
+
+
+def test_broadcast_drops_stalled_client_without_delaying_others(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "WS_SLOW_CONSUMER_POLICY", "disconnect")
+
+    async def run():
+        manager = ConnectionManager()
+        healthy, stalled = FakeWebSocket(), FakeWebSocket(stalled=True)
+        await manager.connect(healthy, "healthy")
+        await manager.connect(stalled, "stalled")
+        for i in range(websocket_manager.WS_QUEUE_SIZE + 5):
+            await manager.broadcast({"type": "tick", "n": i})
+            await asyncio.sleep(0)  # let the healthy sender keep up
+        await asyncio.sleep(0.05)
+        return manager, healthy, stalled
+
+    manager, healthy, stalled = asyncio.run(run())
+    assert [c.client_id for c in manager.connections] == ["healthy"]
+    assert [m["n"] for m in healthy.sent if m["type"] == "tick"] == list(range(websocket_manager.WS_QUEUE_SIZE + 5))
+    assert stalled.closed_with is not None
+
+
+def notifications(sent):
+    """(frame kind, notification numbers) for each frame after the welcome message"""
+    frames = []
+    for message in sent:
+        if message["type"] == "batch":
+            frames.append(("batch", [m["n"] for m in message["messages"]]))
+        elif message["type"] == "tick":
+            frames.append(("single", [message["n"]]))
+    return frames
+
+
+def send_burst(batch: bool, count: int):
+    async def run():
+        manager = ConnectionManager()
+        socket = FakeWebSocket()
+        await manager.connect(socket, "c1", "alex", batch=batch)
+        await asyncio.sleep(websocket_manager.WS_BATCH_WINDOW * 2)
+        for i in range(count):
+            await manager.send_to_user("alex", {"type": "tick", "n": i})
+        await asyncio.sleep(websocket_manager.WS_BATCH_WINDOW * 4)
+        return notifications(socket.sent)
+
+    return asyncio.run(run())
+
+
+def test_burst_is_coalesced_into_one_batch_frame():
+    assert send_burst(batch=True, count=5) == [("batch", [0, 1, 2, 3, 4])]
+
+
+def test_lone_message_is_sent_unwrapped():
+    assert send_burst(batch=True, count=1) == [("single", [0])]
+
+
+def test_batches_are_capped(monkeypatch):
+    monkeypatch.setattr(websocket_manager, "WS_BATCH_MAX_MESSAGES", 3)
+    assert send_burst(batch=True, count=7) == [("batch", [0, 1, 2]), ("batch", [3, 4, 5]), ("single", [6])]
+
+
+def test_sockets_without_batch_get_one_frame_per_message():
+    assert send_burst(batch=False, count=3) == [("single", [0]), ("single", [1]), ("single", [2])]